@@ -0,0 +1,327 @@
+"""
+Admission Control
+Per-route concurrency limits with a bounded, deadline-limited wait queue
+and per-client token-bucket rate limits, applied as ASGI middleware
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.routing import Match
+
+from cache_backends import CacheBackend, RedisBackend
+
+logger = logging.getLogger(__name__)
+
+
+# Paths never limited, so health checks and docs work under overload
+EXEMPT_PATHS = frozenset({"/", "/docs", "/redoc", "/openapi.json"})
+
+# Shared limit of requests matching no route (404s, 405s), so arbitrary
+# paths can't create a limit each
+UNMATCHED_ROUTE = "<unmatched>"
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+
+# Atomic token bucket: refill by elapsed time, then take one token.
+# Returns {allowed, milliseconds until a token is available}.
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, wait}
+"""
+
+
+class Rejected(Exception):
+    """Request refused by admission control."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimit:
+    """
+    Caps in-flight requests of one route.
+
+    Requests over the limit wait in a FIFO queue of bounded length; a
+    request is rejected at once when the queue is full and after max_wait
+    seconds in the queue otherwise, so callers fail fast instead of piling
+    up behind a saturated dependency.
+    """
+
+    def __init__(self, limit: int, queue_size: int, max_wait: float):
+        """
+        Args:
+            limit: Maximum concurrent requests
+            queue_size: Maximum requests waiting for a slot
+            max_wait: Seconds a request may wait before it is rejected
+        """
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Smoothed request duration, for Retry-After hints
+        self.service_time = 0.05
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def retry_after(self) -> float:
+        """Seconds until the queue ahead of a new request should have drained."""
+        return self.service_time * (self.waiting + 1) / self.limit
+
+    async def acquire(self):
+        """
+        Take a slot, waiting in the queue if needed.
+
+        Raises:
+            Rejected: If the queue is full or the deadline passes
+        """
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise Rejected(503, "Server busy, queue full", self.retry_after())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Rejected(503, "Server busy, request timed out in queue", self.retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+
+    def release(self, duration: float):
+        """Free a slot taken by acquire()."""
+        self.active -= 1
+        self.service_time += 0.1 * (duration - self.service_time)
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "service_time_ms": round(self.service_time * 1000, 1),
+        }
+
+
+class RateLimiter:
+    """
+    Per-client token buckets.
+
+    Buckets live in Redis when the cache uses it, so limits hold across
+    workers; otherwise each process keeps its own buckets. Redis errors
+    admit the request rather than turn a cache outage into an API outage.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self.limited = 0
+        self._script = None
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def bind(self, backend: CacheBackend):
+        """Keep buckets in the cache backend if it is Redis."""
+        if isinstance(backend, RedisBackend):
+            self._script = backend.client.register_script(_TOKEN_BUCKET_LUA)
+
+    async def check(self, client_id: str):
+        """
+        Take a token for a request.
+
+        Raises:
+            Rejected: If the client's bucket is empty
+        """
+        if self._script is not None:
+            try:
+                allowed, wait_ms = await self._script(
+                    keys=[f"{RATE_LIMIT_PREFIX}{client_id}"],
+                    args=[self.rate, self.burst, int(time.time() * 1000)],
+                )
+            except Exception as e:
+                logger.warning("Rate limiter unavailable, admitting request: %s", e)
+                return
+            wait = wait_ms / 1000
+        else:
+            allowed, wait = self._take_local(client_id)
+
+        if not allowed:
+            self.limited += 1
+            raise Rejected(429, "Rate limit exceeded", wait)
+
+    def _take_local(self, client_id: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._buckets[client_id] = (tokens - 1, now)
+            return True, 0.0
+        self._buckets[client_id] = (tokens, now)
+
+        # Drop full buckets now and then so idle clients don't accumulate
+        if len(self._buckets) > 100000:
+            horizon = self.burst / self.rate
+            self._buckets = {
+                key: value for key, value in self._buckets.items() if now - value[1] < horizon
+            }
+        return False, (1 - tokens) / self.rate
+
+
+class AdmissionController:
+    """Admission decisions for all routes."""
+
+    def __init__(
+        self,
+        default_limit: int,
+        route_limits: Dict[str, int],
+        queue_size: int,
+        max_wait: float,
+        rate: float = 0.0,
+        burst: int = 0,
+        trust_forwarded_for: bool = False
+    ):
+        """
+        Args:
+            default_limit: Concurrency limit of routes without their own
+            route_limits: Route path (as declared, e.g. "/api/tiles/{z}/{x}/{y}.png") -> limit
+            queue_size: Wait queue length per route
+            max_wait: Seconds a request may wait for a slot
+            rate: Requests per second per client (0 disables rate limiting)
+            burst: Token bucket capacity per client
+            trust_forwarded_for: Identify clients by X-Forwarded-For (behind a proxy)
+        """
+        self.default_limit = default_limit
+        self.route_limits = route_limits
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.trust_forwarded_for = trust_forwarded_for
+        self.rate_limiter: Optional[RateLimiter] = RateLimiter(rate, max(burst, 1)) if rate > 0 else None
+        self.limits: Dict[str, ConcurrencyLimit] = {}
+
+    def bind(self, backend: CacheBackend):
+        """Share rate-limit state through the cache backend where possible."""
+        if self.rate_limiter:
+            self.rate_limiter.bind(backend)
+
+    def limit_for(self, route: str) -> ConcurrencyLimit:
+        limit = self.limits.get(route)
+        if limit is None:
+            limit = ConcurrencyLimit(
+                self.route_limits.get(route, self.default_limit), self.queue_size, self.max_wait
+            )
+            self.limits[route] = limit
+        return limit
+
+    def client_id(self, scope: dict) -> str:
+        if self.trust_forwarded_for:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def stats(self) -> dict:
+        return {
+            "routes": {route: limit.stats() for route, limit in sorted(self.limits.items())},
+            "rate_limited": self.rate_limiter.limited if self.rate_limiter else 0,
+        }
+
+
+def parse_route_limits(value: str) -> Dict[str, int]:
+    """
+    Parse "path=limit,path=limit" into a dict.
+
+    Raises:
+        ValueError: On a malformed entry
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        path, _, limit = entry.rpartition("=")
+        if not path:
+            raise ValueError(f"Invalid route limit '{entry}', expected path=limit")
+        limits[path.strip()] = int(limit)
+    return limits
+
+
+def _route_path(scope: dict, routes: Iterable) -> str:
+    """Declared path of the route serving the request (UNMATCHED_ROUTE if none)."""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        try:
+            if controller.rate_limiter:
+                await controller.rate_limiter.check(controller.client_id(scope))
+            limit = controller.limit_for(_route_path(scope, scope["app"].router.routes))
+            await limit.acquire()
+        except Rejected as rejection:
+            await self._reject(send, rejection)
+            return
+
+        start = time.perf_counter()
+        try:
+            # Held until the response is fully sent, streaming included
+            await self.app(scope, receive, send)
+        finally:
+            limit.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, rejection: Rejected):
+        body = json.dumps({"detail": rejection.detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(rejection.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
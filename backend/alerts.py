@@ -0,0 +1,421 @@
+"""
+Threshold Alert Engine
+Subscriptions indexed by station, metric and sorted threshold, evaluated
+incrementally against each new reading with hysteresis
+"""
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import secrets
+import socket
+import uuid
+from bisect import bisect_right, insort
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from aqi import POLLUTANTS
+from cache_manager import CacheManager
+from models import AlertEvent, AlertSubscriptionCreated, AlertSubscriptionRecord, StationData
+
+logger = logging.getLogger(__name__)
+
+
+METRICS: Tuple[str, ...] = ("aqi",) + POLLUTANTS
+
+SUBSCRIPTION_PREFIX = "alerts:subscription:"
+# Changed on every subscribe/unsubscribe, so workers know to re-read
+VERSION_KEY = "alerts:version"
+# Claimed by the worker delivering an event, so a reading ingested by
+# several workers is delivered once
+EVENT_CLAIM_PREFIX = "alerts:event:"
+EVENT_CLAIM_TTL_SECONDS = 86400
+
+# Events kept in memory for /api/alerts/events
+RECENT_EVENTS = 500
+
+
+class SubscriptionLimitError(Exception):
+    """Raised when the maximum number of subscriptions is reached."""
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def check_webhook_url(url: str, allow_private: bool = False):
+    """
+    Check that a webhook URL is safe for the server to POST to.
+
+    The host must resolve, and only to public addresses: loopback,
+    private, link-local (including cloud metadata), multicast and
+    reserved targets are refused unless allow_private is set. Checked
+    when subscribing and again before each delivery, since DNS can change.
+
+    Args:
+        url: Webhook URL
+        allow_private: Accept non-public targets (local development)
+
+    Raises:
+        ValueError: If the URL is malformed, not http(s) or not public
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL with a host")
+    if parts.username or parts.password:
+        raise ValueError("webhook_url must not contain credentials")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise ValueError("webhook_url has an invalid port")
+    if allow_private:
+        return
+
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+    except socket.gaierror:
+        raise ValueError(f"webhook_url host '{parts.hostname}' does not resolve")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"webhook_url host '{parts.hostname}' is not a public address")
+
+
+class _ThresholdIndex:
+    """Sorted thresholds of one (station, metric) and their alert state."""
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.subscribers: Dict[float, List[str]] = {}
+        self.active: Set[str] = set()
+        self.last: Optional[float] = None
+
+    def add(self, threshold: float, subscription_id: str):
+        if threshold not in self.subscribers:
+            insort(self.thresholds, threshold)
+            self.subscribers[threshold] = []
+        self.subscribers[threshold].append(subscription_id)
+        # New subscriptions start armed against the current value
+        if self.last is not None and self.last >= threshold:
+            self.active.add(subscription_id)
+
+    def remove(self, threshold: float, subscription_id: str):
+        ids = self.subscribers.get(threshold, [])
+        if subscription_id in ids:
+            ids.remove(subscription_id)
+        if not ids and threshold in self.subscribers:
+            del self.subscribers[threshold]
+            self.thresholds.remove(threshold)
+        self.active.discard(subscription_id)
+
+    def between(self, low: float, high: float) -> List[str]:
+        """Subscriptions with low < threshold <= high (bisect, O(log n + k))."""
+        start = bisect_right(self.thresholds, low)
+        end = bisect_right(self.thresholds, high)
+        return [
+            subscription_id
+            for threshold in self.thresholds[start:end]
+            for subscription_id in self.subscribers[threshold]
+        ]
+
+
+class AlertEngine:
+    """
+    Emits threshold crossing events for new readings.
+
+    A subscription triggers when its metric rises to or above the threshold
+    and clears once it falls below threshold - hysteresis; it does not
+    trigger again until cleared. Each reading is compared only against the
+    thresholds between the previous and the new value, so the cost per
+    reading is O(log n) in the number of subscriptions plus the events
+    emitted.
+
+    Each worker evaluates the readings it ingests against all
+    subscriptions, kept in sync through the backend (see sync); events are
+    claimed in the backend before delivery so each is delivered once.
+    """
+
+    def __init__(
+        self,
+        cache_manager: CacheManager,
+        hysteresis: float = 5.0,
+        queue_size: int = 10000,
+        max_subscriptions: int = 10000,
+        allow_private_webhooks: bool = False,
+        sync_seconds: float = 5.0
+    ):
+        """
+        Args:
+            cache_manager: CacheManager used to persist subscriptions
+            hysteresis: Drop below the threshold (in metric units) that clears an alert
+            queue_size: Maximum undelivered events before new ones are dropped
+            max_subscriptions: Subscriptions accepted in total
+            allow_private_webhooks: Accept webhooks on non-public addresses
+            sync_seconds: How often to pick up other workers' subscription changes
+        """
+        self.cache_manager = cache_manager
+        self.hysteresis = hysteresis
+        self.max_subscriptions = max_subscriptions
+        self.allow_private_webhooks = allow_private_webhooks
+        self.sync_seconds = sync_seconds
+        self.subscriptions: Dict[str, AlertSubscriptionRecord] = {}
+        self.events: "asyncio.Queue[AlertEvent]" = asyncio.Queue(maxsize=queue_size)
+        self.recent: Deque[AlertEvent] = deque(maxlen=RECENT_EVENTS)
+        self._index: Dict[str, Dict[str, _ThresholdIndex]] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._syncer: Optional[asyncio.Task] = None
+        self._version: Optional[bytes] = None
+        self._synced = False
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def load(self):
+        """Load persisted subscriptions into the index."""
+        await self.sync()
+        logger.info("Loaded %s alert subscriptions", len(self.subscriptions))
+
+    async def sync(self) -> bool:
+        """
+        Bring the index in line with the stored subscriptions.
+
+        Every worker evaluates the readings it ingests, so each needs all
+        subscriptions, including those created through other workers. A
+        single read of the version key tells whether anything changed;
+        only then are the subscriptions re-read. Alert state of kept
+        subscriptions is preserved.
+
+        Returns:
+            True if the stored subscriptions had changed
+        """
+        backend = self.cache_manager.backend
+        version = await backend.get(VERSION_KEY)
+        if self._synced and version == self._version:
+            return False
+
+        keys = [key async for key in backend.scan_keys(SUBSCRIPTION_PREFIX)]
+        stored = {}
+        for payload in await backend.mget(keys):
+            if payload:
+                subscription = AlertSubscriptionRecord.model_validate_json(payload)
+                stored[subscription.id] = subscription
+        for subscription_id in set(self.subscriptions) - set(stored):
+            self._unindex_subscription(subscription_id)
+        for subscription_id, subscription in stored.items():
+            if subscription_id not in self.subscriptions:
+                self._index_subscription(subscription)
+        self._version = version
+        self._synced = True
+        return True
+
+    async def _bump_version(self):
+        await self.cache_manager.backend.set(VERSION_KEY, uuid.uuid4().hex.encode())
+
+    def _index_subscription(self, subscription: AlertSubscriptionRecord):
+        self.subscriptions[subscription.id] = subscription
+        metrics = self._index.setdefault(subscription.station_id, {})
+        metrics.setdefault(subscription.metric, _ThresholdIndex()).add(
+            subscription.threshold, subscription.id
+        )
+
+    async def subscribe(
+        self,
+        city: str,
+        station_id: str,
+        metric: str,
+        threshold: float,
+        webhook_url: Optional[str] = None
+    ) -> AlertSubscriptionCreated:
+        """
+        Register a subscription.
+
+        Args:
+            city: City name (for event payloads)
+            station_id: WAQI station identifier
+            metric: "aqi" or a pollutant name
+            threshold: Value at or above which the alert triggers
+            webhook_url: URL events are POSTed to (logged only if None)
+
+        Returns:
+            The new subscription with its owner token (only its hash is kept)
+
+        Raises:
+            ValueError: On an unknown metric or an unsafe webhook URL
+            SubscriptionLimitError: If max_subscriptions is reached
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}")
+        if webhook_url:
+            await check_webhook_url(webhook_url, self.allow_private_webhooks)
+        await self.sync()
+        if len(self.subscriptions) >= self.max_subscriptions:
+            raise SubscriptionLimitError(f"Subscription limit of {self.max_subscriptions} reached")
+
+        token = secrets.token_urlsafe(24)
+        subscription = AlertSubscriptionRecord(
+            id=uuid.uuid4().hex,
+            city=city,
+            station_id=station_id,
+            metric=metric,
+            threshold=threshold,
+            webhook_url=webhook_url,
+            token_hash=_hash_token(token),
+        )
+        await self.cache_manager.backend.set(
+            f"{SUBSCRIPTION_PREFIX}{subscription.id}", subscription.model_dump_json().encode()
+        )
+        self._index_subscription(subscription)
+        await self._bump_version()
+        return AlertSubscriptionCreated(**subscription.model_dump(exclude={"token_hash"}), token=token)
+
+    def owns(self, subscription_id: str, token: Optional[str]) -> bool:
+        """Whether token is the owner token of an existing subscription."""
+        subscription = self.subscriptions.get(subscription_id)
+        return bool(
+            subscription and token and subscription.token_hash
+            and secrets.compare_digest(subscription.token_hash, _hash_token(token))
+        )
+
+    async def unsubscribe(self, subscription_id: str) -> bool:
+        """
+        Remove a subscription.
+
+        Returns:
+            False if it did not exist
+        """
+        if not self._unindex_subscription(subscription_id):
+            return False
+        await self.cache_manager.backend.delete(f"{SUBSCRIPTION_PREFIX}{subscription_id}")
+        await self._bump_version()
+        return True
+
+    def _unindex_subscription(self, subscription_id: str) -> bool:
+        subscription = self.subscriptions.pop(subscription_id, None)
+        if subscription is None:
+            return False
+        self._index[subscription.station_id][subscription.metric].remove(
+            subscription.threshold, subscription_id
+        )
+        return True
+
+    def observe(self, station_id: str, data: StationData):
+        """
+        Evaluate a new reading against the station's subscriptions.
+
+        Args:
+            station_id: WAQI station identifier
+            data: Reading just cached
+        """
+        for metric, index in self._index.get(station_id, {}).items():
+            value = data.aqi if metric == "aqi" else getattr(data.pollutants, metric)
+            if value is None:
+                continue
+
+            previous, index.last = index.last, value
+            if previous is None:
+                # First reading since startup: arm silently, don't replay old crossings
+                index.active.update(index.between(float("-inf"), value))
+            elif value > previous:
+                for subscription_id in index.between(previous, value):
+                    if subscription_id not in index.active:
+                        index.active.add(subscription_id)
+                        self._emit(subscription_id, value, "triggered", data.timestamp)
+            elif value < previous:
+                # Thresholds t with value < t - hysteresis <= previous
+                for subscription_id in index.between(value + self.hysteresis, previous + self.hysteresis):
+                    if subscription_id in index.active:
+                        index.active.discard(subscription_id)
+                        self._emit(subscription_id, value, "cleared", data.timestamp)
+
+    def observe_many(self, stations: List[Tuple[str, StationData]]):
+        """Evaluate a batch of new readings."""
+        for station_id, data in stations:
+            self.observe(station_id, data)
+
+    def _emit(self, subscription_id: str, value: float, state: str, observed_at: str):
+        subscription = self.subscriptions[subscription_id]
+        event = AlertEvent(
+            subscription_id=subscription_id,
+            city=subscription.city,
+            station_id=subscription.station_id,
+            metric=subscription.metric,
+            threshold=subscription.threshold,
+            value=value,
+            state=state,
+            observed_at=observed_at,
+            emitted_at=datetime.utcnow().isoformat(),
+        )
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Alert queue full, dropping event for subscription %s", subscription_id)
+
+    def start(self):
+        """Start delivering queued events and syncing subscriptions."""
+        if self._worker is None:
+            # Redirects are not followed: they could point past check_webhook_url
+            self._client = httpx.AsyncClient(timeout=5.0, follow_redirects=False)
+            self._worker = asyncio.create_task(self._deliver())
+            self._syncer = asyncio.create_task(self._sync_periodically())
+
+    async def stop(self):
+        """Stop delivery; undelivered events are discarded."""
+        for task in (self._worker, self._syncer):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._worker = self._syncer = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _sync_periodically(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("Error syncing alert subscriptions: %s", e)
+
+    async def _claim(self, event: AlertEvent) -> bool:
+        """
+        Claim an event for delivery.
+
+        Unsharded workers all ingest every station and emit the same
+        events; the first to claim one delivers it.
+        """
+        key = f"{EVENT_CLAIM_PREFIX}{event.subscription_id}:{event.state}:{event.observed_at}"
+        (claimed,) = await self.cache_manager.backend.set_nx_many(
+            [key], b"1", EVENT_CLAIM_TTL_SECONDS
+        )
+        return claimed
+
+    async def _deliver(self):
+        while True:
+            event = await self.events.get()
+            subscription = self.subscriptions.get(event.subscription_id)
+            try:
+                if subscription is None or not await self._claim(event):
+                    continue
+                self.recent.append(event)
+                if subscription.webhook_url:
+                    await check_webhook_url(subscription.webhook_url, self.allow_private_webhooks)
+                    response = await self._client.post(
+                        subscription.webhook_url, content=event.model_dump_json(),
+                        headers={"Content-Type": "application/json"}
+                    )
+                    response.raise_for_status()
+                else:
+                    logger.info("Alert: %s", json.dumps(event.model_dump()))
+            except Exception as e:
+                logger.error("Error delivering alert %s: %s", event.subscription_id, e)
+            finally:
+                self.events.task_done()
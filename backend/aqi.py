@@ -0,0 +1,258 @@
+"""
+Vectorized US EPA AQI Engine
+Breakpoint interpolation, category classification and dominant pollutant
+selection over NumPy arrays of readings
+"""
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from models import Pollutants, StationData
+
+
+# Column order of every pollutant matrix handled by this module.
+# Matches the field order of the Pollutants model.
+POLLUTANTS: Tuple[str, ...] = ("pm25", "pm10", "no2", "o3", "so2", "co")
+
+CATEGORIES: Tuple[str, ...] = (
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+)
+
+# Upper AQI bound of each category (the last one is open-ended)
+_CATEGORY_UPPER = np.array([50, 100, 150, 200, 300], dtype=np.float64)
+
+# Index ranges shared by all pollutants
+_INDEX_LOW = np.array([0, 51, 101, 151, 201, 301], dtype=np.float64)
+_INDEX_HIGH = np.array([50, 100, 150, 200, 300, 500], dtype=np.float64)
+
+# Concentration breakpoints (low, high) per category, EPA 2024 tables.
+# Units: pm25/pm10 ug/m3, co ppm, no2/o3/so2 ppb. The top ozone band uses
+# the 1-hour table since the 8-hour table stops at 300.
+_BREAKPOINTS: Dict[str, Tuple[Tuple[float, float], ...]] = {
+    "pm25": ((0.0, 9.0), (9.1, 35.4), (35.5, 55.4), (55.5, 125.4), (125.5, 225.4), (225.5, 325.4)),
+    "pm10": ((0, 54), (55, 154), (155, 254), (255, 354), (355, 424), (425, 604)),
+    "no2": ((0, 53), (54, 100), (101, 360), (361, 649), (650, 1249), (1250, 2049)),
+    "o3": ((0, 54), (55, 70), (71, 85), (86, 105), (106, 200), (405, 604)),
+    "so2": ((0, 35), (36, 75), (76, 185), (186, 304), (305, 604), (605, 1004)),
+    "co": ((0.0, 4.4), (4.5, 9.4), (9.5, 12.4), (12.5, 15.4), (15.5, 30.4), (30.5, 50.4)),
+}
+
+# Decimal places concentrations are truncated to before interpolation
+_TRUNCATE_DIGITS: Dict[str, int] = {
+    "pm25": 1, "pm10": 0, "no2": 0, "o3": 0, "so2": 0, "co": 1,
+}
+
+_CONC_LOW = {p: np.array([b[0] for b in bps], dtype=np.float64) for p, bps in _BREAKPOINTS.items()}
+_CONC_HIGH = {p: np.array([b[1] for b in bps], dtype=np.float64) for p, bps in _BREAKPOINTS.items()}
+
+
+class AQIResult(NamedTuple):
+    """Vectorized AQI evaluation result, one element per reading."""
+    aqi: np.ndarray        # float64, NaN where no pollutant was available
+    category: np.ndarray   # int8 index into CATEGORIES, -1 where aqi is NaN
+    dominant: np.ndarray   # int8 index into POLLUTANTS, -1 where unknown
+
+    def category_names(self) -> List[str]:
+        """Category labels for each reading ("" where unknown)."""
+        return [CATEGORIES[c] if c >= 0 else "" for c in self.category.tolist()]
+
+    def dominant_names(self) -> List[str]:
+        """Dominant pollutant names for each reading ("" where unknown)."""
+        return [POLLUTANTS[d] if d >= 0 else "" for d in self.dominant.tolist()]
+
+
+def sub_index(pollutant: str, concentrations) -> np.ndarray:
+    """
+    Convert pollutant concentrations to AQI sub-indices by linear
+    interpolation between EPA breakpoints.
+
+    Args:
+        pollutant: One of POLLUTANTS
+        concentrations: Array-like of concentrations (NaN for missing)
+
+    Returns:
+        Array of sub-indices (rounded, capped at 500, NaN preserved)
+    """
+    if pollutant not in _BREAKPOINTS:
+        raise ValueError(f"Unknown pollutant '{pollutant}'")
+
+    conc = np.asarray(concentrations, dtype=np.float64)
+    scale = 10.0 ** _TRUNCATE_DIGITS[pollutant]
+    conc = np.floor(np.clip(conc, 0.0, None) * scale) / scale
+
+    c_low = _CONC_LOW[pollutant]
+    c_high = _CONC_HIGH[pollutant]
+
+    # First band whose upper bound is >= the concentration
+    band = np.searchsorted(c_high, conc, side="left")
+    above_scale = band >= len(c_high)
+    band = np.minimum(band, len(c_high) - 1)
+
+    lo, hi = c_low[band], c_high[band]
+    i_lo, i_hi = _INDEX_LOW[band], _INDEX_HIGH[band]
+
+    # Values falling in the gap between two bands map to the lower bound
+    # of the upper band
+    conc_in_band = np.clip(conc, lo, hi)
+    result = np.rint((i_hi - i_lo) / (hi - lo) * (conc_in_band - lo) + i_lo)
+    result[above_scale] = _INDEX_HIGH[-1]
+    result[np.isnan(conc)] = np.nan
+    return result
+
+
+def concentration(pollutant: str, indices) -> np.ndarray:
+    """
+    Convert AQI sub-indices back to concentrations (inverse of sub_index,
+    up to its rounding).
+
+    Args:
+        pollutant: One of POLLUTANTS
+        indices: Array-like of sub-indices (NaN for missing)
+
+    Returns:
+        Array of concentrations (NaN preserved)
+    """
+    if pollutant not in _BREAKPOINTS:
+        raise ValueError(f"Unknown pollutant '{pollutant}'")
+
+    index = np.clip(np.asarray(indices, dtype=np.float64), 0.0, _INDEX_HIGH[-1])
+
+    band = np.minimum(np.searchsorted(_INDEX_HIGH, index, side="left"), len(_INDEX_HIGH) - 1)
+    lo, hi = _CONC_LOW[pollutant][band], _CONC_HIGH[pollutant][band]
+    i_lo, i_hi = _INDEX_LOW[band], _INDEX_HIGH[band]
+
+    # Indices between two bands (e.g. 50.5) belong to the lower bound of the upper band
+    index_in_band = np.clip(index, i_lo, i_hi)
+    return (hi - lo) / (i_hi - i_lo) * (index_in_band - i_lo) + lo
+
+
+def sub_indices(concentrations: np.ndarray) -> np.ndarray:
+    """
+    Convert a concentration matrix to a sub-index matrix.
+
+    Args:
+        concentrations: Array of shape (n, len(POLLUTANTS))
+
+    Returns:
+        Array of the same shape holding sub-indices
+    """
+    concentrations = np.asarray(concentrations, dtype=np.float64)
+    result = np.empty_like(concentrations)
+    for column, pollutant in enumerate(POLLUTANTS):
+        result[:, column] = sub_index(pollutant, concentrations[:, column])
+    return result
+
+
+def categorize(aqi) -> np.ndarray:
+    """
+    Classify AQI values into EPA categories.
+
+    Args:
+        aqi: Array-like of AQI values
+
+    Returns:
+        int8 array of indices into CATEGORIES (-1 for NaN)
+    """
+    aqi = np.asarray(aqi, dtype=np.float64)
+    codes = np.searchsorted(_CATEGORY_UPPER, aqi, side="left").astype(np.int8)
+    codes[np.isnan(aqi)] = -1
+    return codes
+
+
+def category_name(aqi: float) -> str:
+    """Category label for a single AQI value."""
+    code = int(categorize([aqi])[0])
+    return CATEGORIES[code] if code >= 0 else ""
+
+
+def evaluate(indices: np.ndarray) -> AQIResult:
+    """
+    Compute overall AQI, category and dominant pollutant from a
+    sub-index matrix.
+
+    Args:
+        indices: Array of shape (n, len(POLLUTANTS)), NaN for missing
+
+    Returns:
+        AQIResult with one entry per row
+    """
+    indices = np.asarray(indices, dtype=np.float64).reshape(-1, len(POLLUTANTS))
+    missing = np.isnan(indices)
+    all_missing = missing.all(axis=1)
+
+    filled = np.where(missing, -np.inf, indices)
+    dominant = filled.argmax(axis=1).astype(np.int8)
+    aqi = filled.max(axis=1)
+
+    dominant[all_missing] = -1
+    aqi[all_missing] = np.nan
+
+    return AQIResult(aqi=aqi, category=categorize(aqi), dominant=dominant)
+
+
+def evaluate_concentrations(concentrations: np.ndarray) -> AQIResult:
+    """
+    Compute overall AQI, category and dominant pollutant from raw
+    concentrations.
+
+    Args:
+        concentrations: Array of shape (n, len(POLLUTANTS)), NaN for missing
+
+    Returns:
+        AQIResult with one entry per row
+    """
+    return evaluate(sub_indices(concentrations))
+
+
+def pollutant_matrix(readings: Sequence[Pollutants]) -> np.ndarray:
+    """
+    Pack Pollutants models into a float matrix (NaN for missing values).
+
+    Args:
+        readings: Sequence of Pollutants
+
+    Returns:
+        Array of shape (len(readings), len(POLLUTANTS))
+    """
+    rows = [
+        [getattr(reading, pollutant) for pollutant in POLLUTANTS]
+        for reading in readings
+    ]
+    if not rows:
+        return np.empty((0, len(POLLUTANTS)), dtype=np.float64)
+    # None becomes NaN through the float conversion of an object array
+    return np.array(rows, dtype=object).astype(np.float64)
+
+
+def classify_stations(stations: Sequence[StationData]) -> AQIResult:
+    """
+    Classify a batch of station readings.
+
+    WAQI reports per-pollutant values (``iaqi``) already on the AQI scale,
+    so they are treated as sub-indices. The station's own ``aqi`` is kept
+    as the overall index when present; the maximum sub-index is used
+    otherwise.
+
+    Args:
+        stations: Sequence of StationData
+
+    Returns:
+        AQIResult with one entry per station
+    """
+    result = evaluate(pollutant_matrix([s.pollutants for s in stations]))
+
+    reported = np.array([s.aqi for s in stations], dtype=np.float64)
+    aqi = np.where(reported > 0, reported, result.aqi)
+
+    # Prefer WAQI's dominant pollutant when it names a known column
+    dominant = result.dominant.copy()
+    for row, station in enumerate(stations):
+        if station.dominant in POLLUTANTS:
+            dominant[row] = POLLUTANTS.index(station.dominant)
+
+    return AQIResult(aqi=aqi, category=categorize(aqi), dominant=dominant)
@@ -0,0 +1,270 @@
+"""
+Interpolated AQI Surfaces
+Inverse-distance-weighted AQI grids and map tiles computed with NumPy
+over the latest station readings
+"""
+import math
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from aqi import categorize
+
+
+TILE_SIZE = 256
+MAX_ZOOM = 18
+
+# Stations further away than this don't influence a cell; cells with no
+# station in range are left empty rather than extrapolated
+DEFAULT_RADIUS_KM = 150.0
+DEFAULT_POWER = 2.0
+
+KM_PER_DEGREE = 111.195
+
+# Cells evaluated per NumPy pass, bounding memory to cells x stations
+_CHUNK_CELLS = 16384
+
+# RGBA per EPA category (index into aqi.CATEGORIES)
+CATEGORY_COLORS = np.array([
+    (0, 228, 0, 150),
+    (255, 255, 0, 150),
+    (255, 126, 0, 150),
+    (255, 0, 0, 150),
+    (143, 63, 151, 150),
+    (126, 0, 35, 150),
+], dtype=np.uint8)
+
+
+class StationPoints(NamedTuple):
+    """Station coordinates and AQI values, one element per station."""
+    lat: np.ndarray
+    lon: np.ndarray
+    aqi: np.ndarray
+
+    @classmethod
+    def from_lists(cls, lats, lons, values) -> "StationPoints":
+        """Build points, dropping stations without a usable AQI."""
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = np.asarray(lons, dtype=np.float64)
+        aqi = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(aqi)
+        return cls(lat[valid], lon[valid], aqi[valid])
+
+    def near(self, south: float, west: float, north: float, east: float,
+             radius_km: float) -> "StationPoints":
+        """Stations that can influence a cell inside the bounding box."""
+        pad_lat = radius_km / KM_PER_DEGREE
+        max_lat = min(max(abs(south), abs(north)) + pad_lat, 89.0)
+        pad_lon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(max_lat)))
+        mask = (
+            (self.lat >= south - pad_lat) & (self.lat <= north + pad_lat)
+            & (self.lon >= west - pad_lon) & (self.lon <= east + pad_lon)
+        )
+        return StationPoints(self.lat[mask], self.lon[mask], self.aqi[mask])
+
+
+def idw(
+    points: StationPoints,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    power: float = DEFAULT_POWER,
+    radius_km: float = DEFAULT_RADIUS_KM
+) -> np.ndarray:
+    """
+    Inverse-distance-weighted AQI at arbitrary locations.
+
+    Distances use an equirectangular approximation, accurate to well under
+    1% at the radii involved.
+
+    Args:
+        points: Station readings
+        lats: Latitudes of the cells (any shape)
+        lons: Longitudes of the cells (same shape as lats)
+        power: Distance exponent
+        radius_km: Search radius
+
+    Returns:
+        AQI per cell (shape of lats), NaN where no station is in range
+    """
+    shape = np.shape(lats)
+    cell_lat = np.ravel(lats)
+    cell_lon = np.ravel(lons)
+    result = np.full(cell_lat.size, np.nan)
+    if points.aqi.size == 0:
+        return result.reshape(shape)
+
+    radius2 = (radius_km / KM_PER_DEGREE) ** 2
+    station_lat = points.lat[np.newaxis, :]
+    station_lon = points.lon[np.newaxis, :]
+
+    for start in range(0, cell_lat.size, _CHUNK_CELLS):
+        chunk_lat = cell_lat[start:start + _CHUNK_CELLS, np.newaxis]
+        chunk_lon = cell_lon[start:start + _CHUNK_CELLS, np.newaxis]
+
+        dy = chunk_lat - station_lat
+        dx = (chunk_lon - station_lon) * np.cos(np.radians((chunk_lat + station_lat) / 2))
+        # Squared distance in degrees of latitude; floor avoids division by
+        # zero exactly on a station (which then dominates the weights)
+        d2 = np.maximum(dx * dx + dy * dy, 1e-12)
+
+        weights = np.where(d2 <= radius2, d2 ** (-power / 2), 0.0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[start:start + _CHUNK_CELLS] = (weights @ points.aqi) / total
+
+    return result.reshape(shape)
+
+
+def bbox_grid(
+    west: float, south: float, east: float, north: float, width: int, height: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cell-center coordinates of a regular lat/lon grid.
+
+    Returns:
+        (lats, lons), each (height, width), row 0 at the north edge
+    """
+    lat = north - (np.arange(height) + 0.5) * (north - south) / height
+    lon = west + (np.arange(width) + 0.5) * (east - west) / width
+    lons, lats = np.meshgrid(lon, lat)
+    return lats, lons
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of a Web Mercator (slippy map) tile."""
+    n = 2 ** z
+
+    def lat(row: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def tile_grid(z: int, x: int, y: int, size: int = TILE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pixel-center coordinates of a Web Mercator tile.
+
+    Returns:
+        (lats, lons), each (size, size), row 0 at the north edge
+    """
+    n = 2 ** z
+    pixels = np.arange(size) + 0.5
+    lon = (x + pixels / size) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixels / size) / n))))
+    lons, lats = np.meshgrid(lon, lat)
+    return lats, lons
+
+
+def colorize(values: np.ndarray) -> np.ndarray:
+    """RGBA image (h, w, 4) in EPA category colors, transparent where NaN."""
+    codes = categorize(values)
+    image = CATEGORY_COLORS[np.clip(codes, 0, None)]
+    image[codes < 0] = 0
+    return image
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """
+    Encode an 8-bit RGBA image as PNG (no imaging library needed).
+
+    Args:
+        rgba: uint8 array of shape (height, width, 4)
+
+    Returns:
+        PNG file bytes
+    """
+    height, width, _ = rgba.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    # Filter type 0 (none) in front of every scanline
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_tile(
+    points: StationPoints,
+    z: int,
+    x: int,
+    y: int,
+    size: int = TILE_SIZE,
+    radius_km: float = DEFAULT_RADIUS_KM
+) -> bytes:
+    """
+    Render one map tile of the interpolated AQI surface.
+
+    Args:
+        points: Station readings
+        z: Zoom level
+        x: Tile column
+        y: Tile row
+        size: Tile edge in pixels
+        radius_km: Search radius
+
+    Returns:
+        PNG bytes
+    """
+    west, south, east, north = tile_bounds(z, x, y)
+    nearby = points.near(south, west, north, east, radius_km)
+    if nearby.aqi.size == 0:
+        values = np.full((size, size), np.nan)
+    else:
+        values = idw(nearby, *tile_grid(z, x, y, size), radius_km=radius_km)
+    return encode_png(colorize(values))
+
+
+def render_grid(
+    points: StationPoints,
+    west: float,
+    south: float,
+    east: float,
+    north: float,
+    width: int,
+    height: int,
+    radius_km: float = DEFAULT_RADIUS_KM
+) -> np.ndarray:
+    """
+    Interpolated AQI over a bounding box.
+
+    Returns:
+        (height, width) AQI values, row 0 at the north edge, NaN where empty
+    """
+    nearby = points.near(south, west, north, east, radius_km)
+    return idw(nearby, *bbox_grid(west, south, east, north, width, height), radius_km=radius_km)
+
+
+class TileCache:
+    """Small LRU cache; callers put the refresh version in the key."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: object):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
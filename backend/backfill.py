@@ -0,0 +1,313 @@
+"""
+Historical Backfill
+Imports daily AQI history from CSV exports into the daily history store,
+parsing files in parallel across a process pool
+"""
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from aqi import POLLUTANTS
+from cache_manager import CacheManager
+
+logger = logging.getLogger(__name__)
+
+
+# WAQI dataset export: "Date,Country,City,Specie,count,min,max,median,variance",
+# one row per city, day and species, preceded by "#" comment lines
+DATASET_FORMAT = "dataset"
+# aqicn.org per-station export: "date, pm25, pm10, o3, no2, so2, co", one
+# row per day; the station is named by the file (station ID or city name)
+STATION_FORMAT = "station"
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# (min, max, median, count) of one pollutant on one day
+Aggregate = Tuple[float, float, float, int]
+# source key ("city:<country>:<name>" or "file:<stem>") -> date -> pollutant -> aggregate
+ShardResult = Dict[str, Dict[str, Dict[str, Aggregate]]]
+
+
+class Shard(NamedTuple):
+    """Byte range of one file parsed by one worker."""
+    path: str
+    format: str
+    columns: Tuple[str, ...]
+    start: int
+    end: int          # -1 for the whole (compressed) file
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _read_header(path: str) -> Tuple[str, Tuple[str, ...], int]:
+    """
+    Detect the format of a file.
+
+    Returns:
+        (format, lower-cased column names, byte offset of the first data row)
+
+    Raises:
+        ValueError: If the header matches no known format
+    """
+    with _open(path) as f:
+        offset = 0
+        for line in f:
+            offset += len(line)
+            text = line.decode("utf-8-sig").strip()
+            if not text or text.startswith("#"):
+                continue
+            columns = tuple(column.strip().lower() for column in next(csv.reader([text])))
+            if {"date", "city", "specie", "median"} <= set(columns):
+                return DATASET_FORMAT, columns, offset
+            if columns[0] == "date" and set(columns[1:]) & set(POLLUTANTS):
+                return STATION_FORMAT, columns, offset
+            raise ValueError(f"{path}: unrecognized header {text!r}")
+    raise ValueError(f"{path}: no header found")
+
+
+def plan_shards(paths: Iterable[str], chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[Shard]:
+    """
+    Split files into byte ranges of about chunk_bytes.
+
+    Each line belongs to the range it starts in. Compressed files cannot
+    be split and become one shard each.
+    """
+    shards = []
+    for path in paths:
+        file_format, columns, data_start = _read_header(path)
+        if path.endswith(".gz"):
+            shards.append(Shard(path, file_format, columns, data_start, -1))
+            continue
+        size = os.path.getsize(path)
+        for start in range(data_start, max(size, data_start + 1), chunk_bytes):
+            shards.append(Shard(path, file_format, columns, start, min(start + chunk_bytes, size)))
+    return shards
+
+
+def _iter_lines(shard: Shard) -> Iterable[str]:
+    with _open(shard.path) as f:
+        if shard.end < 0:
+            # Whole file; gzip seeks forward by decompressing
+            f.seek(shard.start)
+            for line in f:
+                yield line.decode("utf-8", "replace")
+            return
+
+        if shard.start > 0:
+            # Skip the line straddling the start; the previous shard owns it
+            f.seek(shard.start - 1)
+            f.readline()
+        position = f.tell()
+        while position < shard.end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode("utf-8", "replace")
+
+
+def _day(value: str) -> Optional[str]:
+    """Normalize "2024-01-05" / "2024/1/5" to an ISO date."""
+    try:
+        year, month, day = value.strip().replace("/", "-").split("-")
+        return f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+    except ValueError:
+        return None
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_shard(shard: Shard) -> Tuple[ShardResult, int, int]:
+    """
+    Parse one shard into daily aggregates (runs in a worker process).
+
+    Returns:
+        (aggregates by source key, rows used, rows skipped)
+    """
+    result: ShardResult = {}
+    used = skipped = 0
+    index = {column: i for i, column in enumerate(shard.columns)}
+    station_key = f"file:{Path(shard.path).name.split('.')[0]}"
+
+    for row in csv.reader(line for line in _iter_lines(shard) if not line.startswith("#")):
+        if not row:
+            continue
+        try:
+            day = _day(row[index["date"]])
+            if day is None:
+                skipped += 1
+                continue
+
+            if shard.format == DATASET_FORMAT:
+                specie = row[index["specie"]].strip().lower()
+                median = _number(row[index["median"]])
+                if specie not in POLLUTANTS or median is None:
+                    skipped += 1
+                    continue
+                aggregate = (
+                    _number(row[index["min"]]) if "min" in index else median,
+                    _number(row[index["max"]]) if "max" in index else median,
+                    median,
+                    int(_number(row[index["count"]]) or 1) if "count" in index else 1,
+                )
+                country = row[index["country"]].strip().upper() if "country" in index else ""
+                key = f"city:{country}:{row[index['city']].strip().lower()}"
+                result.setdefault(key, {}).setdefault(day, {})[specie] = aggregate
+                used += 1
+            else:
+                pollutants = result.setdefault(station_key, {}).setdefault(day, {})
+                for pollutant in POLLUTANTS:
+                    if pollutant in index and index[pollutant] < len(row):
+                        value = _number(row[index[pollutant]])
+                        if value is not None:
+                            pollutants[pollutant] = (value, value, value, 1)
+                used += 1
+        except (IndexError, KeyError):
+            skipped += 1
+
+    return result, used, skipped
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Files given directly plus *.csv / *.csv.gz inside given directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                str(p) for p in Path(path).rglob("*") if p.name.endswith((".csv", ".csv.gz"))
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def _source_name(key: str) -> str:
+    """City name or file stem of a source key (without the country)."""
+    kind, name = key.split(":", 1)
+    return name.split(":", 1)[1] if kind == "city" else name
+
+
+async def _resolve(cache_manager: CacheManager, key: str, known: Dict[str, Optional[str]]) -> Optional[str]:
+    """Station ID for a source key, via the city mapping when needed."""
+    if key not in known:
+        kind = key.split(":", 1)[0]
+        name = _source_name(key)
+        if kind == "file" and name.isdigit():
+            known[key] = name
+        else:
+            city = name if kind == "city" else name.replace("_", " ").replace("-", " ")
+            known[key] = await cache_manager.get_station_for_city(city)
+    return known[key]
+
+
+def _daily_records(station_id: str, days: Dict[str, Dict[str, Aggregate]]) -> List[Tuple[str, str, Dict[str, dict]]]:
+    return [
+        (station_id, day, {
+            pollutant: {"min": low, "max": high, "median": median, "count": count}
+            for pollutant, (low, high, median, count) in pollutants.items()
+        })
+        for day, pollutants in days.items() if pollutants
+    ]
+
+
+async def backfill(
+    cache_manager: CacheManager,
+    paths: List[str],
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    batch_size: int = 1000,
+    dry_run: bool = False
+) -> Dict[str, object]:
+    """
+    Import daily history from CSV files.
+
+    Files are split into byte-range shards parsed by a process pool; each
+    shard's aggregates are written as soon as it finishes, in pipelined
+    batches of batch_size days, while the other shards are still parsing.
+    Dataset rows are matched to stations through the configured city
+    names, station exports through their file name (a station ID or a
+    city name).
+
+    Configured cities carry no country, so a dataset city name found in
+    more than one country can't be matched safely; it is reported as
+    unmatched instead of merging the countries' values. As that is only
+    known once every file is parsed, matched dataset cities are written
+    at the end (their volume is bounded by the configured cities), while
+    station exports are written as each shard finishes.
+
+    Args:
+        cache_manager: Connected CacheManager
+        paths: CSV files or directories
+        workers: Parser processes (CPU count by default)
+        chunk_bytes: Approximate shard size
+        batch_size: Daily records per write batch
+        dry_run: Parse only
+
+    Returns:
+        Counts of files, shards, rows, records written and unmatched sources
+    """
+    started = time.perf_counter()
+    files = expand_paths(paths)
+    shards = plan_shards(files, chunk_bytes)
+    stats = {"files": len(files), "shards": len(shards), "rows": 0, "skipped_rows": 0, "records": 0}
+    stations: Dict[str, Optional[str]] = {}
+    unmatched = set()
+    # Matched dataset cities: name -> country -> (station, date -> pollutants)
+    deferred: Dict[str, Dict[str, Tuple[str, Dict[str, Dict[str, Aggregate]]]]] = {}
+
+    async def write(records: List[Tuple[str, str, Dict[str, dict]]]):
+        if dry_run:
+            stats["records"] += len(records)
+        else:
+            stats["records"] += await cache_manager.cache_daily_many(records, batch_size)
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = [loop.run_in_executor(pool, parse_shard, shard) for shard in shards]
+        for future in asyncio.as_completed(pending):
+            result, used, skipped = await future
+            stats["rows"] += used
+            stats["skipped_rows"] += skipped
+
+            records = []
+            for key, days in result.items():
+                station_id = await _resolve(cache_manager, key, stations)
+                name = _source_name(key)
+                if station_id is None:
+                    unmatched.add(name)
+                elif key.startswith("city:"):
+                    country = key.split(":")[1]
+                    _, stored = deferred.setdefault(name, {}).setdefault(country, (station_id, {}))
+                    for day, pollutants in days.items():
+                        stored.setdefault(day, {}).update(pollutants)
+                else:
+                    records.extend(_daily_records(station_id, days))
+            await write(records)
+
+    for name, countries in deferred.items():
+        if len(countries) > 1:
+            unmatched.add(f"{name} (ambiguous: {', '.join(sorted(countries))})")
+            continue
+        ((station_id, days),) = countries.values()
+        await write(_daily_records(station_id, days))
+
+    stats["unmatched"] = sorted(unmatched)
+    stats["seconds"] = time.perf_counter() - started
+    logger.info(
+        "Backfill imported %s daily records from %s rows in %.1fs",
+        stats["records"], stats["rows"], stats["seconds"]
+    )
+    return stats
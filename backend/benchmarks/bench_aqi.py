@@ -0,0 +1,95 @@
+"""
+AQI Engine Benchmark
+Compares the vectorized AQI engine against a per-reading Python loop
+"""
+import argparse
+import time
+
+import numpy as np
+
+import aqi
+
+
+def _sub_index_scalar(pollutant: str, value: float) -> float:
+    """Reference per-value implementation of aqi.sub_index."""
+    if value != value:
+        return float("nan")
+    scale = 10.0 ** aqi._TRUNCATE_DIGITS[pollutant]
+    value = int(max(value, 0.0) * scale) / scale
+    bands = aqi._BREAKPOINTS[pollutant]
+    for band, (c_lo, c_hi) in enumerate(bands):
+        if value <= c_hi:
+            i_lo, i_hi = aqi._INDEX_LOW[band], aqi._INDEX_HIGH[band]
+            value = min(max(value, c_lo), c_hi)
+            return float(round((i_hi - i_lo) / (c_hi - c_lo) * (value - c_lo) + i_lo))
+    return float(aqi._INDEX_HIGH[-1])
+
+
+def _evaluate_loop(concentrations: np.ndarray):
+    """Reference per-reading implementation of aqi.evaluate_concentrations."""
+    values, categories, dominants = [], [], []
+    for row in concentrations.tolist():
+        best, best_pollutant = None, -1
+        for column, pollutant in enumerate(aqi.POLLUTANTS):
+            index = _sub_index_scalar(pollutant, row[column])
+            if index == index and (best is None or index > best):
+                best, best_pollutant = index, column
+        if best is None:
+            values.append(float("nan"))
+            categories.append(-1)
+        else:
+            values.append(best)
+            categories.append(sum(best > upper for upper in aqi._CATEGORY_UPPER))
+        dominants.append(best_pollutant)
+    return values, categories, dominants
+
+
+def _make_readings(count: int, seed: int) -> np.ndarray:
+    """Random concentration matrix with ~10% missing values."""
+    rng = np.random.default_rng(seed)
+    upper = np.array([300.0, 500.0, 800.0, 300.0, 600.0, 40.0])
+    readings = rng.random((count, len(aqi.POLLUTANTS))) * upper
+    readings[rng.random(readings.shape) < 0.1] = np.nan
+    return readings
+
+
+def _best_of(repeat: int, func, *args):
+    """Run func repeatedly and return (best wall time, last result)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated reading counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'readings':>10} {'loop (ms)':>12} {'vectorized (ms)':>16} {'speedup':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        readings = _make_readings(size, args.seed)
+
+        loop_time, (values, categories, dominants) = _best_of(
+            args.repeat, _evaluate_loop, readings
+        )
+        vec_time, result = _best_of(args.repeat, aqi.evaluate_concentrations, readings)
+
+        # Both implementations must agree before timings mean anything
+        np.testing.assert_array_equal(result.aqi, np.array(values))
+        np.testing.assert_array_equal(result.category, np.array(categories))
+        np.testing.assert_array_equal(result.dominant, np.array(dominants))
+
+        print(
+            f"{size:>10} {loop_time * 1000:>12.2f} {vec_time * 1000:>16.2f} "
+            f"{loop_time / vec_time:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
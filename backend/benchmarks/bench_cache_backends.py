@@ -0,0 +1,252 @@
+"""
+Cache Backend Conformance and Benchmark Suite
+Runs the same behavioural checks and timings against every available
+CacheBackend, so the backends cannot drift apart.
+
+Redis is included when REDIS_URL points to a reachable server and LMDB
+when the optional ``lmdb`` package is installed.
+"""
+import argparse
+import asyncio
+import math
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from cache_backends import CacheBackend, LMDBBackend, MemoryBackend, RedisBackend
+from cache_manager import CacheManager
+from config import settings
+from models import Pollutants, StationData, Weather
+
+
+# -- Conformance checks ------------------------------------------------------
+
+async def check_get_set(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:a", b"1")
+    await backend.set(f"{ns}:b", b"\x00\xffbinary")
+    assert await backend.get(f"{ns}:a") == b"1"
+    assert await backend.get(f"{ns}:b") == b"\x00\xffbinary"
+    assert await backend.get(f"{ns}:missing") is None
+    await backend.set(f"{ns}:a", b"2")
+    assert await backend.get(f"{ns}:a") == b"2"
+
+
+async def check_mget(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:x", b"x")
+    await backend.set(f"{ns}:y", b"y")
+    assert await backend.mget([f"{ns}:x", f"{ns}:nope", f"{ns}:y"]) == [b"x", None, b"y"]
+    assert await backend.mget([]) == []
+
+
+async def check_ttl(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:short", b"v", ttl=1)
+    await backend.set(f"{ns}:long", b"v", ttl=60)
+    assert await backend.get(f"{ns}:short") == b"v"
+    await asyncio.sleep(1.1)
+    assert await backend.get(f"{ns}:short") is None
+    assert await backend.get(f"{ns}:long") == b"v"
+
+
+async def check_delete(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:d1", b"1")
+    await backend.zadd(f"{ns}:z", {"m": 1.0})
+    assert await backend.delete(f"{ns}:d1", f"{ns}:z", f"{ns}:never") == 2
+    assert await backend.get(f"{ns}:d1") is None
+    assert await backend.zrangebyscore(f"{ns}:z", -math.inf, math.inf) == []
+
+
+async def check_scan_keys(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:scan:1", b"1")
+    await backend.set(f"{ns}:scan:2", b"2")
+    await backend.zadd(f"{ns}:scan:z", {"m": 1.0})
+    await backend.set(f"{ns}:other", b"3")
+    keys = sorted([key async for key in backend.scan_keys(f"{ns}:scan:")])
+    assert keys == [f"{ns}:scan:1", f"{ns}:scan:2", f"{ns}:scan:z"], keys
+
+
+async def check_sorted_set(backend: CacheBackend, ns: str):
+    key = f"{ns}:zs"
+    await backend.zadd(key, {"c": 3.0, "a": 1.0, "b": 2.0, "neg": -5.5})
+    assert await backend.zrangebyscore(key, -math.inf, math.inf) == ["neg", "a", "b", "c"]
+    assert await backend.zrangebyscore(key, 1.0, 2.0) == ["a", "b"]
+    assert await backend.zrangebyscore(key, 0, 10, withscores=True) == [
+        ("a", 1.0), ("b", 2.0), ("c", 3.0)
+    ]
+    assert await backend.zrangebyscore(key, 0, 10, offset=1, count=1) == ["b"]
+
+    # Re-adding a member moves it
+    await backend.zadd(key, {"a": 4.0})
+    assert await backend.zrangebyscore(key, 0, 10) == ["b", "c", "a"]
+
+    assert await backend.zremrangebyscore(key, 0, 3.0) == 2
+    assert await backend.zrangebyscore(key, -math.inf, math.inf) == ["neg", "a"]
+
+
+async def check_batch(backend: CacheBackend, ns: str):
+    await backend.set(f"{ns}:gone", b"1")
+    await backend.zadd(f"{ns}:bz", {"old": 1.0})
+
+    batch = backend.batch()
+    batch.set(f"{ns}:b1", b"1", 60)
+    batch.set(f"{ns}:b2", b"2")
+    batch.zadd(f"{ns}:bz", {"new": 5.0})
+    batch.zremrangebyscore(f"{ns}:bz", 0, 2.0)
+    batch.delete(f"{ns}:gone")
+
+    # Nothing is applied before execute()
+    assert await backend.get(f"{ns}:b1") is None
+    await batch.execute()
+
+    assert await backend.mget([f"{ns}:b1", f"{ns}:b2", f"{ns}:gone"]) == [b"1", b"2", None]
+    assert await backend.zrangebyscore(f"{ns}:bz", -math.inf, math.inf) == ["new"]
+
+
+async def check_cache_many(backend: CacheBackend, ns: str):
+    manager = CacheManager(backend)
+    stations = [(f"{ns}-many-{i}", _station(i)) for i in range(25)]
+
+    assert await manager.cache_many(stations, chunk_size=10) == 25
+    latest = await manager.get_latest_many([station_id for station_id, _ in stations])
+    assert latest == [data for _, data in stations]
+
+
+async def check_cache_manager(backend: CacheBackend, ns: str):
+    manager = CacheManager(backend)
+    station_id = f"{ns}-station"
+    data = _station(42)
+
+    await manager.cache_station_data(station_id, data)
+    assert await manager.get_latest_station_data(station_id) == data
+    assert await manager.get_station_history(station_id, 1) == [data]
+
+    await manager.set_city_station_mapping(f"{ns} City", station_id, "Main St")
+    assert await manager.get_station_for_city(f"{ns} city") == station_id
+    assert any(city.station_id == station_id for city in await manager.get_all_cities())
+
+
+CHECKS: List[Callable] = [
+    check_get_set,
+    check_mget,
+    check_ttl,
+    check_delete,
+    check_scan_keys,
+    check_sorted_set,
+    check_batch,
+    check_cache_many,
+    check_cache_manager,
+]
+
+
+# -- Benchmarks --------------------------------------------------------------
+
+def _station(aqi: int) -> StationData:
+    return StationData(
+        city="Bench City",
+        station="Bench Station",
+        timestamp="2025-10-05T08:00:00Z",
+        aqi=aqi,
+        dominant="pm25",
+        pollutants=Pollutants(pm25=aqi, pm10=17, no2=7.8, o3=11, so2=3.6, co=5.5),
+        weather=Weather(temperature=29, humidity=83, wind=1.5, pressure=1014),
+    )
+
+
+async def _timed(count: int, operation) -> float:
+    """Run operation(i) count times and return operations per second."""
+    start = time.perf_counter()
+    for i in range(count):
+        await operation(i)
+    return count / (time.perf_counter() - start)
+
+
+async def benchmark(backend: CacheBackend, ns: str, count: int) -> List[Tuple[str, float]]:
+    payload = _station(50).model_dump_json().encode()
+    keys = [f"{ns}:bench:{i}" for i in range(count)]
+    manager = CacheManager(backend)
+
+    results = [
+        ("set", await _timed(count, lambda i: backend.set(keys[i], payload, 3600))),
+        ("get", await _timed(count, lambda i: backend.get(keys[i]))),
+        ("mget x100", await _timed(count // 100 or 1, lambda i: backend.mget(keys[:100])) * 100),
+        ("zadd", await _timed(count, lambda i: backend.zadd(f"{ns}:bench:z", {keys[i]: i}))),
+        ("zrange 24", await _timed(count, lambda i: backend.zrangebyscore(
+            f"{ns}:bench:z", i, i + 23))),
+        ("cache_station_data", await _timed(count, lambda i: manager.cache_station_data(
+            f"{ns}-bench-{i % 50}", _station(i % 300)))),
+        ("cache_many x100", await _timed(count // 100 or 1, lambda i: manager.cache_many(
+            [(f"{ns}-bench-{j}", _station(j)) for j in range(100)])) * 100),
+        ("get_latest", await _timed(count, lambda i: manager.get_latest_station_data(
+            f"{ns}-bench-{i % 50}"))),
+    ]
+    return results
+
+
+async def _cleanup(backend: CacheBackend, ns: str):
+    keys = [key async for key in backend.scan_keys(f"{ns}")]
+    keys += [key async for key in backend.scan_keys(f"airquality:latest:{ns}")]
+    keys += [key async for key in backend.scan_keys(f"airquality:history:{ns}")]
+    keys += [key async for key in backend.scan_keys(f"airquality:{ns}")]
+    keys += [key async for key in backend.scan_keys(f"city:station:{ns}")]
+    if keys:
+        await backend.delete(*keys)
+
+
+async def _available_backends(lmdb_dir: str) -> List[CacheBackend]:
+    backends: List[CacheBackend] = [MemoryBackend()]
+
+    try:
+        import lmdb  # noqa: F401
+        backends.append(LMDBBackend(lmdb_dir, 256))
+    except ImportError:
+        print("lmdb not installed, skipping LMDB backend")
+
+    if settings.REDIS_URL:
+        backend = RedisBackend(settings.REDIS_URL)
+        try:
+            await backend.connect()
+            await backend.close()
+            backends.append(backend)
+        except Exception as e:
+            print(f"Redis unavailable ({e}), skipping Redis backend")
+
+    return backends
+
+
+async def main(count: int, skip_benchmark: bool) -> int:
+    lmdb_dir = tempfile.mkdtemp(prefix="bench-lmdb-")
+    ns = f"bench{int(time.time())}"
+    failures = 0
+
+    try:
+        for backend in await _available_backends(lmdb_dir):
+            await backend.connect()
+            print(f"\n== {backend.name} ==")
+
+            for check in CHECKS:
+                try:
+                    await check(backend, ns)
+                    print(f"  PASS {check.__name__}")
+                except Exception as e:
+                    failures += 1
+                    print(f"  FAIL {check.__name__}: {e!r}")
+
+            if not skip_benchmark:
+                for operation, rate in await benchmark(backend, ns, count):
+                    print(f"  {operation:<20} {rate:>12,.0f} ops/s")
+
+            await _cleanup(backend, ns)
+            await backend.close()
+    finally:
+        shutil.rmtree(lmdb_dir, ignore_errors=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache backend conformance and benchmark suite")
+    parser.add_argument("--count", type=int, default=5000, help="Operations per benchmark")
+    parser.add_argument("--skip-benchmark", action="store_true", help="Only run conformance checks")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.count, args.skip_benchmark)))
@@ -0,0 +1,109 @@
+"""
+Snapshot Serialization Benchmark
+Reports bytes per snapshot and encode/decode speed of every codec
+configuration against the legacy JSON path
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import List
+
+from models import ForecastDay, Pollutants, StationData, Weather
+from serialization import SnapshotCodec, train_dictionary
+
+
+def make_snapshots(count: int, seed: int) -> List[StationData]:
+    """Synthetic snapshots shaped like real WAQI feeds (7-day forecasts)."""
+    rng = random.Random(seed)
+    cities = ["Los Angeles", "New York", "Chicago", "Houston", "Phoenix", "Denver"]
+    snapshots = []
+
+    for i in range(count):
+        city = cities[i % len(cities)]
+        start = date(2025, 10, 1) + timedelta(days=i // 24)
+        forecast = {
+            pollutant: [
+                ForecastDay(
+                    day=(start + timedelta(days=d)).isoformat(),
+                    avg=rng.randint(5, 150),
+                    max=rng.randint(150, 200),
+                    min=rng.randint(0, 5),
+                )
+                for d in range(7)
+            ]
+            for pollutant in ("pm25", "pm10", "o3", "uvi")
+        }
+        snapshots.append(StationData(
+            city=city,
+            station=f"{city}-Main Street, USA",
+            timestamp=f"{start.isoformat()}T{i % 24:02d}:00:00-07:00",
+            aqi=rng.randint(10, 180),
+            dominant=rng.choice(["pm25", "o3", "pm10"]),
+            pollutants=Pollutants(
+                pm25=rng.randint(5, 180), pm10=rng.randint(5, 80),
+                no2=round(rng.uniform(1, 30), 1), o3=rng.randint(5, 60),
+                so2=round(rng.uniform(0, 5), 1), co=round(rng.uniform(0, 8), 1),
+            ),
+            weather=Weather(
+                temperature=round(rng.uniform(-5, 35), 1), humidity=rng.randint(10, 95),
+                wind=round(rng.uniform(0, 10), 1), pressure=rng.randint(995, 1030),
+            ),
+            forecast=forecast,
+        ))
+    return snapshots
+
+
+def measure(codec: SnapshotCodec, snapshots: List[StationData]):
+    """Return (avg bytes, encode us/op, decode us/op) and check round trips."""
+    start = time.perf_counter()
+    payloads = [codec.encode(s) for s in snapshots]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [codec.decode(p) for p in payloads]
+    decode_time = time.perf_counter() - start
+
+    assert decoded == snapshots, "round trip mismatch"
+
+    count = len(snapshots)
+    return (
+        sum(len(p) for p in payloads) / count,
+        encode_time / count * 1e6,
+        decode_time / count * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=5000, help="Snapshots per run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    training = make_snapshots(1000, args.seed + 1)
+    snapshots = make_snapshots(args.count, args.seed)
+
+    codecs = [("json", SnapshotCodec("json"))]
+    try:
+        codecs.append(("msgpack", SnapshotCodec("msgpack")))
+    except ImportError:
+        print("msgpack not installed, skipping binary codecs")
+    else:
+        try:
+            codecs.append(("msgpack+zstd", SnapshotCodec("msgpack", "zstd")))
+            codecs.append(("msgpack+zstd+dict", SnapshotCodec(
+                "msgpack", "zstd", train_dictionary(training)
+            )))
+        except ImportError:
+            print("zstandard not installed, skipping compressed codecs")
+
+    print(f"{'codec':<20} {'bytes/snapshot':>15} {'vs json':>8} {'encode us':>10} {'decode us':>10}")
+    baseline = None
+    for name, codec in codecs:
+        size, encode_us, decode_us = measure(codec, snapshots)
+        baseline = baseline or size
+        print(f"{name:<20} {size:>15.0f} {size / baseline:>8.1%} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
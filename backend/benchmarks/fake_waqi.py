@@ -0,0 +1,225 @@
+"""
+Local Stand-in for the WAQI API
+Serves recorded feed payloads and map-bounds queries with configurable
+latency, errors and 429s
+
+Standalone:
+    python -m benchmarks.fake_waqi --port 8089 --latency-ms 40 --rate-limit-rate 0.01
+then point the service at it with WAQI_BASE_URL=http://127.0.0.1:8089
+"""
+import argparse
+import asyncio
+import copy
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+class FakeWAQIConfig:
+    """Behaviour knobs of the fake server (mutable while it runs)."""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        change_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # Fraction of stations off their base AQI in each epoch; bump
+        # epoch between sweeps to simulate readings changing
+        self.change_rate = change_rate
+        self.epoch = 0
+        # Station ID -> (lat, lon), served by /map/bounds/
+        self.stations: Dict[str, Tuple[float, float]] = {}
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+
+def load_payloads(payload_dir: Optional[Path] = None) -> Dict[str, dict]:
+    """
+    Load recorded feed responses.
+
+    Files named ``feed_<station_id>.json`` are served for that station;
+    ``waqi_feed.json`` is the template for every other station.
+    """
+    payloads = {"*": json.loads((FIXTURES / "waqi_feed.json").read_text())}
+    if payload_dir:
+        for path in Path(payload_dir).glob("feed_*.json"):
+            payloads[path.stem[len("feed_"):]] = json.loads(path.read_text())
+    return payloads
+
+
+def _station_aqi(config: FakeWAQIConfig, station_id: str) -> int:
+    """Deterministic per-station AQI, so runs are comparable."""
+    seed = zlib.crc32(station_id.encode())
+    changed = zlib.crc32(f"{station_id}:{config.epoch}".encode()) % 10000 < config.change_rate * 10000
+    return 10 + (seed + (config.epoch if changed else 0)) % 190
+
+
+def _observed(config: FakeWAQIConfig, payloads: Dict[str, dict]) -> str:
+    """Observation time of the current epoch (one hour per epoch)."""
+    base = datetime.fromisoformat(payloads["*"]["data"]["time"]["iso"])
+    return (base + timedelta(hours=config.epoch)).isoformat()
+
+
+def _station_payload(config: FakeWAQIConfig, payloads: Dict[str, dict], station_id: str) -> dict:
+    """Recorded payload for a station, or the template varied per station."""
+    if station_id in payloads:
+        return payloads[station_id]
+
+    payload = copy.deepcopy(payloads["*"])
+    data = payload["data"]
+    seed = zlib.crc32(station_id.encode())
+    data["idx"] = int(station_id) if station_id.isdigit() else seed % 100000
+    data["aqi"] = _station_aqi(config, station_id)
+    data["time"]["iso"] = _observed(config, payloads)
+    data["iaqi"]["pm25"]["v"] = data["aqi"]
+    data["city"]["name"] = f"Fake Station {station_id}"
+    return payload
+
+
+def create_app(config: FakeWAQIConfig, payloads: Optional[Dict[str, dict]] = None) -> FastAPI:
+    """
+    Build the fake WAQI application.
+
+    Args:
+        config: Latency and failure settings
+        payloads: Recorded payloads (see load_payloads)
+
+    Returns:
+        FastAPI application
+    """
+    payloads = payloads or load_payloads()
+    app = FastAPI(title="Fake WAQI API")
+    app.state.config = config
+
+    async def simulate() -> Optional[JSONResponse]:
+        """Apply latency and pick a failure mode for one request."""
+        config.requests += 1
+        delay = config.latency_ms + config.random.uniform(0, config.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        roll = config.random.random()
+        if roll < config.rate_limit_rate:
+            config.rate_limited += 1
+            return JSONResponse({"status": "error", "data": "Over quota"}, status_code=429)
+        if roll < config.rate_limit_rate + config.error_rate:
+            config.errors += 1
+            return JSONResponse({"status": "error", "data": "Unknown station"})
+        return None
+
+    @app.get("/feed/@{station_id}/")
+    async def feed(station_id: str):
+        failure = await simulate()
+        if failure:
+            return failure
+        return _station_payload(config, payloads, station_id)
+
+    @app.get("/feed/geo:{coordinates}/")
+    async def geo_feed(coordinates: str):
+        failure = await simulate()
+        if failure:
+            return failure
+        # Nearest station is derived from the coordinates so discovery of
+        # distinct cities yields distinct stations
+        station_id = str(zlib.crc32(coordinates.encode()) % 1000000)
+        lat, lon = (float(part) for part in coordinates.split(";"))
+        config.stations[station_id] = (lat, lon)
+        return _station_payload(config, payloads, station_id)
+
+    @app.get("/map/bounds/")
+    async def map_bounds(latlng: str):
+        failure = await simulate()
+        if failure:
+            return failure
+        south, west, north, east = (float(part) for part in latlng.split(","))
+        observed = _observed(config, payloads)
+        return {"status": "ok", "data": [
+            {
+                "lat": lat, "lon": lon, "uid": int(station_id),
+                "aqi": str(_station_aqi(config, station_id)),
+                "station": {"name": f"Fake Station {station_id}", "time": observed},
+            }
+            for station_id, (lat, lon) in list(config.stations.items())
+            if south <= lat <= north and west <= lon <= east and station_id.isdigit()
+        ]}
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "requests": config.requests,
+            "errors": config.errors,
+            "rate_limited": config.rate_limited,
+        }
+
+    return app
+
+
+class FakeWAQIServer:
+    """Runs the fake API on a background thread, for use from benchmarks."""
+
+    def __init__(self, config: FakeWAQIConfig, host: str = "127.0.0.1", port: int = 0,
+                 payloads: Optional[Dict[str, dict]] = None):
+        self.config = config
+        self.server = uvicorn.Server(uvicorn.Config(
+            create_app(config, payloads), host=host, port=port,
+            log_level="warning", access_log=False,
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeWAQIServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake WAQI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of status=error replies")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of HTTP 429 replies")
+    parser.add_argument("--change-rate", type=float, default=0.0, help="Fraction of stations changing per epoch")
+    parser.add_argument("--payload-dir", type=Path, help="Directory of recorded feed_<id>.json files")
+    args = parser.parse_args()
+
+    config = FakeWAQIConfig(
+        args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.change_rate
+    )
+    uvicorn.run(create_app(config, load_payloads(args.payload_dir)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Load Test and Benchmark Suite
+Drives the ingest path and the API against a local fake WAQI server and
+reports throughput, p50/p99 latency and RSS.
+
+    python -m benchmarks.load_test --stations 50,500,5000 --latency-ms 20
+
+The ingest phase runs AirQualityScheduler.fetch_all_stations a few times
+for each station count, reporting upstream calls per sweep (compare with
+--per-station). The API phase seeds the cache and fires concurrent requests
+at the FastAPI app in-process (or at --api-url if given), so the numbers
+cover handler, cache and serialization cost without a real network.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+import waqi_client
+from benchmarks.fake_waqi import FakeWAQIConfig, FakeWAQIServer
+from cache_backends import create_backend
+from cache_manager import CacheManager
+from config import settings
+from logging_setup import configure_logging
+from models import CityConfig
+from scheduler import AirQualityScheduler
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p99 of latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {"p50": float("nan"), "p99": float("nan")}
+    p50, p99 = np.percentile(np.array(samples) * 1000, [50, 99])
+    return {"p50": p50, "p99": p99}
+
+
+def _new_cache_manager() -> CacheManager:
+    return CacheManager(create_backend(
+        settings.CACHE_BACKEND if settings.CACHE_BACKEND != "auto" else "memory",
+        redis_url=settings.REDIS_URL,
+        lmdb_path=settings.LMDB_PATH,
+        lmdb_map_size_mb=settings.LMDB_MAP_SIZE_MB,
+    ))
+
+
+def _synthetic_cities(count: int) -> List[CityConfig]:
+    return [
+        CityConfig(city=f"City {i}", lat=25 + i % 25, lon=-120 + i % 50,
+                   station_id=str(10000 + i), station_name=f"Fake Station {10000 + i}")
+        for i in range(count)
+    ]
+
+
+async def bench_ingest(station_counts: List[int], config: FakeWAQIConfig, sweeps: int) -> List[dict]:
+    """
+    Time consecutive refresh sweeps per station count.
+
+    The fake server's epoch advances between sweeps, so later sweeps show
+    what bulk ingestion saves when only some stations change.
+    """
+    results = []
+    client = waqi_client.get_waqi_client()
+
+    for count in station_counts:
+        upstream: List[float] = []
+        started: Dict[int, float] = {}
+
+        async def on_request(request):
+            started[id(request)] = time.perf_counter()
+
+        async def on_response(response):
+            upstream.append(time.perf_counter() - started.pop(id(response.request)))
+
+        client.client.event_hooks = {"request": [on_request], "response": [on_response]}
+
+        cache_manager = _new_cache_manager()
+        await cache_manager.connect()
+        scheduler = AirQualityScheduler(cache_manager)
+        scheduler.cities = _synthetic_cities(count)
+        config.stations.update({city.station_id: (city.lat, city.lon) for city in scheduler.cities})
+
+        for sweep in range(1, sweeps + 1):
+            upstream.clear()
+            requests_before = config.requests
+            start = time.perf_counter()
+            await scheduler.fetch_all_stations()
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                "stations": count,
+                "sweep": sweep,
+                "upstream": config.requests - requests_before,
+                "seconds": elapsed,
+                "throughput": count / elapsed,
+                **percentiles(upstream),
+                "rss_mb": rss_mb(),
+            })
+            config.epoch += 1
+
+        config.stations.clear()
+        await cache_manager.disconnect()
+
+    client.client.event_hooks = {"request": [], "response": []}
+    return results
+
+
+async def _seed_app(cities: int):
+    """Point the FastAPI app at a freshly seeded cache."""
+    import main
+
+    cache_manager = _new_cache_manager()
+    await cache_manager.connect()
+    scheduler = AirQualityScheduler(cache_manager)
+    scheduler.cities = _synthetic_cities(cities)
+    for city in scheduler.cities:
+        await cache_manager.set_city_station_mapping(city.city, city.station_id, city.station_name)
+    await scheduler.fetch_all_stations()
+
+    main.app.state.cache_manager = cache_manager
+    main.app.state.scheduler = scheduler
+    # Every request comes from one client address; measure the handlers,
+    # not the per-client rate limit
+    main.admission.rate_limiter = None
+    return main.app
+
+
+async def bench_api(
+    cities: int, concurrency: int, requests: int, api_url: Optional[str]
+) -> List[dict]:
+    """Fire concurrent requests at each read endpoint."""
+    if api_url:
+        client = httpx.AsyncClient(base_url=api_url, timeout=30.0)
+    else:
+        app = await _seed_app(cities)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    endpoints = [
+        ("/api/airquality", lambda i: {"city": f"City {i % cities}"}),
+        ("/api/airquality", lambda i: {"city": f"City {i % cities}", "fields": "city,aqi,dominant"}),
+        ("/api/history", lambda i: {"city": f"City {i % cities}", "hours": 24}),
+        ("/api/history", lambda i: {"city": f"City {i % cities}", "hours": 24, "fields": "timestamp,aqi"}),
+        ("/api/cities", lambda i: {}),
+        ("/api/rankings", lambda i: {"limit": 20}),
+    ]
+
+    results = []
+    async with client:
+        for path, params in endpoints:
+            latencies: List[float] = []
+            failures = 0
+            received = 0
+            counter = iter(range(requests))
+
+            async def worker():
+                nonlocal failures, received
+                for i in counter:
+                    start = time.perf_counter()
+                    response = await client.get(path, params=params(i))
+                    latencies.append(time.perf_counter() - start)
+                    received += len(response.content)
+                    if response.status_code != 200:
+                        failures += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+            fields = params(0).get("fields")
+            results.append({
+                "endpoint": f"{path}?fields={fields}" if fields else path,
+                "requests": requests,
+                "failures": failures,
+                "throughput": requests / elapsed,
+                "avg_bytes": received / requests,
+                **percentiles(latencies),
+                "rss_mb": rss_mb(),
+            })
+    return results
+
+
+def _print_table(title: str, rows: List[dict]):
+    if not rows:
+        return
+    print(f"\n{title}")
+    columns = list(rows[0])
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(
+            f"{v:>12.2f}" if isinstance(v, float) else f"{v:>12}" for v in row.values()
+        ))
+
+
+async def run(args: argparse.Namespace):
+    config = FakeWAQIConfig(
+        args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.change_rate
+    )
+
+    with FakeWAQIServer(config) as server:
+        settings.WAQI_BASE_URL = server.url
+        await waqi_client.close_waqi_client()
+
+        if not args.skip_ingest:
+            counts = [int(c) for c in args.stations.split(",")]
+            mode = "bulk" if settings.BULK_INGESTION_ENABLED else "per-station"
+            _print_table(
+                f"Ingest (fetch_all_stations, {mode})",
+                await bench_ingest(counts, config, args.sweeps)
+            )
+
+        if not args.skip_api:
+            _print_table(
+                f"API ({args.concurrency} concurrent clients)",
+                await bench_api(args.api_cities, args.concurrency, args.requests, args.api_url)
+            )
+
+        print(
+            f"\nFake WAQI: {config.requests} requests, {config.errors} errors, "
+            f"{config.rate_limited} rate limited"
+        )
+        await waqi_client.close_waqi_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Air Quality backend load test")
+    parser.add_argument("--stations", default="50,500,5000", help="Station counts for the ingest phase")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake WAQI response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of status=error replies")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of HTTP 429 replies")
+    parser.add_argument("--change-rate", type=float, default=0.05,
+                        help="Fraction of stations whose AQI changes between sweeps")
+    parser.add_argument("--sweeps", type=int, default=2, help="Ingest sweeps per station count")
+    parser.add_argument("--per-station", action="store_true",
+                        help="Disable bulk ingestion (one feed call per station)")
+    parser.add_argument("--api-cities", type=int, default=50, help="Cities seeded for the API phase")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint")
+    parser.add_argument("--api-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-api", action="store_true")
+    args = parser.parse_args()
+
+    # Per-station log lines would dominate the measurement (main.py
+    # configures logging from settings when the API phase imports it)
+    settings.LOG_LEVEL = "WARNING"
+    configure_logging(settings.LOG_LEVEL)
+
+    if args.per_station:
+        settings.BULK_INGESTION_ENABLED = False
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
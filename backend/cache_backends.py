@@ -0,0 +1,856 @@
+"""
+Cache Storage Backends
+Key-value and sorted-set primitives used by CacheManager, implemented on
+Redis, process memory and a host-local LMDB file
+"""
+import bisect
+import heapq
+import logging
+import struct
+import time
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Tuple, Union
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+ScoreRange = Union[List[str], List[Tuple[str, float]]]
+
+# Conditional write: SET KEYS[1] ARGV[1] (expiring after ARGV[2] seconds,
+# 0 for never) if ARGV[4] is "1" and the key is missing, or if ARGV[4] is
+# "0" and the stored value starts with ARGV[3]. Returns 1 if written.
+_SET_IF_LUA = """
+local current = redis.call('GET', KEYS[1])
+if ARGV[4] == '1' then
+    if current then
+        return 0
+    end
+elseif not current or string.sub(current, 1, #ARGV[3]) ~= ARGV[3] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+def _starts_with(current: Optional[bytes], expected: Optional[bytes]) -> bool:
+    """Condition of set_if: missing if expected is None, else a matching prefix."""
+    if expected is None:
+        return current is None
+    return current is not None and current.startswith(expected)
+
+
+class WriteBatch(Protocol):
+    """
+    Queued writes applied together by execute().
+
+    Batches are atomic (no reader sees half of a batch) and, on Redis,
+    cost a single round trip.
+    """
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        """Queue a value write."""
+
+    def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> None:
+        """Queue a write applied only if the stored value starts with expected
+        (only if the key is missing when expected is None)."""
+
+    def delete(self, *keys: str) -> None:
+        """Queue key deletions."""
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        """Queue sorted-set additions."""
+
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> None:
+        """Queue a sorted-set range removal."""
+
+    def zrem(self, key: str, *members: str) -> None:
+        """Queue removal of sorted-set members."""
+
+    async def execute(self) -> List[bool]:
+        """
+        Apply all queued writes.
+
+        Returns:
+            Whether each set_if was applied, in queue order
+        """
+
+
+class CacheBackend(Protocol):
+    """
+    Storage primitives CacheManager is written against.
+
+    Keys and sorted-set members are strings, values are opaque bytes and
+    scores are floats. TTLs are in seconds; ``None`` means no expiry.
+    """
+
+    name: str
+
+    async def connect(self) -> None:
+        """Open the backend, raising if it is unavailable."""
+
+    async def close(self) -> None:
+        """Release connections and handles."""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Get a value, or None if missing or expired."""
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Get several values in one call, None for missing keys."""
+
+    async def value_sizes(self, keys: List[str]) -> List[Optional[int]]:
+        """Byte length of each value, None for missing keys (no values transferred)."""
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        """Store a value, replacing any previous one."""
+
+    async def set_nx_many(self, keys: List[str], value: bytes, ttl: Optional[int] = None) -> List[bool]:
+        """Store value under each key that doesn't exist yet; True where stored."""
+
+    async def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> bool:
+        """
+        Atomically store a value if the stored one starts with expected, or
+        if the key is missing when expected is None (compare-and-set).
+
+        Returns:
+            True if the value was stored
+        """
+
+    async def delete(self, *keys: str) -> int:
+        """Delete keys (values or sorted sets), returning how many existed."""
+
+    async def scan_keys(self, prefix: str) -> AsyncIterator[str]:
+        """Iterate over live keys starting with prefix."""
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        """Add members to a sorted set or update their scores."""
+
+    async def zrangebyscore(
+        self,
+        key: str,
+        min_score: float,
+        max_score: float,
+        offset: int = 0,
+        count: Optional[int] = None,
+        withscores: bool = False
+    ) -> ScoreRange:
+        """Members with min_score <= score <= max_score, lowest first."""
+
+    async def zrangebyscore_many(
+        self, keys: List[str], min_score: float, max_score: float, withscores: bool = False
+    ) -> List[ScoreRange]:
+        """zrangebyscore of several sorted sets in one call."""
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        """Remove members within a score range, returning how many."""
+
+    async def zrem(self, key: str, *members: str) -> int:
+        """Remove members from a sorted set, returning how many existed."""
+
+    def batch(self) -> WriteBatch:
+        """Start a batch of writes."""
+
+
+class _QueuedBatch:
+    """WriteBatch that replays queued calls against a backend in order."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.operations: List[Tuple[str, tuple]] = []
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self.operations.append(("set", (key, value, ttl)))
+
+    def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> None:
+        self.operations.append(("set_if", (key, value, ttl, expected)))
+
+    def delete(self, *keys: str) -> None:
+        self.operations.append(("delete", keys))
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        self.operations.append(("zadd", (key, mapping)))
+
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> None:
+        self.operations.append(("zremrangebyscore", (key, min_score, max_score)))
+
+    def zrem(self, key: str, *members: str) -> None:
+        self.operations.append(("zrem", (key, *members)))
+
+    async def execute(self) -> List[bool]:
+        operations, self.operations = self.operations, []
+        applied = []
+        for name, args in operations:
+            result = await getattr(self.backend, name)(*args)
+            if name == "set_if":
+                applied.append(result)
+        return applied
+
+
+class _RedisBatch:
+    """WriteBatch sent as one MULTI/EXEC transaction pipeline."""
+
+    def __init__(self, client: redis.Redis):
+        self.pipeline = client.pipeline(transaction=True)
+        # Positions of the set_if scripts among the queued commands
+        self._conditional: List[int] = []
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self.pipeline.set(key, value, ex=ttl)
+
+    def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> None:
+        self._conditional.append(len(self.pipeline.command_stack))
+        # EVAL rather than a registered script, which would cost a SCRIPT
+        # EXISTS round trip per transaction
+        self.pipeline.eval(
+            _SET_IF_LUA, 1, key, value, ttl or 0, expected or b"", "1" if expected is None else "0"
+        )
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.pipeline.delete(*keys)
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        self.pipeline.zadd(key, mapping)
+
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> None:
+        self.pipeline.zremrangebyscore(key, min_score, max_score)
+
+    def zrem(self, key: str, *members: str) -> None:
+        if members:
+            self.pipeline.zrem(key, *members)
+
+    async def execute(self) -> List[bool]:
+        async with self.pipeline as pipeline:
+            results = await pipeline.execute()
+        return [bool(results[position]) for position in self._conditional]
+
+
+class RedisBackend:
+    """Backend storing everything in a Redis server."""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        """
+        Args:
+            url: Redis connection URL
+        """
+        self.url = url
+        self.client: Optional[redis.Redis] = None
+
+    async def connect(self) -> None:
+        self.client = redis.from_url(self.url, decode_responses=False)
+        await self.client.ping()
+
+    async def close(self) -> None:
+        if self.client:
+            await self.client.close()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget(keys)
+
+    async def value_sizes(self, keys: List[str]) -> List[Optional[int]]:
+        if not keys:
+            return []
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.strlen(key)
+            # STRLEN is 0 for missing keys; stored values are never empty
+            return [size or None for size in await pipeline.execute()]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        await self.client.set(key, value, ex=ttl)
+
+    async def set_nx_many(self, keys: List[str], value: bytes, ttl: Optional[int] = None) -> List[bool]:
+        if not keys:
+            return []
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.set(key, value, ex=ttl, nx=True)
+            return [bool(stored) for stored in await pipeline.execute()]
+
+    async def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> bool:
+        return bool(await self.client.eval(
+            _SET_IF_LUA, 1, key, value, ttl or 0, expected or b"", "1" if expected is None else "0"
+        ))
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return await self.client.delete(*keys)
+
+    async def scan_keys(self, prefix: str) -> AsyncIterator[str]:
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=500):
+            yield key.decode()
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        await self.client.zadd(key, mapping)
+
+    async def zrangebyscore(
+        self,
+        key: str,
+        min_score: float,
+        max_score: float,
+        offset: int = 0,
+        count: Optional[int] = None,
+        withscores: bool = False
+    ) -> ScoreRange:
+        page = {} if count is None else {"start": offset, "num": count}
+        result = await self.client.zrangebyscore(
+            key, min_score, max_score, withscores=withscores, **page
+        )
+        if withscores:
+            return [(member.decode(), score) for member, score in result]
+        return [member.decode() for member in result]
+
+    async def zrangebyscore_many(
+        self, keys: List[str], min_score: float, max_score: float, withscores: bool = False
+    ) -> List[ScoreRange]:
+        if not keys:
+            return []
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for key in keys:
+                pipeline.zrangebyscore(key, min_score, max_score, withscores=withscores)
+            results = await pipeline.execute()
+        if withscores:
+            return [[(member.decode(), score) for member, score in result] for result in results]
+        return [[member.decode() for member in result] for result in results]
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        return await self.client.zremrangebyscore(key, min_score, max_score)
+
+    async def zrem(self, key: str, *members: str) -> int:
+        if not members:
+            return 0
+        return await self.client.zrem(key, *members)
+
+    def batch(self) -> WriteBatch:
+        return _RedisBatch(self.client)
+
+
+class _SortedSet:
+    """Sorted set kept as a score-ordered list plus a member index."""
+
+    __slots__ = ("entries", "scores")
+
+    def __init__(self):
+        self.entries: List[Tuple[float, str]] = []
+        self.scores: Dict[str, float] = {}
+
+    def add(self, member: str, score: float) -> None:
+        old = self.scores.get(member)
+        if old is not None:
+            del self.entries[bisect.bisect_left(self.entries, (old, member))]
+        bisect.insort(self.entries, (score, member))
+        self.scores[member] = score
+
+    def bounds(self, min_score: float, max_score: float) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self.entries, (min_score, ""))
+        hi = bisect.bisect_right(self.entries, (max_score, chr(0x10FFFF)))
+        return lo, hi
+
+
+class MemoryBackend:
+    """
+    Backend storing everything in process memory.
+
+    Used when Redis is unavailable. Data is private to the worker process
+    and lost on restart.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._zsets: Dict[str, _SortedSet] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def _purge_expired(self) -> None:
+        """Drop values whose TTL elapsed, oldest deadline first."""
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self._values.get(key)
+            # Skip heap entries superseded by a later set()
+            if entry and entry[1] == expires_at:
+                del self._values[key]
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._live(key) for key in keys]
+
+    async def value_sizes(self, keys: List[str]) -> List[Optional[int]]:
+        values = [self._live(key) for key in keys]
+        return [None if value is None else len(value) for value in values]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self._purge_expired()
+        expires_at = time.time() + ttl if ttl else None
+        self._values[key] = (value, expires_at)
+        if expires_at is not None:
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    async def set_nx_many(self, keys: List[str], value: bytes, ttl: Optional[int] = None) -> List[bool]:
+        stored = []
+        for key in keys:
+            absent = self._live(key) is None
+            if absent:
+                await self.set(key, value, ttl)
+            stored.append(absent)
+        return stored
+
+    async def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> bool:
+        if not _starts_with(self._live(key), expected):
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self._values[key]
+                deleted += 1
+            elif self._zsets.pop(key, None) is not None:
+                deleted += 1
+        return deleted
+
+    async def scan_keys(self, prefix: str) -> AsyncIterator[str]:
+        self._purge_expired()
+        for key in [k for k in self._values if k.startswith(prefix)]:
+            yield key
+        for key in [k for k in self._zsets if k.startswith(prefix)]:
+            yield key
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        zset = self._zsets.setdefault(key, _SortedSet())
+        for member, score in mapping.items():
+            zset.add(member, float(score))
+
+    async def zrangebyscore(
+        self,
+        key: str,
+        min_score: float,
+        max_score: float,
+        offset: int = 0,
+        count: Optional[int] = None,
+        withscores: bool = False
+    ) -> ScoreRange:
+        zset = self._zsets.get(key)
+        if zset is None:
+            return []
+        lo, hi = zset.bounds(min_score, max_score)
+        lo += offset
+        if count is not None:
+            hi = min(hi, lo + count)
+        entries = zset.entries[lo:hi]
+        if withscores:
+            return [(member, score) for score, member in entries]
+        return [member for _, member in entries]
+
+    async def zrangebyscore_many(
+        self, keys: List[str], min_score: float, max_score: float, withscores: bool = False
+    ) -> List[ScoreRange]:
+        return [
+            await self.zrangebyscore(key, min_score, max_score, withscores=withscores)
+            for key in keys
+        ]
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        zset = self._zsets.get(key)
+        if zset is None:
+            return 0
+        lo, hi = zset.bounds(min_score, max_score)
+        for _, member in zset.entries[lo:hi]:
+            del zset.scores[member]
+        del zset.entries[lo:hi]
+        if not zset.entries:
+            del self._zsets[key]
+        return hi - lo
+
+    async def zrem(self, key: str, *members: str) -> int:
+        zset = self._zsets.get(key)
+        if zset is None:
+            return 0
+        removed = 0
+        for member in members:
+            score = zset.scores.pop(member, None)
+            if score is not None:
+                del zset.entries[bisect.bisect_left(zset.entries, (score, member))]
+                removed += 1
+        if not zset.entries:
+            del self._zsets[key]
+        return removed
+
+    def batch(self) -> WriteBatch:
+        # Memory operations never suspend, so replaying them is atomic
+        return _QueuedBatch(self)
+
+
+def _encode_score(score: float) -> bytes:
+    """Encode a float so that byte order matches numeric order."""
+    (bits,) = struct.unpack(">Q", struct.pack(">d", score))
+    bits = bits ^ 0xFFFFFFFFFFFFFFFF if bits >> 63 else bits | (1 << 63)
+    return struct.pack(">Q", bits)
+
+
+def _decode_score(data: bytes) -> float:
+    (bits,) = struct.unpack(">Q", data)
+    bits = bits ^ (1 << 63) if bits >> 63 else bits ^ 0xFFFFFFFFFFFFFFFF
+    return struct.unpack(">d", struct.pack(">Q", bits))[0]
+
+
+class LMDBBackend:
+    """
+    Backend storing everything in a memory-mapped LMDB file.
+
+    Every uvicorn worker on the host opens the same file, so they share
+    cached data through the page cache without any network round trip.
+    Operations run inline on the event loop: reads are lock-free mmap
+    lookups and writes are single short transactions with fsync disabled
+    (the data is a cache, not a record).
+
+    Layout:
+        kv:      key -> expiry (8-byte double, 0 = none) + value
+        expiry:  encoded expiry + key -> b""   (for sweeping)
+        zset:    set \\0 encoded score + member -> b""
+        zmember: set \\0 member -> 8-byte score
+    """
+
+    name = "lmdb"
+
+    # Sweep expired values once per this many writes
+    SWEEP_EVERY = 256
+
+    def __init__(self, path: str, map_size_mb: int = 1024):
+        """
+        Args:
+            path: Directory holding the LMDB environment
+            map_size_mb: Maximum size of the memory map
+        """
+        self.path = path
+        self.map_size = map_size_mb * 1024 * 1024
+        self.env = None
+        self._writes = 0
+
+    async def connect(self) -> None:
+        import lmdb
+
+        # Opened here rather than in __init__ so forked workers each get
+        # their own handle
+        self.env = lmdb.open(
+            self.path,
+            map_size=self.map_size,
+            max_dbs=4,
+            sync=False,
+            metasync=False,
+            readahead=False,
+        )
+        self._kv = self.env.open_db(b"kv")
+        self._expiry = self.env.open_db(b"expiry")
+        self._zset = self.env.open_db(b"zset")
+        self._zmember = self.env.open_db(b"zmember")
+
+    async def close(self) -> None:
+        if self.env:
+            self.env.close()
+            self.env = None
+
+    @staticmethod
+    def _unpack(raw: Optional[bytes], now: float) -> Optional[bytes]:
+        if raw is None:
+            return None
+        (expires_at,) = struct.unpack_from(">d", raw)
+        if expires_at and expires_at <= now:
+            return None
+        return bytes(raw[8:])
+
+    def _sweep(self, txn) -> None:
+        """Delete values whose TTL elapsed, using the expiry index."""
+        now_key = _encode_score(time.time())
+        cursor = txn.cursor(db=self._expiry)
+        cursor.first()
+        while True:
+            index_key = cursor.key()
+            if not index_key or index_key[:8] > now_key:
+                break
+            key = index_key[8:]
+            raw = txn.get(key, db=self._kv)
+            # Only delete if this index entry still matches the stored TTL
+            expires_at = struct.pack(">d", _decode_score(index_key[:8]))
+            if raw is not None and raw[:8] == expires_at:
+                txn.delete(key, db=self._kv)
+            if not cursor.delete():
+                break
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self.env.begin(db=self._kv) as txn:
+            return self._unpack(txn.get(key.encode()), time.time())
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.time()
+        with self.env.begin(db=self._kv) as txn:
+            return [self._unpack(txn.get(key.encode()), now) for key in keys]
+
+    async def value_sizes(self, keys: List[str]) -> List[Optional[int]]:
+        now = time.time()
+        sizes = []
+        # Buffers point into the map, so values aren't copied
+        with self.env.begin(db=self._kv, buffers=True) as txn:
+            for key in keys:
+                raw = txn.get(key.encode())
+                if raw is None:
+                    sizes.append(None)
+                    continue
+                (expires_at,) = struct.unpack_from(">d", raw)
+                sizes.append(None if expires_at and expires_at <= now else len(raw) - 8)
+        return sizes
+
+    def _set(self, txn, key: str, value: bytes, ttl: Optional[int]) -> None:
+        expires_at = time.time() + ttl if ttl else 0.0
+        encoded = key.encode()
+        txn.put(encoded, struct.pack(">d", expires_at) + value, db=self._kv)
+        if expires_at:
+            txn.put(_encode_score(expires_at) + encoded, b"", db=self._expiry)
+
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self._sweep(txn)
+
+    def _delete(self, txn, keys) -> int:
+        deleted = 0
+        for key in keys:
+            encoded = key.encode()
+            if txn.delete(encoded, db=self._kv):
+                deleted += 1
+            elif self._zdelete(txn, encoded + b"\0"):
+                deleted += 1
+        return deleted
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        with self.env.begin(write=True) as txn:
+            self._set(txn, key, value, ttl)
+
+    async def set_nx_many(self, keys: List[str], value: bytes, ttl: Optional[int] = None) -> List[bool]:
+        stored = []
+        now = time.time()
+        # One write transaction, so concurrent workers can't both claim a key
+        with self.env.begin(write=True) as txn:
+            for key in keys:
+                absent = self._unpack(txn.get(key.encode(), db=self._kv), now) is None
+                if absent:
+                    self._set(txn, key, value, ttl)
+                stored.append(absent)
+        return stored
+
+    def _set_if(self, txn, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> bool:
+        if not _starts_with(self._unpack(txn.get(key.encode(), db=self._kv), time.time()), expected):
+            return False
+        self._set(txn, key, value, ttl)
+        return True
+
+    async def set_if(self, key: str, value: bytes, ttl: Optional[int], expected: Optional[bytes]) -> bool:
+        with self.env.begin(write=True) as txn:
+            return self._set_if(txn, key, value, ttl, expected)
+
+    async def delete(self, *keys: str) -> int:
+        with self.env.begin(write=True) as txn:
+            return self._delete(txn, keys)
+
+    def _zdelete(self, txn, prefix: bytes) -> bool:
+        """Delete every entry of a sorted set."""
+        found = False
+        for db in (self._zset, self._zmember):
+            cursor = txn.cursor(db=db)
+            if cursor.set_range(prefix):
+                while cursor.key().startswith(prefix):
+                    found = True
+                    if not cursor.delete():
+                        break
+        return found
+
+    async def scan_keys(self, prefix: str) -> AsyncIterator[str]:
+        encoded = prefix.encode()
+        now = time.time()
+        keys = []
+        with self.env.begin() as txn:
+            cursor = txn.cursor(db=self._kv)
+            if cursor.set_range(encoded):
+                for key, raw in cursor:
+                    if not key.startswith(encoded):
+                        break
+                    if self._unpack(raw, now) is not None:
+                        keys.append(key.decode())
+
+            cursor = txn.cursor(db=self._zmember)
+            last = None
+            if cursor.set_range(encoded):
+                for key in cursor.iternext(values=False):
+                    if not key.startswith(encoded):
+                        break
+                    name = key[:key.index(b"\0")]
+                    if name != last:
+                        keys.append(name.decode())
+                        last = name
+        for key in keys:
+            yield key
+
+    def _zadd(self, txn, key: str, mapping: Dict[str, float]) -> None:
+        prefix = key.encode() + b"\0"
+        for member, score in mapping.items():
+            encoded = member.encode()
+            old = txn.get(prefix + encoded, db=self._zmember)
+            if old is not None:
+                txn.delete(prefix + old + encoded, db=self._zset)
+            score_key = _encode_score(float(score))
+            txn.put(prefix + encoded, score_key, db=self._zmember)
+            txn.put(prefix + score_key + encoded, b"", db=self._zset)
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> None:
+        with self.env.begin(write=True) as txn:
+            self._zadd(txn, key, mapping)
+
+    def _zscan(self, txn, key: str, min_score: float, max_score: float):
+        """Yield (score, member, raw key) within a score range."""
+        prefix = key.encode() + b"\0"
+        upper = prefix + _encode_score(max_score)
+        cursor = txn.cursor(db=self._zset)
+        if not cursor.set_range(prefix + _encode_score(min_score)):
+            return
+        for raw in cursor.iternext(values=False):
+            score_key = raw[len(prefix):len(prefix) + 8]
+            if not raw.startswith(prefix) or prefix + score_key > upper:
+                break
+            yield _decode_score(score_key), raw[len(prefix) + 8:].decode(), raw
+
+    async def zrangebyscore(
+        self,
+        key: str,
+        min_score: float,
+        max_score: float,
+        offset: int = 0,
+        count: Optional[int] = None,
+        withscores: bool = False
+    ) -> ScoreRange:
+        result = []
+        with self.env.begin() as txn:
+            for position, (score, member, _) in enumerate(
+                self._zscan(txn, key, min_score, max_score)
+            ):
+                if position < offset:
+                    continue
+                if count is not None and len(result) >= count:
+                    break
+                result.append((member, score) if withscores else member)
+        return result
+
+    async def zrangebyscore_many(
+        self, keys: List[str], min_score: float, max_score: float, withscores: bool = False
+    ) -> List[ScoreRange]:
+        return [
+            await self.zrangebyscore(key, min_score, max_score, withscores=withscores)
+            for key in keys
+        ]
+
+    def _zremrangebyscore(self, txn, key: str, min_score: float, max_score: float) -> int:
+        prefix = key.encode() + b"\0"
+        doomed = [
+            (member, raw)
+            for _, member, raw in self._zscan(txn, key, min_score, max_score)
+        ]
+        for member, raw in doomed:
+            txn.delete(raw, db=self._zset)
+            txn.delete(prefix + member.encode(), db=self._zmember)
+        return len(doomed)
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        with self.env.begin(write=True) as txn:
+            return self._zremrangebyscore(txn, key, min_score, max_score)
+
+    def _zrem(self, txn, key: str, *members: str) -> int:
+        prefix = key.encode() + b"\0"
+        removed = 0
+        for member in members:
+            encoded = member.encode()
+            score_key = txn.get(prefix + encoded, db=self._zmember)
+            if score_key is not None:
+                txn.delete(prefix + bytes(score_key) + encoded, db=self._zset)
+                txn.delete(prefix + encoded, db=self._zmember)
+                removed += 1
+        return removed
+
+    async def zrem(self, key: str, *members: str) -> int:
+        with self.env.begin(write=True) as txn:
+            return self._zrem(txn, key, *members)
+
+    def batch(self) -> WriteBatch:
+        return _LMDBBatch(self)
+
+
+class _LMDBBatch(_QueuedBatch):
+    """WriteBatch applied in a single LMDB write transaction."""
+
+    async def execute(self) -> List[bool]:
+        operations, self.operations = self.operations, []
+        backend = self.backend
+        applied = []
+        with backend.env.begin(write=True) as txn:
+            for name, args in operations:
+                if name == "delete":
+                    backend._delete(txn, args)
+                else:
+                    result = getattr(backend, f"_{name}")(txn, *args)
+                    if name == "set_if":
+                        applied.append(result)
+        return applied
+
+
+def create_backend(name: str, redis_url: str = "", lmdb_path: str = "",
+                   lmdb_map_size_mb: int = 1024) -> CacheBackend:
+    """
+    Build a backend by name.
+
+    Args:
+        name: "redis", "memory" or "lmdb"
+        redis_url: Redis connection URL (redis backend)
+        lmdb_path: Environment directory (lmdb backend)
+        lmdb_map_size_mb: Memory map size (lmdb backend)
+
+    Returns:
+        An unconnected backend instance
+    """
+    if name == "redis":
+        return RedisBackend(redis_url)
+    if name == "lmdb":
+        return LMDBBackend(lmdb_path, lmdb_map_size_mb)
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown cache backend '{name}'")
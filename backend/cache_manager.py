@@ -1,127 +1,425 @@
 """
 Cache Manager for Air Quality Data
-Supports both Redis and in-memory caching
+Stores station data on a pluggable backend (Redis, in-memory or LMDB)
 """
 import logging
 import json
+import math
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-import redis.asyncio as redis
+from typing import Optional, List, AsyncIterator, Tuple, Dict, Callable, Iterable
 
-from models import StationData, CityInfo
+from models import StationData, CityInfo, ForecastDay
 from config import settings
+from cache_backends import CacheBackend, MemoryBackend, WriteBatch, create_backend
+from serialization import SnapshotCodec
+from profiling import timed
+from projection import FieldSet, encode_json, fields_key, parse_fields, project
+from rolling_stats import STATE_TTL_SECONDS, RollingStats, state_version
 
 logger = logging.getLogger(__name__)
 
+# (recorded at epoch seconds, metric values, observation timestamp)
+Reading = Tuple[float, Dict[str, Optional[float]], str]
+
 
 class CacheManager:
     """
-    Cache manager supporting Redis and in-memory fallback.
-    Handles storage and retrieval of air quality data.
+    Cache manager for air quality data.
+    Handles storage and retrieval of air quality data on top of a
+    CacheBackend, so every storage option shares the same logic.
     """
     
-    def __init__(self):
-        """Initialize the cache manager."""
-        self.redis_client: Optional[redis.Redis] = None
-        self.memory_cache: Dict = {}
-        self.use_redis = False
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        codec: Optional[SnapshotCodec] = None
+    ):
+        """
+        Initialize the cache manager.
+        
+        Args:
+            backend: Backend to use; chosen from settings on connect if None
+            codec: Snapshot codec; built from settings if None
+        """
+        self.backend: Optional[CacheBackend] = backend
+        self.codec = codec or SnapshotCodec.from_settings(settings)
+        # Last forecast written per station, as (issue date, forecast), so
+        # an unchanged forecast isn't rewritten every refresh
+        self._written_forecasts: Dict[str, Tuple[str, dict]] = {}
+        # Rolling statistics last stored per station with the version they
+        # were stored under, so writes don't read them back first; a write
+        # only applies if the stored version is unchanged
+        self._rolling: Dict[str, Tuple[Optional[bytes], RollingStats]] = {}
+        # Called with (station_id, data) for every live reading once it is
+        # stored (e.g. the alert engine); must be fast and non-blocking
+        self.observers: List[Callable[[str, StationData], None]] = []
+        # Called with (city, station_id, station_name) when a city-station
+        # mapping is stored, and with (city, None, None) when it is deleted
+        self.mapping_listeners: List[Callable[[str, Optional[str], Optional[str]], None]] = []
+        # Field sets whose projection of the latest reading is stored
+        # ready to serve, by canonical key
+        self.projections: Dict[str, FieldSet] = self._parse_presets(settings.PROJECTION_PRESETS)
+        # The one retention policy: snapshots expire, and their history
+        # entries are trimmed, this long after being recorded
+        self.retention_seconds = settings.CACHE_TTL_HOURS * 3600
     
-    async def connect(self):
-        """Connect to Redis or initialize in-memory cache."""
-        if settings.REDIS_URL:
+    @staticmethod
+    def _parse_presets(spec: str) -> Dict[str, FieldSet]:
+        """Parse ";"-separated field lists, skipping invalid ones."""
+        presets = {}
+        for part in spec.split(";"):
+            if not part.strip():
+                continue
             try:
-                self.redis_client = redis.from_url(
-                    settings.REDIS_URL,
-                    encoding="utf-8",
-                    decode_responses=True
+                fields = parse_fields(part)
+            except ValueError as e:
+                logger.error("Ignoring projection preset %r: %s", part, e)
+                continue
+            presets[fields_key(fields)] = fields
+        return presets
+    
+    async def connect(self):
+        """Connect the configured backend, falling back to in-memory."""
+        if self.backend is None:
+            self.backend = self._backend_from_settings()
+        
+        try:
+            await self.backend.connect()
+            logger.info("Using %s cache backend", self.backend.name)
+        except Exception as e:
+            logger.warning(
+                "Failed to connect %s cache backend: %s. Using in-memory cache.", self.backend.name, e
+            )
+            self.backend = MemoryBackend()
+            await self.backend.connect()
+    
+    def _backend_from_settings(self) -> CacheBackend:
+        """Build the backend selected by CACHE_BACKEND."""
+        name = settings.CACHE_BACKEND.lower()
+        
+        if name == "auto":
+            if not settings.REDIS_URL:
+                logger.info("No Redis URL configured. Using in-memory cache.")
+            name = "redis" if settings.REDIS_URL else "memory"
+        
+        return create_backend(
+            name,
+            redis_url=settings.REDIS_URL,
+            lmdb_path=settings.LMDB_PATH,
+            lmdb_map_size_mb=settings.LMDB_MAP_SIZE_MB
+        )
+    
+    async def disconnect(self):
+        """Disconnect the backend."""
+        if self.backend:
+            await self.backend.close()
+            logger.info("Disconnected %s cache backend", self.backend.name)
+    
+    def _queue_station_data(
+        self,
+        batch: WriteBatch,
+        station_id: str,
+        data: StationData,
+        now: datetime,
+        forecasts: Dict[str, Tuple[str, dict]],
+        ttl: Optional[int] = None,
+        update_latest: bool = True
+    ):
+        """
+        Queue the writes that store one snapshot.
+        
+        Args:
+            batch: WriteBatch to add the writes to
+            station_id: WAQI station identifier
+            data: StationData object to cache
+            now: Time the snapshot is recorded at (naive UTC)
+            forecasts: Forecasts queued in this batch by station, as
+                (issue date, forecast); the caller records them as written
+                once the batch succeeds (see _commit_forecasts)
+            ttl: Expiry in seconds (defaults to the retention)
+            update_latest: Also replace the latest pointer and projections
+        """
+        timestamp = now.strftime("%Y%m%d%H%M%S")
+        cache_key = f"airquality:{station_id}:{timestamp}"
+        latest_key = f"airquality:latest:{station_id}"
+        history_key = f"airquality:history:{station_id}"
+        ttl = ttl or self.retention_seconds
+        
+        if data.forecast:
+            # History entries reference the forecast stored once per
+            # station-day; the latest pointer keeps it inline
+            issued = self._forecast_issue_date(data, now)
+            data = data.model_copy(update={"forecast_issued": issued})
+            history_data = data.model_copy(update={"forecast": {}})
+            
+            written = forecasts.get(station_id) or self._written_forecasts.get(station_id)
+            if written != (issued, data.forecast):
+                # Outlive the last snapshot of the issue day referencing it
+                batch.set(
+                    f"airquality:forecast:{station_id}:{issued}",
+                    self.codec.encode_forecast(data.forecast),
+                    ttl + 86400
                 )
-                # Test connection
-                await self.redis_client.ping()
-                self.use_redis = True
-                logger.info(f"Connected to Redis at {settings.REDIS_URL}")
-            except Exception as e:
-                logger.warning(f"Failed to connect to Redis: {e}. Using in-memory cache.")
-                self.use_redis = False
-                self.memory_cache = {}
+                forecasts[station_id] = (issued, data.forecast)
         else:
-            logger.info("No Redis URL configured. Using in-memory cache.")
-            self.use_redis = False
-            self.memory_cache = {}
+            history_data = data
+        
+        # Serialize data
+        payload = self.codec.encode(data)
+        
+        batch.set(cache_key, self.codec.encode(history_data), ttl)
+        
+        # Update latest pointer
+        if update_latest:
+            batch.set(latest_key, payload, ttl)
+            for key, fields in self.projections.items():
+                batch.set(f"airquality:projected:{station_id}:{key}", encode_json(project(data, fields)), ttl)
+        
+        # Add to sorted set for history
+        batch.zadd(history_key, {cache_key: now.timestamp()})
+        
+        # Trim entries past the retention (their snapshots have expired);
+        # stations that stop reporting are trimmed by the HistoryCompactor
+        batch.zremrangebyscore(history_key, 0, now.timestamp() - self.retention_seconds)
     
-    async def disconnect(self):
-        """Disconnect from Redis."""
-        if self.redis_client:
-            await self.redis_client.close()
-            logger.info("Disconnected from Redis")
+    def _commit_forecasts(self, forecasts: Dict[str, Tuple[str, dict]]):
+        """Record the forecasts of a batch that executed successfully."""
+        self._written_forecasts.update(forecasts)
+    
+    async def _load_rolling(self, station_ids: List[str]):
+        """Read the rolling statistics of stations not held in memory yet."""
+        missing = [station_id for station_id in dict.fromkeys(station_ids) if station_id not in self._rolling]
+        if not missing:
+            return
+        payloads = await self.backend.mget([f"airquality:stats:{station_id}" for station_id in missing])
+        for station_id, payload in zip(missing, payloads):
+            state = RollingStats()
+            if payload:
+                try:
+                    state = RollingStats.decode(payload)
+                except Exception as e:
+                    logger.warning("Discarding unreadable rolling stats of station %s: %s", station_id, e)
+            self._rolling[station_id] = (state_version(payload) if payload else None, state)
+    
+    @staticmethod
+    def _reading(data: StationData, now: datetime) -> Reading:
+        values = data.pollutants.model_dump()
+        values["aqi"] = data.aqi
+        return now.timestamp(), values, data.timestamp
+    
+    def _queue_rolling(
+        self, batch: WriteBatch, readings: Dict[str, List[Reading]]
+    ) -> List[Tuple[str, bytes, RollingStats]]:
+        """
+        Add readings to the held rolling statistics and queue one
+        conditional write per station whose state changed.
+        
+        Returns:
+            (station_id, encoded state, state) per queued write, in queue order
+        """
+        queued = []
+        for station_id, station_readings in readings.items():
+            version, state = self._rolling[station_id]
+            changed = False
+            for reading in station_readings:
+                changed = state.add(*reading) or changed
+            if changed:
+                payload = state.encode()
+                batch.set_if(f"airquality:stats:{station_id}", payload, STATE_TTL_SECONDS, version)
+                queued.append((station_id, payload, state))
+        return queued
+    
+    async def _commit_rolling(
+        self,
+        queued: List[Tuple[str, bytes, RollingStats]],
+        applied: List[bool],
+        readings: Dict[str, List[Reading]]
+    ):
+        """
+        Record the rolling statistics a batch stored, and redo the updates
+        another writer (e.g. a lazy fetch on another worker) got in before.
+        
+        A conflicting station's state is read again and its readings are
+        re-applied, a few times at most; readings the other writer already
+        counted, or older than its last one, are ignored as usual.
+        """
+        retries = 3
+        try:
+            while True:
+                conflicts = []
+                for (station_id, payload, state), stored in zip(queued, applied):
+                    if stored:
+                        self._rolling[station_id] = (state_version(payload), state)
+                    else:
+                        conflicts.append(station_id)
+                if not conflicts:
+                    return
+                
+                self._forget_rolling(conflicts)
+                if not retries:
+                    logger.warning(
+                        "Rolling stats of %s stations not updated after repeated conflicts", len(conflicts)
+                    )
+                    return
+                retries -= 1
+                
+                await self._load_rolling(conflicts)
+                batch = self.backend.batch()
+                queued = self._queue_rolling(batch, {station_id: readings[station_id] for station_id in conflicts})
+                applied = await batch.execute()
+        
+        except Exception as e:
+            self._forget_rolling(readings)
+            logger.error("Error updating rolling stats: %s", e)
+    
+    def _forget_rolling(self, station_ids: Iterable[str]):
+        """Drop held rolling statistics (e.g. holding unstored readings)."""
+        for station_id in station_ids:
+            self._rolling.pop(station_id, None)
+    
+    @staticmethod
+    def _forecast_issue_date(data: StationData, now: datetime) -> str:
+        """Station-local date of the observation, else the recording date."""
+        try:
+            return datetime.fromisoformat(data.timestamp).date().isoformat()
+        except ValueError:
+            return now.date().isoformat()
     
     async def cache_station_data(self, station_id: str, data: StationData):
         """
         Cache station data with timestamp.
         
+        All writes for the snapshot are applied as one atomic batch
+        (a single round trip on Redis). The rolling statistics are read
+        only on the station's first write in this process, or when another
+        writer changed them since (see _commit_rolling).
+        
         Args:
             station_id: WAQI station identifier
             data: StationData object to cache
         """
         try:
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            cache_key = f"airquality:{station_id}:{timestamp}"
-            latest_key = f"airquality:latest:{station_id}"
+            now = datetime.utcnow()
+            await self._load_rolling([station_id])
+            batch = self.backend.batch()
+            forecasts: Dict[str, Tuple[str, dict]] = {}
+            self._queue_station_data(batch, station_id, data, now, forecasts)
+            readings = {station_id: [self._reading(data, now)]}
+            queued = self._queue_rolling(batch, readings)
+            applied = await batch.execute()
+            self._commit_forecasts(forecasts)
+            await self._commit_rolling(queued, applied, readings)
+            self._notify(station_id, data)
+        
+        except Exception as e:
+            self._forget_rolling([station_id])
+            logger.error("Error caching station data: %s", e)
+    
+    def _notify(self, station_id: str, data: StationData):
+        """Pass a stored reading to the observers."""
+        for observer in self.observers:
+            try:
+                observer(station_id, data)
+            except Exception as e:
+                logger.error("Error in cache observer for station %s: %s", station_id, e)
+    
+    async def cache_many(
+        self, stations: List[Tuple[str, StationData]], chunk_size: int = 100
+    ) -> int:
+        """
+        Cache data for many stations in a few batched writes.
+        
+        Args:
+            stations: (station_id, StationData) pairs
+            chunk_size: Stations per batch (bounds the size of each request)
             
-            # Serialize data
-            data_json = data.model_dump_json()
+        Returns:
+            Number of stations cached
+        """
+        now = datetime.utcnow()
+        return await self.cache_snapshots(
+            [(station_id, data, now) for station_id, data in stations], chunk_size, notify=True
+        )
+    
+    async def cache_snapshots(
+        self,
+        snapshots: List[Tuple[str, StationData, datetime]],
+        chunk_size: int = 100,
+        notify: bool = False,
+        keep_newer_latest: bool = False
+    ) -> int:
+        """
+        Cache snapshots recorded at their own times (e.g. replayed payloads).
+        
+        Snapshots older than the cache retention are skipped; the others
+        expire when they would have had they been cached live. A snapshot
+        recorded at the same time as a stored one replaces it.
+        
+        Args:
+            snapshots: (station_id, StationData, recorded at naive UTC) triples
+            chunk_size: Snapshots per batch (bounds the size of each request)
+            notify: Pass stored snapshots to the observers (live readings only)
+            keep_newer_latest: Only replace a station's latest pointer and
+                projections with a snapshot at least as recent as its newest
+                history entry (for replays of old payloads)
             
-            if self.use_redis:
-                # Store in Redis
-                await self.redis_client.setex(
-                    cache_key,
-                    settings.CACHE_TTL_HOURS * 3600,
-                    data_json
-                )
-                
-                # Update latest pointer
-                await self.redis_client.setex(
-                    latest_key,
-                    settings.CACHE_TTL_HOURS * 3600,
-                    data_json
-                )
-                
-                # Add to sorted set for history
-                score = datetime.utcnow().timestamp()
-                await self.redis_client.zadd(
-                    f"airquality:history:{station_id}",
-                    {cache_key: score}
-                )
-                
-                # Clean old history (keep only last 48 hours)
-                cutoff_time = datetime.utcnow() - timedelta(hours=48)
-                await self.redis_client.zremrangebyscore(
-                    f"airquality:history:{station_id}",
-                    0,
-                    cutoff_time.timestamp()
-                )
-            else:
-                # Store in memory
-                if station_id not in self.memory_cache:
-                    self.memory_cache[station_id] = {
-                        'latest': None,
-                        'history': []
-                    }
-                
-                self.memory_cache[station_id]['latest'] = data_json
-                self.memory_cache[station_id]['history'].append({
-                    'timestamp': datetime.utcnow(),
-                    'data': data_json
-                })
+        Returns:
+            Number of snapshots cached
+        """
+        cached = 0
+        now = datetime.utcnow()
+        retention = self.retention_seconds
+        
+        for offset in range(0, len(snapshots), chunk_size):
+            chunk = snapshots[offset:offset + chunk_size]
+            readings: Dict[str, List[Reading]] = {}
+            try:
+                await self._load_rolling([station_id for station_id, _, _ in chunk])
+                newest = await self._newest_recorded(chunk) if keep_newer_latest else {}
+                batch = self.backend.batch()
+                forecasts: Dict[str, Tuple[str, dict]] = {}
+                queued = []
+                for station_id, data, recorded_at in chunk:
+                    ttl = retention - int((now - recorded_at).total_seconds())
+                    if ttl <= 0:
+                        continue
+                    score = recorded_at.timestamp()
+                    update_latest = score >= newest.get(station_id, -math.inf)
+                    if keep_newer_latest and update_latest:
+                        newest[station_id] = score
+                    self._queue_station_data(
+                        batch, station_id, data, recorded_at, forecasts, ttl,
+                        update_latest=update_latest
+                    )
+                    readings.setdefault(station_id, []).append(self._reading(data, recorded_at))
+                    queued.append((station_id, data))
+                stats_queued = self._queue_rolling(batch, readings)
+                applied = await batch.execute()
+                self._commit_forecasts(forecasts)
+                await self._commit_rolling(stats_queued, applied, readings)
+                cached += len(queued)
                 
-                # Keep only last 48 hours in memory
-                cutoff = datetime.utcnow() - timedelta(hours=48)
-                self.memory_cache[station_id]['history'] = [
-                    item for item in self.memory_cache[station_id]['history']
-                    if item['timestamp'] > cutoff
-                ]
+                if notify:
+                    for station_id, data in queued:
+                        self._notify(station_id, data)
+            
+            except Exception as e:
+                self._forget_rolling(readings)
+                logger.error("Error caching batch of %s snapshots: %s", len(chunk), e)
         
-        except Exception as e:
-            logger.error(f"Error caching station data: {e}")
+        return cached
+    
+    async def _newest_recorded(self, snapshots: List[Tuple[str, StationData, datetime]]) -> Dict[str, float]:
+        """Score of the newest history entry of each station in snapshots."""
+        station_ids = list(dict.fromkeys(station_id for station_id, _, _ in snapshots))
+        ranges = await self.backend.zrangebyscore_many(
+            [f"airquality:history:{station_id}" for station_id in station_ids],
+            -math.inf, math.inf, withscores=True
+        )
+        return {
+            station_id: entries[-1][1]
+            for station_id, entries in zip(station_ids, ranges) if entries
+        }
     
     async def get_latest_station_data(self, station_id: str) -> Optional[StationData]:
         """
@@ -129,31 +427,95 @@ class CacheManager:
         
         Args:
             station_id: WAQI station identifier
-            
+        
         Returns:
             StationData or None if not found
         """
         try:
-            latest_key = f"airquality:latest:{station_id}"
-            
-            if self.use_redis:
-                data_json = await self.redis_client.get(latest_key)
-                if data_json:
-                    return StationData.model_validate_json(data_json)
-            else:
-                if station_id in self.memory_cache:
-                    data_json = self.memory_cache[station_id].get('latest')
-                    if data_json:
-                        return StationData.model_validate_json(data_json)
+            with timed("cache"):
+                payload = await self.backend.get(f"airquality:latest:{station_id}")
+            if payload:
+                with timed("deserialize"):
+                    return self.codec.decode(payload)
             
             return None
         
         except Exception as e:
-            logger.error(f"Error getting latest station data: {e}")
+            logger.error("Error getting latest station data: %s", e)
             return None
     
+    async def get_latest_projected(self, station_id: str, fields: FieldSet) -> Optional[bytes]:
+        """
+        Get a stored projection of a station's latest reading.
+        
+        Args:
+            station_id: WAQI station identifier
+            fields: Canonical field set
+        
+        Returns:
+            Serialized JSON, or None if the field set is not a preset or
+            nothing is stored
+        """
+        key = fields_key(fields)
+        if key not in self.projections:
+            return None
+        try:
+            with timed("cache"):
+                return await self.backend.get(f"airquality:projected:{station_id}:{key}")
+        except Exception as e:
+            logger.error("Error getting projected data of station %s: %s", station_id, e)
+            return None
+    
+    async def get_rolling_stats(self, station_id: str) -> Dict[str, Dict[str, dict]]:
+        """
+        Get rolling 1h/24h/7d statistics of a station.
+        
+        Args:
+            station_id: WAQI station identifier
+        
+        Returns:
+            Metric ("aqi" or a pollutant) -> window -> aggregates; empty if
+            the station has no readings in any window
+        """
+        try:
+            with timed("cache"):
+                payload = await self.backend.get(f"airquality:stats:{station_id}")
+            if not payload:
+                return {}
+            with timed("deserialize"):
+                return RollingStats.decode(payload).summary(datetime.utcnow().timestamp())
+        
+        except Exception as e:
+            logger.error("Error getting rolling stats of station %s: %s", station_id, e)
+            return {}
+    
+    async def get_latest_many(self, station_ids: List[str]) -> List[Optional[StationData]]:
+        """
+        Get the latest cached data for several stations in one read.
+        
+        Args:
+            station_ids: WAQI station identifiers
+        
+        Returns:
+            StationData (or None if not found) for each station, in order
+        """
+        try:
+            with timed("cache"):
+                values = await self.backend.mget(
+                    [f"airquality:latest:{station_id}" for station_id in station_ids]
+                )
+            with timed("deserialize"):
+                return [
+                    self.codec.decode(payload) if payload else None
+                    for payload in values
+                ]
+        
+        except Exception as e:
+            logger.error("Error getting latest data for stations: %s", e)
+            return [None] * len(station_ids)
+    
     async def get_station_history(
-        self, station_id: str, hours: int = 24
+        self, station_id: str, hours: int = 24, include_forecast: bool = False
     ) -> List[StationData]:
         """
         Get historical data for a station.
@@ -161,42 +523,337 @@ class CacheManager:
         Args:
             station_id: WAQI station identifier
             hours: Number of hours of history to retrieve
-            
+            include_forecast: Attach each entry's forecast from the forecast store
+        
         Returns:
             List of StationData objects
         """
         try:
-            history = []
-            cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+            now = datetime.utcnow()
+            # Entries past the retention reference expired snapshots
+            cutoff_time = now - timedelta(seconds=min(hours * 3600, self.retention_seconds))
             
-            if self.use_redis:
+            with timed("cache"):
                 # Get keys from sorted set
-                history_key = f"airquality:history:{station_id}"
-                cache_keys = await self.redis_client.zrangebyscore(
-                    history_key,
+                cache_keys = await self.backend.zrangebyscore(
+                    f"airquality:history:{station_id}",
                     cutoff_time.timestamp(),
-                    datetime.utcnow().timestamp()
+                    now.timestamp()
                 )
                 
-                # Fetch data for each key
-                for key in cache_keys:
-                    data_json = await self.redis_client.get(key)
-                    if data_json:
-                        history.append(StationData.model_validate_json(data_json))
+                # Fetch data for all keys in one read
+                values = await self.backend.mget(cache_keys)
+            with timed("deserialize"):
+                history = [
+                    self.codec.decode(payload)
+                    for payload in values if payload
+                ]
+            
+            if include_forecast:
+                await self._attach_forecasts(station_id, history)
             else:
-                if station_id in self.memory_cache:
-                    for item in self.memory_cache[station_id].get('history', []):
-                        if item['timestamp'] > cutoff_time:
-                            history.append(StationData.model_validate_json(item['data']))
+                # Snapshots written before the forecast store embed it
+                history = [
+                    entry.model_copy(update={"forecast": {}}) if entry.forecast else entry
+                    for entry in history
+                ]
             
             return sorted(history, key=lambda x: x.timestamp, reverse=True)
         
         except Exception as e:
-            logger.error(f"Error getting station history: {e}")
+            logger.error("Error getting station history: %s", e)
+            return []
+    
+    async def get_station_histories(
+        self, station_ids: List[str], hours: int = 24, chunk_size: int = 100
+    ) -> List[List[StationData]]:
+        """
+        Get the history of many stations in a few bulk reads.
+        
+        Each chunk of stations costs one pipelined read of the history
+        indexes and one read of the snapshots, however many stations it has.
+        Forecasts are not attached.
+        
+        Args:
+            station_ids: WAQI station identifiers
+            hours: Number of hours of history to retrieve
+            chunk_size: Stations per read (bounds the size of each request)
+        
+        Returns:
+            Per station, in order, its StationData objects newest first
+            (empty if unavailable)
+        """
+        now = datetime.utcnow()
+        cutoff_time = now - timedelta(seconds=min(hours * 3600, self.retention_seconds))
+        histories: List[List[StationData]] = []
+        
+        for offset in range(0, len(station_ids), chunk_size):
+            chunk = station_ids[offset:offset + chunk_size]
+            try:
+                ranges = await self.backend.zrangebyscore_many(
+                    [f"airquality:history:{station_id}" for station_id in chunk],
+                    cutoff_time.timestamp(),
+                    now.timestamp()
+                )
+                values = iter(await self.backend.mget([key for keys in ranges for key in keys]))
+                decoded = []
+                for keys in ranges:
+                    history = [self.codec.decode(payload) for payload in (next(values) for _ in keys) if payload]
+                    # Snapshots written before the forecast store embed it
+                    history = [
+                        entry.model_copy(update={"forecast": {}}) if entry.forecast else entry
+                        for entry in history
+                    ]
+                    decoded.append(sorted(history, key=lambda x: x.timestamp, reverse=True))
+                histories.extend(decoded)
+            
+            except Exception as e:
+                logger.error("Error getting history of %s stations: %s", len(chunk), e)
+                histories.extend([] for _ in chunk)
+        
+        return histories
+    
+    async def _attach_forecasts(self, station_id: str, snapshots: List[StationData]):
+        """Fill in forecasts of snapshots that reference the forecast store."""
+        issued = sorted({
+            s.forecast_issued for s in snapshots
+            if s.forecast_issued and not s.forecast
+        })
+        if not issued:
+            return
+        
+        values = await self.backend.mget(
+            [f"airquality:forecast:{station_id}:{day}" for day in issued]
+        )
+        forecasts = {
+            day: self.codec.decode_forecast(payload)
+            for day, payload in zip(issued, values) if payload
+        }
+        for snapshot in snapshots:
+            if snapshot.forecast_issued in forecasts and not snapshot.forecast:
+                snapshot.forecast = forecasts[snapshot.forecast_issued]
+    
+    async def get_forecast(
+        self, station_id: str, issued: str
+    ) -> Optional[Dict[str, List[ForecastDay]]]:
+        """
+        Get the forecast a station issued on a given day.
+        
+        Args:
+            station_id: WAQI station identifier
+            issued: Issue date (YYYY-MM-DD)
+        
+        Returns:
+            Forecast days by pollutant, or None if not stored
+        """
+        try:
+            payload = await self.backend.get(f"airquality:forecast:{station_id}:{issued}")
+            return self.codec.decode_forecast(payload) if payload else None
+        
+        except Exception as e:
+            logger.error("Error getting forecast: %s", e)
+            return None
+    
+    async def cache_daily_many(
+        self, records: List[Tuple[str, str, Dict[str, dict]]], chunk_size: int = 1000
+    ) -> int:
+        """
+        Store daily pollutant aggregates, merging into existing days.
+        
+        Daily records are kept without expiry under
+        ``airquality:daily:{station_id}:{date}`` and indexed by date in
+        ``airquality:daily-history:{station_id}``. Pollutants present in
+        both the stored and the new record take the new values.
+        
+        Args:
+            records: (station_id, ISO date, {pollutant: {"min", "max",
+                "median", "count"}}) triples
+            chunk_size: Records per read/write round trip
+            
+        Returns:
+            Number of daily records written
+        """
+        written = 0
+        for offset in range(0, len(records), chunk_size):
+            chunk = records[offset:offset + chunk_size]
+            try:
+                keys = [f"airquality:daily:{station_id}:{day}" for station_id, day, _ in chunk]
+                existing = await self.backend.mget(keys)
+                
+                batch = self.backend.batch()
+                for key, stored, (station_id, day, pollutants) in zip(keys, existing, chunk):
+                    merged = {**json.loads(stored), **pollutants} if stored else pollutants
+                    batch.set(key, json.dumps(merged, separators=(",", ":")).encode())
+                    batch.zadd(
+                        f"airquality:daily-history:{station_id}",
+                        {key: datetime.fromisoformat(day).timestamp()}
+                    )
+                await batch.execute()
+                written += len(chunk)
+            
+            except Exception as e:
+                logger.error("Error caching batch of %s daily records: %s", len(chunk), e)
+        
+        return written
+    
+    async def get_daily_history(
+        self, station_id: str, start: datetime, end: datetime
+    ) -> List[Tuple[str, Dict[str, dict]]]:
+        """
+        Get daily pollutant aggregates of a station.
+        
+        Args:
+            station_id: WAQI station identifier
+            start: First day (inclusive, naive)
+            end: Last day (inclusive, naive)
+        
+        Returns:
+            (ISO date, {pollutant: aggregates}) pairs, oldest first
+        """
+        try:
+            with timed("cache"):
+                keys = await self.backend.zrangebyscore(
+                    f"airquality:daily-history:{station_id}", start.timestamp(), end.timestamp()
+                )
+                values = await self.backend.mget(keys)
+            with timed("deserialize"):
+                return [
+                    (key.rsplit(":", 1)[1], json.loads(payload))
+                    for key, payload in zip(keys, values) if payload
+                ]
+        
+        except Exception as e:
+            logger.error("Error getting daily history: %s", e)
             return []
     
+    async def iter_station_history(
+        self,
+        station_id: str,
+        start: datetime,
+        end: datetime,
+        batch_size: int = 500
+    ) -> AsyncIterator[List[StationData]]:
+        """
+        Stream historical data for a station in chronological batches.
+        
+        Unlike get_station_history, only one batch is held in memory at a
+        time, so arbitrarily long ranges can be exported.
+        
+        Args:
+            station_id: WAQI station identifier
+            start: Start of the range (naive UTC)
+            end: End of the range (naive UTC)
+            batch_size: Maximum number of entries per batch
+        
+        Yields:
+            Lists of StationData objects, oldest first
+        
+        Raises:
+            Exception: Read errors are logged and re-raised, so a streamed
+                response aborts instead of ending as if complete
+        """
+        try:
+            history_key = f"airquality:history:{station_id}"
+            lower = start.timestamp()
+            
+            while True:
+                # Page through the index with a score cursor so entries
+                # trimmed concurrently don't shift the window
+                page = await self.backend.zrangebyscore(
+                    history_key,
+                    lower,
+                    end.timestamp(),
+                    count=batch_size,
+                    withscores=True
+                )
+                if not page:
+                    break
+                
+                values = await self.backend.mget([key for key, _ in page])
+                batch = [
+                    self.codec.decode(payload)
+                    for payload in values if payload
+                ]
+                if batch:
+                    yield batch
+                
+                if len(page) < batch_size:
+                    break
+                # Smallest score strictly above the last one returned
+                lower = math.nextafter(page[-1][1], math.inf)
+        
+        except Exception as e:
+            logger.error("Error streaming station history of %s: %s", station_id, e)
+            raise
+    
+    async def migrate_encoding(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Re-encode cached snapshots written in another format.
+        
+        Snapshots keep their original expiry (derived from their history
+        score); latest pointers get a full TTL since they are rewritten on
+        every refresh anyway.
+        
+        Args:
+            batch_size: Keys re-encoded per batched write
+            
+        Returns:
+            Counts of migrated/current keys and total bytes before/after
+        """
+        stats = {"migrated": 0, "current": 0, "bytes_before": 0, "bytes_after": 0}
+        ttl = self.retention_seconds
+        now = datetime.utcnow().timestamp()
+        
+        async def migrate(entries: List[Tuple[str, int]]):
+            values = await self.backend.mget([key for key, _ in entries])
+            batch = self.backend.batch()
+            for (key, key_ttl), payload in zip(entries, values):
+                if not payload:
+                    continue
+                if self.codec.is_current(payload):
+                    stats["current"] += 1
+                    continue
+                encoded = self.codec.encode(self.codec.decode(payload))
+                batch.set(key, encoded, key_ttl)
+                stats["migrated"] += 1
+                stats["bytes_before"] += len(payload)
+                stats["bytes_after"] += len(encoded)
+            await batch.execute()
+        
+        pending: List[Tuple[str, int]] = []
+        async for history_key in self.backend.scan_keys("airquality:history:"):
+            for key, score in await self.backend.zrangebyscore(
+                history_key, 0, math.inf, withscores=True
+            ):
+                remaining = int(score + ttl - now)
+                if remaining > 0:
+                    pending.append((key, remaining))
+                if len(pending) >= batch_size:
+                    await migrate(pending)
+                    pending = []
+        
+        async for latest_key in self.backend.scan_keys("airquality:latest:"):
+            pending.append((latest_key, ttl))
+            if len(pending) >= batch_size:
+                await migrate(pending)
+                pending = []
+        
+        if pending:
+            await migrate(pending)
+        
+        logger.info(
+            "Cache migration complete: %s migrated, %s already current",
+            stats["migrated"], stats["current"]
+        )
+        return stats
+    
     async def set_city_station_mapping(
-        self, city: str, station_id: str, station_name: str
+        self,
+        city: str,
+        station_id: str,
+        station_name: str,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None
     ):
         """
         Store mapping between city and station.
@@ -205,23 +862,94 @@ class CacheManager:
             city: City name
             station_id: WAQI station identifier
             station_name: Human-readable station name
+            lat: Latitude the station was discovered for
+            lon: Longitude the station was discovered for
         """
         try:
             mapping_key = f"city:station:{city.lower()}"
             mapping_data = json.dumps({
                 'station_id': station_id,
-                'station_name': station_name
+                'station_name': station_name,
+                'lat': lat,
+                'lon': lon
             })
             
-            if self.use_redis:
-                await self.redis_client.set(mapping_key, mapping_data)
-            else:
-                if 'city_mappings' not in self.memory_cache:
-                    self.memory_cache['city_mappings'] = {}
-                self.memory_cache['city_mappings'][city.lower()] = mapping_data
+            await self.backend.set(mapping_key, mapping_data.encode())
+            self.notify_mapping(city, station_id, station_name)
         
         except Exception as e:
-            logger.error(f"Error setting city-station mapping: {e}")
+            logger.error("Error setting city-station mapping: %s", e)
+    
+    async def delete_city_station_mapping(self, city: str):
+        """
+        Remove the mapping of a city that is no longer monitored.
+        
+        Args:
+            city: City name (case-insensitive)
+        """
+        try:
+            await self.backend.delete(f"city:station:{city.lower()}")
+            self.notify_mapping(city, None, None)
+        
+        except Exception as e:
+            logger.error("Error deleting city-station mapping: %s", e)
+    
+    async def get_city_station_mappings(self, cities: List[str]) -> List[Optional[dict]]:
+        """
+        Get the stored mappings of several cities in one round trip.
+        
+        Args:
+            cities: City names (case-insensitive)
+        
+        Returns:
+            Per city, a dict with station_id, station_name and the lat/lon
+            it was discovered for (None when unmapped or unreadable)
+        """
+        if not cities:
+            return []
+        try:
+            values = await self.backend.mget([f"city:station:{city.lower()}" for city in cities])
+            return [json.loads(value) if value else None for value in values]
+        
+        except Exception as e:
+            logger.error("Error getting city-station mappings: %s", e)
+            return [None] * len(cities)
+    
+    def notify_mapping(self, city: str, station_id: Optional[str], station_name: Optional[str]):
+        """Pass a mapping change to the mapping listeners."""
+        for listener in self.mapping_listeners:
+            try:
+                listener(city, station_id, station_name)
+            except Exception as e:
+                logger.error("Error in mapping listener for %s: %s", city, e)
+    
+    async def evict_station(self, station_id: str) -> int:
+        """
+        Delete the latest snapshot, history and forecasts of a station.
+        
+        Args:
+            station_id: WAQI station identifier
+        
+        Returns:
+            Number of keys deleted
+        """
+        try:
+            history_key = f"airquality:history:{station_id}"
+            cache_keys = await self.backend.zrangebyscore(history_key, 0, math.inf)
+            forecast_keys = [
+                key async for key in self.backend.scan_keys(f"airquality:forecast:{station_id}:")
+            ]
+            self._written_forecasts.pop(station_id, None)
+            self._forget_rolling([station_id])
+            return await self.backend.delete(
+                *cache_keys, *forecast_keys, history_key,
+                f"airquality:latest:{station_id}", f"airquality:stats:{station_id}",
+                *(f"airquality:projected:{station_id}:{key}" for key in self.projections)
+            )
+        
+        except Exception as e:
+            logger.error("Error evicting station %s: %s", station_id, e)
+            return 0
     
     async def get_station_for_city(self, city: str) -> Optional[str]:
         """
@@ -229,18 +957,13 @@ class CacheManager:
         
         Args:
             city: City name (case-insensitive)
-            
+        
         Returns:
             Station ID or None if not found
         """
         try:
-            mapping_key = f"city:station:{city.lower()}"
-            
-            if self.use_redis:
-                mapping_data = await self.redis_client.get(mapping_key)
-            else:
-                mappings = self.memory_cache.get('city_mappings', {})
-                mapping_data = mappings.get(city.lower())
+            with timed("cache"):
+                mapping_data = await self.backend.get(f"city:station:{city.lower()}")
             
             if mapping_data:
                 mapping = json.loads(mapping_data)
@@ -249,7 +972,7 @@ class CacheManager:
             return None
         
         except Exception as e:
-            logger.error(f"Error getting station for city: {e}")
+            logger.error("Error getting station for city: %s", e)
             return None
     
     async def get_all_cities(self) -> List[CityInfo]:
@@ -260,29 +983,16 @@ class CacheManager:
             List of CityInfo objects
         """
         try:
-            cities = []
+            # Get all city mapping keys
+            keys = [key async for key in self.backend.scan_keys("city:station:")]
+            values = await self.backend.mget(keys)
             
-            if self.use_redis:
-                # Get all city mapping keys
-                keys = await self.redis_client.keys("city:station:*")
-                
-                for key in keys:
-                    city_name = key.replace("city:station:", "").title()
-                    mapping_data = await self.redis_client.get(key)
-                    
-                    if mapping_data:
-                        mapping = json.loads(mapping_data)
-                        cities.append(CityInfo(
-                            city=city_name,
-                            station_id=mapping.get('station_id'),
-                            station_name=mapping.get('station_name')
-                        ))
-            else:
-                mappings = self.memory_cache.get('city_mappings', {})
-                for city_lower, mapping_data in mappings.items():
+            cities = []
+            for key, mapping_data in zip(keys, values):
+                if mapping_data:
                     mapping = json.loads(mapping_data)
                     cities.append(CityInfo(
-                        city=city_lower.title(),
+                        city=key.replace("city:station:", "").title(),
                         station_id=mapping.get('station_id'),
                         station_name=mapping.get('station_name')
                     ))
@@ -290,5 +1000,5 @@ class CacheManager:
             return sorted(cities, key=lambda x: x.city)
         
         except Exception as e:
-            logger.error(f"Error getting all cities: {e}")
-            return []
\ No newline at end of file
+            logger.error("Error getting all cities: %s", e)
+            return []
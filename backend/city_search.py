@@ -0,0 +1,253 @@
+"""
+City Search Index
+In-memory autocomplete over city and station names: a sorted token
+array for prefix matches plus a trigram index for typo tolerance, kept
+in sync with the city-station mappings
+"""
+import bisect
+import math
+import re
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Share of the query's trigrams a fuzzy match must contain
+MIN_SIMILARITY = 0.5
+
+# Score bands; ties within a band go to shorter names
+SCORE_EXACT = 4.0
+SCORE_NAME_PREFIX = 3.0
+SCORE_WORD_PREFIX = 2.0
+SCORE_FUZZY = 1.0
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip accents and reduce punctuation to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of each word padded with spaces ("  b", " bo", ...)."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CityEntry(NamedTuple):
+    city: str
+    station_id: Optional[str]
+    station_name: Optional[str]
+
+
+class SearchResult(NamedTuple):
+    entry: CityEntry
+    score: float
+    match: str          # exact, prefix or fuzzy
+
+
+class CitySearchIndex:
+    """
+    Autocomplete index keyed by lower-cased city name.
+
+    Prefix lookups bisect a sorted array of (word, city key) pairs, which
+    is a flattened trie: every word starting with a prefix lies in one
+    contiguous range. One- and two-letter prefixes match too many words
+    to scan per query, so their best entries are kept ready. Queries that
+    match too few names by prefix fall back to trigram similarity, which
+    tolerates typos and transpositions. Updates only touch the changed
+    city's words and trigrams.
+    """
+
+    # Entries kept per short prefix (and the most a short query returns)
+    SHORT_PREFIX_ENTRIES = 64
+    # Most words scanned for a longer prefix
+    MAX_SCAN = 1000
+    # Fuzzy candidates gathered before the rest of the postings are skipped
+    MAX_FUZZY_CANDIDATES = 1000
+
+    def __init__(self, entries: Iterable[CityEntry] = ()):
+        self._entries: Dict[str, CityEntry] = {}
+        self._names: Dict[str, str] = {}                 # key -> normalized city name
+        self._entry_words: Dict[str, Tuple[str, ...]] = {}
+        self._words: List[Tuple[str, str]] = []          # sorted (word, key)
+        self._short: Dict[str, List[Tuple[int, int, str]]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._entry_trigrams: Dict[str, Set[str]] = {}
+
+        for entry in entries:
+            self._insert(entry)
+        # Sorted once rather than one insort per word
+        self._words = sorted(
+            (word, key) for key, words in self._entry_words.items() for word in words
+        )
+        for prefix in {word[:length] for word, _ in self._words for length in (1, 2)}:
+            self._rebuild_short(prefix)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, entry: CityEntry) -> str:
+        """Index everything but the sorted word array and short prefixes."""
+        key = entry.city.lower()
+        text = normalize(f"{entry.city} {entry.station_name or ''}")
+        self._entries[key] = entry
+        self._names[key] = normalize(entry.city)
+        self._entry_words[key] = tuple(sorted(set(text.split())))
+        grams = trigrams(text)
+        self._entry_trigrams[key] = grams
+        for gram in grams:
+            self._trigrams.setdefault(gram, set()).add(key)
+        return key
+
+    def _rank(self, prefix: str, key: str) -> Tuple[int, int, str]:
+        """Static order for a prefix: city names starting with it, then shorter names."""
+        name = self._names[key]
+        return (0 if name.startswith(prefix) else 1, len(name), key)
+
+    def _rebuild_short(self, prefix: str):
+        ranked = sorted({self._rank(prefix, key) for key in self._scan(prefix, None)})
+        if ranked:
+            self._short[prefix] = ranked[:self.SHORT_PREFIX_ENTRIES]
+        else:
+            self._short.pop(prefix, None)
+
+    def add(self, city: str, station_id: Optional[str] = None, station_name: Optional[str] = None):
+        """Add a city or replace its entry."""
+        if city.lower() in self._entries:
+            self.remove(city)
+
+        key = self._insert(CityEntry(city, station_id, station_name))
+        for word in self._entry_words[key]:
+            bisect.insort(self._words, (word, key))
+        for prefix in {word[:length] for word in self._entry_words[key] for length in (1, 2)}:
+            ranked = self._short.setdefault(prefix, [])
+            bisect.insort(ranked, self._rank(prefix, key))
+            del ranked[self.SHORT_PREFIX_ENTRIES:]
+
+    def remove(self, city: str):
+        """Remove a city; unknown cities are ignored."""
+        key = city.lower()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        del self._names[key]
+        words = self._entry_words.pop(key)
+        for word in words:
+            index = bisect.bisect_left(self._words, (word, key))
+            if index < len(self._words) and self._words[index] == (word, key):
+                del self._words[index]
+        for prefix in {word[:length] for word in words for length in (1, 2)}:
+            if any(ranked_key == key for _, _, ranked_key in self._short.get(prefix, ())):
+                # Refill from the word array so the list stays complete
+                self._rebuild_short(prefix)
+        for gram in self._entry_trigrams.pop(key):
+            keys = self._trigrams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._trigrams[gram]
+
+    def on_mapping(self, city: str, station_id: Optional[str], station_name: Optional[str]):
+        """CacheManager mapping listener (station_id None on deletion)."""
+        if station_id is None:
+            self.remove(city)
+        else:
+            self.add(city, station_id, station_name)
+
+    def _scan(self, prefix: str, limit: Optional[int]) -> Set[str]:
+        """Keys of entries with a word starting with prefix."""
+        words = self._words
+        start = bisect.bisect_left(words, (prefix, ""))
+        end = len(words) if limit is None else min(start + limit, len(words))
+        keys = set()
+        for index in range(start, end):
+            word, key = words[index]
+            if not word.startswith(prefix):
+                break
+            keys.add(key)
+        return keys
+
+    def _prefixed(self, prefix: str) -> Set[str]:
+        if len(prefix) <= 2:
+            return {key for _, _, key in self._short.get(prefix, ())}
+        return self._scan(prefix, self.MAX_SCAN)
+
+    def _fuzzy(self, query: str, exclude: Set[str]) -> Dict[str, float]:
+        """
+        Share of the query's trigrams found in each entry, for entries
+        reaching MIN_SIMILARITY.
+
+        An entry sharing at least `needed` of the query's n trigrams must
+        contain one of its n - needed + 1 rarest, so only those postings
+        are read; candidates are then checked exactly.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return {}
+        ordered = sorted(grams, key=lambda gram: len(self._trigrams.get(gram, ())))
+        needed = math.ceil(MIN_SIMILARITY * len(grams))
+
+        candidates: Set[str] = set()
+        for gram in ordered[:len(grams) - needed + 1]:
+            candidates.update(self._trigrams.get(gram, ()))
+            if len(candidates) > self.MAX_FUZZY_CANDIDATES:
+                break
+
+        similarities = {}
+        for key in candidates - exclude:
+            similarity = len(grams & self._entry_trigrams[key]) / len(grams)
+            if similarity >= MIN_SIMILARITY:
+                similarities[key] = similarity
+        return similarities
+
+    def search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        """
+        Find cities by name or station name.
+
+        Every query word must prefix a word of the entry; the exact name
+        ranks first, then names starting with the query, then other word
+        matches. Fuzzy matches fill the remaining slots.
+
+        Args:
+            query: Search text (case and accents are ignored)
+            limit: Maximum number of results
+
+        Returns:
+            Results, best first
+        """
+        text = normalize(query)
+        words = sorted(set(text.split()), key=len, reverse=True)
+        if not words or limit <= 0:
+            return []
+
+        # Candidates of the longest (most selective) word, checked
+        # against the other words
+        candidates = {
+            key for key in self._prefixed(words[0])
+            if all(
+                any(word.startswith(prefix) for word in self._entry_words[key])
+                for prefix in words[1:]
+            )
+        }
+
+        results = []
+        for key in candidates:
+            name = self._names[key]
+            if name == text:
+                score, match = SCORE_EXACT, "exact"
+            elif name.startswith(text):
+                score, match = SCORE_NAME_PREFIX, "prefix"
+            else:
+                score, match = SCORE_WORD_PREFIX, "prefix"
+            results.append(SearchResult(self._entries[key], score - len(name) / 1000, match))
+
+        if len(results) < limit:
+            for key, similarity in self._fuzzy(text, candidates).items():
+                results.append(SearchResult(self._entries[key], SCORE_FUZZY * similarity, "fuzzy"))
+
+        results.sort(key=lambda result: (-result.score, result.entry.city))
+        return results[:limit]
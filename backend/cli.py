@@ -0,0 +1,192 @@
+"""
+Command Line Maintenance Tasks
+Run from the backend directory, e.g. ``python cli.py migrate-cache``
+"""
+import argparse
+import asyncio
+import logging
+import math
+from datetime import datetime
+
+from backfill import DEFAULT_CHUNK_BYTES, backfill
+from cache_manager import CacheManager
+from compaction import HistoryCompactor
+from config import settings
+from export import to_utc_naive
+from logging_setup import configure_logging
+from raw_archive import RawArchive, replay
+from serialization import train_dictionary
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_cache(args: argparse.Namespace):
+    """Re-encode cached snapshots in the configured CACHE_ENCODING."""
+    cache_manager = CacheManager()
+    await cache_manager.connect()
+    try:
+        stats = await cache_manager.migrate_encoding(batch_size=args.batch_size)
+    finally:
+        await cache_manager.disconnect()
+
+    print(f"Migrated {stats['migrated']} keys ({stats['current']} already current)")
+    if stats["migrated"]:
+        print(
+            f"Size: {stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes "
+            f"({stats['bytes_after'] / stats['bytes_before']:.1%})"
+        )
+
+
+async def train_dict(args: argparse.Namespace):
+    """Train a zstd dictionary from snapshots currently in the cache."""
+    cache_manager = CacheManager()
+    await cache_manager.connect()
+    backend = cache_manager.backend
+
+    samples = []
+    try:
+        async for history_key in backend.scan_keys("airquality:history:"):
+            keys = await backend.zrangebyscore(history_key, 0, math.inf)
+            for payload in await backend.mget(keys):
+                if payload:
+                    samples.append(cache_manager.codec.decode(payload))
+            if len(samples) >= args.samples:
+                break
+    finally:
+        await cache_manager.disconnect()
+
+    if not samples:
+        print("No cached snapshots to train on")
+        return
+
+    dictionary = train_dictionary(samples[:args.samples], args.size)
+    with open(args.output, "wb") as f:
+        f.write(dictionary)
+    print(f"Wrote {len(dictionary):,} byte dictionary trained on {len(samples[:args.samples])} snapshots to {args.output}")
+    print(f"Enable with CACHE_COMPRESSION=zstd and CACHE_ZSTD_DICT_PATH={args.output}")
+
+
+async def replay_archive(args: argparse.Namespace):
+    """Re-parse archived raw WAQI payloads and re-cache the snapshots."""
+    cache_manager = CacheManager()
+    await cache_manager.connect()
+    try:
+        station_cities = {
+            city.station_id: city.city for city in await cache_manager.get_all_cities()
+        }
+        stats = await replay(
+            RawArchive(cache_manager),
+            station_cities,
+            station_ids=args.station or None,
+            start=args.start,
+            end=args.end,
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+        )
+    finally:
+        await cache_manager.disconnect()
+
+    rate = stats["replayed"] / stats["seconds"] if stats["seconds"] else 0
+    print(
+        f"Replayed {stats['replayed']} payloads ({stats['failed']} failed to parse) "
+        f"in {stats['seconds']:.2f}s, {rate:,.0f} payloads/s"
+    )
+    if not args.dry_run:
+        print(f"Cached {stats['cached']} snapshots (older ones are past CACHE_TTL_HOURS)")
+
+
+async def backfill_history(args: argparse.Namespace):
+    """Import daily history from CSV exports (WAQI dataset or per-station)."""
+    cache_manager = CacheManager()
+    await cache_manager.connect()
+    try:
+        stats = await backfill(
+            cache_manager,
+            args.paths,
+            workers=args.workers,
+            chunk_bytes=args.chunk_mb * 1024 * 1024,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await cache_manager.disconnect()
+
+    rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+    print(
+        f"Parsed {stats['rows']:,} rows ({stats['skipped_rows']:,} skipped) from "
+        f"{stats['files']} files in {stats['shards']} shards, {stats['seconds']:.1f}s, {rate:,.0f} rows/s"
+    )
+    print(f"{'Would write' if args.dry_run else 'Wrote'} {stats['records']:,} daily records")
+    if stats["unmatched"]:
+        print(f"No configured station for: {', '.join(stats['unmatched'][:20])}"
+              + (" ..." if len(stats["unmatched"]) > 20 else ""))
+
+
+async def compact_history(args: argparse.Namespace):
+    """Reconcile history indexes with stored snapshots and apply the retention."""
+    cache_manager = CacheManager()
+    await cache_manager.connect()
+    try:
+        compactor = HistoryCompactor(cache_manager, batch_size=args.batch_size)
+        stats = await compactor.run(sweep_snapshots=args.sweep_snapshots)
+    finally:
+        await cache_manager.disconnect()
+
+    print(f"Checked {stats['sets_checked']:,} history sets ({stats['sets_dropped']:,} dropped)")
+    print(
+        f"Removed {stats['entries_expired']:,} expired and {stats['entries_dangling']:,} dangling "
+        f"entries, deleted {stats['snapshots_deleted']:,} snapshots"
+    )
+    print(f"Reclaimed about {stats['bytes_reclaimed']:,} bytes")
+
+
+def _timestamp(value: str) -> datetime:
+    return to_utc_naive(datetime.fromisoformat(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Air Quality backend maintenance tasks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-cache", help=migrate_cache.__doc__)
+    migrate.add_argument("--batch-size", type=int, default=500)
+    migrate.set_defaults(handler=migrate_cache)
+
+    train = commands.add_parser("train-dict", help=train_dict.__doc__)
+    train.add_argument("--samples", type=int, default=2000, help="Snapshots to train on")
+    train.add_argument("--size", type=int, default=16 * 1024, help="Dictionary size in bytes")
+    train.add_argument("--output", default="snapshots.zdict")
+    train.set_defaults(handler=train_dict)
+
+    replay_cmd = commands.add_parser("replay", help=replay_archive.__doc__)
+    replay_cmd.add_argument("--station", action="append", help="Station id (repeatable, default all)")
+    replay_cmd.add_argument("--start", type=_timestamp, help="ISO 8601 start of the range")
+    replay_cmd.add_argument("--end", type=_timestamp, help="ISO 8601 end of the range")
+    replay_cmd.add_argument("--dry-run", action="store_true", help="Parse only, don't write to the cache")
+    replay_cmd.add_argument("--batch-size", type=int, default=500)
+    replay_cmd.set_defaults(handler=replay_archive)
+
+    backfill_cmd = commands.add_parser("backfill", help=backfill_history.__doc__)
+    backfill_cmd.add_argument("paths", nargs="+", help="CSV files (optionally .csv.gz) or directories")
+    backfill_cmd.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    backfill_cmd.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024),
+                              help="Approximate size of the byte range parsed per task")
+    backfill_cmd.add_argument("--batch-size", type=int, default=1000, help="Daily records per write batch")
+    backfill_cmd.add_argument("--dry-run", action="store_true", help="Parse only, don't write to the cache")
+    backfill_cmd.set_defaults(handler=backfill_history)
+
+    compact = commands.add_parser("compact", help=compact_history.__doc__)
+    compact.add_argument("--batch-size", type=int, default=settings.COMPACTION_BATCH_SIZE,
+                         help="History sets per pipelined round")
+    compact.add_argument("--sweep-snapshots", action="store_true",
+                         help="Also scan all snapshot keys for unindexed ones past the retention")
+    compact.set_defaults(handler=compact_history)
+
+    args = parser.parse_args()
+
+    configure_logging(settings.LOG_LEVEL, json_format=settings.LOG_FORMAT == "json")
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+History Compaction
+Reconciles the per-station history indexes with the snapshots they point
+to, so every entry in an index references a stored snapshot and nothing
+outlives the retention
+"""
+import asyncio
+import logging
+import math
+import re
+from datetime import datetime
+from typing import Dict, List
+
+from cache_manager import CacheManager
+
+logger = logging.getLogger(__name__)
+
+
+HISTORY_PREFIX = "airquality:history:"
+# airquality:{station_id}:{YYYYmmddHHMMSS}
+_SNAPSHOT_KEY = re.compile(r"^airquality:[^:]+:(\d{14})$")
+
+# Approximate cost of a sorted-set entry beyond its member string (score
+# and skiplist node), for the reclaimed-bytes estimate
+_ENTRY_OVERHEAD = 16
+
+
+class HistoryCompactor:
+    """
+    Background reconciliation of ``airquality:history:{id}`` sorted sets.
+
+    Ingestion only trims a station's index when it writes a new snapshot,
+    and snapshots expire on their own TTL, so the two drift apart: indexes
+    of stations that stopped reporting are never trimmed, and entries can
+    outlive their snapshots (e.g. after CACHE_TTL_HOURS was lowered, or
+    under Redis eviction), costing history reads a lookup of a missing
+    key. Each run walks the indexes in batches and, per batch, reads the
+    sets and checks the referenced keys in one pipelined call each, then
+    applies all removals in one write batch:
+
+    - entries past the retention are trimmed and any snapshot they still
+      reference is deleted
+    - entries whose snapshot no longer exists are removed
+    - indexes left empty disappear with their last entry
+
+    Runs are idempotent and safe alongside ingestion: only entries whose
+    snapshot was missing when checked are removed by member, and a
+    snapshot is written together with its index entry.
+    """
+
+    def __init__(self, cache_manager: CacheManager, batch_size: int = 100):
+        """
+        Args:
+            cache_manager: CacheManager whose backend and retention to use
+            batch_size: History sets reconciled per pipelined round
+        """
+        self.cache_manager = cache_manager
+        self.batch_size = batch_size
+        self.last_run: Dict[str, object] = {}
+
+    async def run(self, sweep_snapshots: bool = False) -> Dict[str, int]:
+        """
+        Reconcile every history index.
+
+        Args:
+            sweep_snapshots: Also scan all snapshot keys and delete those
+                past the retention that no index references (left behind
+                when indexes were trimmed sooner than snapshots expired)
+
+        Returns:
+            Counts of sets checked and dropped, entries expired and
+            dangling, snapshots deleted, and an estimate of bytes reclaimed
+        """
+        stats = {
+            "sets_checked": 0,
+            "sets_dropped": 0,
+            "entries_expired": 0,
+            "entries_dangling": 0,
+            "snapshots_deleted": 0,
+            "bytes_reclaimed": 0,
+        }
+        backend = self.cache_manager.backend
+        cutoff = datetime.utcnow().timestamp() - self.cache_manager.retention_seconds
+
+        pending: List[str] = []
+        async for history_key in backend.scan_keys(HISTORY_PREFIX):
+            pending.append(history_key)
+            if len(pending) >= self.batch_size:
+                await self._compact(pending, cutoff, stats)
+                pending = []
+                # Let requests run between batches
+                await asyncio.sleep(0)
+        if pending:
+            await self._compact(pending, cutoff, stats)
+
+        if sweep_snapshots:
+            await self._sweep(cutoff, stats)
+
+        self.last_run = {"finished_at": datetime.utcnow().isoformat(), **stats}
+        logger.info(
+            "History compaction: %s sets checked, %s dropped, %s expired and %s dangling "
+            "entries removed, %s snapshots deleted, ~%s bytes reclaimed",
+            stats["sets_checked"], stats["sets_dropped"], stats["entries_expired"],
+            stats["entries_dangling"], stats["snapshots_deleted"], stats["bytes_reclaimed"]
+        )
+        return stats
+
+    async def _compact(self, history_keys: List[str], cutoff: float, stats: Dict[str, int]):
+        """Reconcile one batch of history sets."""
+        backend = self.cache_manager.backend
+        ranges = await backend.zrangebyscore_many(history_keys, -math.inf, math.inf, withscores=True)
+        members = [member for entries in ranges for member, _ in entries]
+        sizes = dict(zip(members, await backend.value_sizes(members)))
+
+        batch = backend.batch()
+        doomed: List[str] = []
+        for history_key, entries in zip(history_keys, ranges):
+            stats["sets_checked"] += 1
+            expired = [member for member, score in entries if score <= cutoff]
+            dangling = [
+                member for member, score in entries
+                if score > cutoff and sizes[member] is None
+            ]
+            if expired:
+                batch.zremrangebyscore(history_key, -math.inf, cutoff)
+            if dangling:
+                batch.zrem(history_key, *dangling)
+            if entries and len(expired) + len(dangling) == len(entries):
+                stats["sets_dropped"] += 1
+
+            for member in expired + dangling:
+                stats["bytes_reclaimed"] += len(member) + _ENTRY_OVERHEAD
+            for member in expired:
+                if sizes[member] is not None:
+                    doomed.append(member)
+                    stats["bytes_reclaimed"] += len(member) + sizes[member]
+            stats["entries_expired"] += len(expired)
+            stats["entries_dangling"] += len(dangling)
+
+        if doomed:
+            batch.delete(*doomed)
+            stats["snapshots_deleted"] += len(doomed)
+        await batch.execute()
+
+    async def _sweep(self, cutoff: float, stats: Dict[str, int]):
+        """Delete unindexed snapshots recorded before the cutoff."""
+        backend = self.cache_manager.backend
+        pending: List[str] = []
+
+        async def delete(keys: List[str]):
+            sizes = await backend.value_sizes(keys)
+            deleted = await backend.delete(*keys)
+            stats["snapshots_deleted"] += deleted
+            stats["bytes_reclaimed"] += sum(
+                len(key) + size for key, size in zip(keys, sizes) if size is not None
+            )
+
+        async for key in backend.scan_keys("airquality:"):
+            match = _SNAPSHOT_KEY.match(key)
+            if not match:
+                continue
+            recorded_at = datetime.strptime(match.group(1), "%Y%m%d%H%M%S").timestamp()
+            if recorded_at <= cutoff:
+                pending.append(key)
+            if len(pending) >= self.batch_size:
+                await delete(pending)
+                pending = []
+                await asyncio.sleep(0)
+        if pending:
+            await delete(pending)
@@ -11,17 +11,102 @@ class Settings(BaseSettings):
     
     # WAQI API Configuration
     WAQI_TOKEN: str = os.getenv("WAQI_TOKEN", "")
+    WAQI_BASE_URL: str = os.getenv("WAQI_BASE_URL", "https://api.waqi.info")
+    # Refresh headline AQI with WAQI map-bounds queries, fetching full feeds
+    # only for stations that changed (false: one feed call per station)
+    BULK_INGESTION_ENABLED: bool = os.getenv("BULK_INGESTION_ENABLED", "true").lower() == "true"
+    BULK_TILE_DEGREES: float = float(os.getenv("BULK_TILE_DEGREES", "10"))
+    # Full feeds are refetched at least this often even if the AQI is unchanged
+    BULK_DETAIL_MAX_AGE_HOURS: float = float(os.getenv("BULK_DETAIL_MAX_AGE_HOURS", "6"))
+    
+    # Split ingestion across workers by consistent hashing on station ID.
+    # Workers heartbeat through the cache backend (Redis across hosts, LMDB
+    # on one host) and are dropped after missing HEARTBEAT_TTL seconds; a
+    # fetched station is leased so no other worker refetches it meanwhile
+    SHARDING_ENABLED: bool = os.getenv("SHARDING_ENABLED", "false").lower() == "true"
+    SHARD_WORKER_ID: str = os.getenv("SHARD_WORKER_ID", "")
+    SHARD_HEARTBEAT_SECONDS: float = float(os.getenv("SHARD_HEARTBEAT_SECONDS", "10"))
+    SHARD_HEARTBEAT_TTL_SECONDS: float = float(os.getenv("SHARD_HEARTBEAT_TTL_SECONDS", "30"))
+    SHARD_LEASE_SECONDS: int = int(os.getenv("SHARD_LEASE_SECONDS", "1800"))
     
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
     # Cache Configuration
+    # Retention of snapshots and their history index
     CACHE_TTL_HOURS: int = int(os.getenv("CACHE_TTL_HOURS", "48"))
+    # Background reconciliation of history indexes with stored snapshots
+    # (0 disables); history sets handled per batch
+    COMPACTION_INTERVAL_MINUTES: int = int(os.getenv("COMPACTION_INTERVAL_MINUTES", "60"))
+    COMPACTION_BATCH_SIZE: int = int(os.getenv("COMPACTION_BATCH_SIZE", "100"))
+    # auto (Redis if reachable, else memory), redis, memory or lmdb
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "auto")
+    LMDB_PATH: str = os.getenv("LMDB_PATH", "cache.lmdb")
+    LMDB_MAP_SIZE_MB: int = int(os.getenv("LMDB_MAP_SIZE_MB", "1024"))
+    # Snapshot encoding: msgpack (compact) or json; compression: none or zstd
+    CACHE_ENCODING: str = os.getenv("CACHE_ENCODING", "msgpack")
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "none")
+    CACHE_ZSTD_DICT_PATH: str = os.getenv("CACHE_ZSTD_DICT_PATH", "")
+    # Raw WAQI responses kept for debugging and replay
+    RAW_ARCHIVE_ENABLED: bool = os.getenv("RAW_ARCHIVE_ENABLED", "true").lower() == "true"
+    RAW_ARCHIVE_TTL_HOURS: int = int(os.getenv("RAW_ARCHIVE_TTL_HOURS", "168"))
     
     # Application Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # text or json (one JSON object per line)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()
+    # Records allowed per message template per window (0 disables)
+    LOG_RATE_LIMIT: int = int(os.getenv("LOG_RATE_LIMIT", "20"))
+    LOG_RATE_WINDOW_SECONDS: float = float(os.getenv("LOG_RATE_WINDOW_SECONDS", "60"))
+    # Admission control: concurrent requests per route (overrides as
+    # "path=limit,..."), requests allowed to queue per route and how long
+    # they may wait before a 503
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+    ADMISSION_ROUTE_LIMITS: str = os.getenv(
+        "ADMISSION_ROUTE_LIMITS", "/api/export=4,/api/grid=8,/api/tiles/{z}/{x}/{y}.png=16"
+    )
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "128"))
+    ADMISSION_MAX_WAIT_MS: int = int(os.getenv("ADMISSION_MAX_WAIT_MS", "500"))
+    # Per-client token bucket (0 disables); shared through Redis when used
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "40"))
+    # Identify clients by X-Forwarded-For (only behind a trusted proxy)
+    TRUST_FORWARDED_FOR: bool = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+    # Field sets (";"-separated) whose projection of each station's latest
+    # reading is stored on ingest, so /api/airquality?fields= serves them
+    # with a single read and no decoding
+    PROJECTION_PRESETS: str = os.getenv("PROJECTION_PRESETS", "city,aqi,dominant;city,aqi,dominant,timestamp")
+    # Rendered AQI grids/tiles kept in memory per worker
+    GRID_CACHE_ENTRIES: int = int(os.getenv("GRID_CACHE_ENTRIES", "1024"))
+    # Stations further than this don't influence an interpolated cell
+    GRID_RADIUS_KM: float = float(os.getenv("GRID_RADIUS_KM", "150"))
+    
+    # Drop below an alert threshold (in AQI/pollutant units) that clears the alert
+    ALERT_HYSTERESIS: float = float(os.getenv("ALERT_HYSTERESIS", "5"))
+    ALERT_MAX_SUBSCRIPTIONS: int = int(os.getenv("ALERT_MAX_SUBSCRIPTIONS", "10000"))
+    # How often workers pick up subscriptions changed through other workers
+    ALERT_SYNC_SECONDS: float = float(os.getenv("ALERT_SYNC_SECONDS", "5"))
+    # Accept webhooks on loopback/private addresses (local development only)
+    ALERT_ALLOW_PRIVATE_WEBHOOKS: bool = os.getenv("ALERT_ALLOW_PRIVATE_WEBHOOKS", "false").lower() == "true"
+    
+    # Products ranked by /api/recommendations (loaded once at startup)
+    MARKETPLACE_PATH: str = os.getenv("MARKETPLACE_PATH", "marketplace.json")
+    
+    # Profiling hooks (off by default): Server-Timing header with cache,
+    # deserialize, endpoint and serialize durations per request, and an
+    # event-loop lag monitor reporting callbacks blocking the loop
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    LOOP_LAG_THRESHOLD_MS: float = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+    
+    # Token for /api/admin endpoints (sent as X-Admin-Token); empty disables them
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
     
     # Station Discovery Configuration
+    CITIES_CONFIG_PATH: str = os.getenv("CITIES_CONFIG_PATH", "cities.json")
+    # How often to check the cities file for changes (0 disables watching)
+    CITIES_WATCH_INTERVAL_SECONDS: int = int(os.getenv("CITIES_WATCH_INTERVAL_SECONDS", "30"))
     USE_CUSTOM_CITIES: bool = os.getenv("USE_CUSTOM_CITIES", "false").lower() == "true"
     MAX_DISCOVERY_REQUESTS: int = int(os.getenv("MAX_DISCOVERY_REQUESTS", "200"))
     
@@ -0,0 +1,233 @@
+"""
+Bulk History Export
+Streams cached history for many stations as NDJSON, CSV or Parquet
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Sequence, Tuple
+
+from aqi import classify_stations
+from cache_manager import CacheManager
+from models import StationData
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+EXPORT_COLUMNS: Tuple[str, ...] = (
+    "city", "station_id", "station", "timestamp", "aqi", "category", "dominant",
+    "pm25", "pm10", "no2", "o3", "so2", "co",
+    "temperature", "humidity", "wind", "pressure",
+)
+
+Row = Tuple
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """
+    Normalize a datetime to the naive UTC form used for cache scores.
+
+    Args:
+        value: Naive (assumed UTC) or timezone-aware datetime
+
+    Returns:
+        Naive datetime in UTC
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _rows(station_id: str, batch: List[StationData]) -> List[Row]:
+    """Flatten a batch of snapshots into export rows."""
+    result = classify_stations(batch)
+    categories = result.category_names()
+
+    rows = []
+    for data, category in zip(batch, categories):
+        p, w = data.pollutants, data.weather
+        rows.append((
+            data.city, station_id, data.station, data.timestamp, data.aqi,
+            category, data.dominant,
+            p.pm25, p.pm10, p.no2, p.o3, p.so2, p.co,
+            w.temperature, w.humidity, w.wind, w.pressure,
+        ))
+    return rows
+
+
+async def iter_export_rows(
+    cache_manager: CacheManager,
+    stations: Sequence[Tuple[str, str]],
+    start: datetime,
+    end: datetime,
+    batch_size: int = 500
+) -> AsyncIterator[List[Row]]:
+    """
+    Stream export rows for several stations, one batch at a time.
+
+    Args:
+        cache_manager: CacheManager to read history from
+        stations: (city, station_id) pairs to export
+        start: Start of the range
+        end: End of the range
+        batch_size: Maximum rows per batch
+
+    Yields:
+        Lists of row tuples ordered as EXPORT_COLUMNS
+    """
+    start, end = to_utc_naive(start), to_utc_naive(end)
+
+    for city, station_id in stations:
+        async for batch in cache_manager.iter_station_history(
+            station_id, start, end, batch_size
+        ):
+            # Keep the configured city name, as the scheduler does
+            for data in batch:
+                data.city = city
+            yield _rows(station_id, batch)
+
+
+async def stream_ndjson(batches: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    """Encode row batches as newline-delimited JSON."""
+    async for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+async def stream_csv(batches: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    """Encode row batches as CSV with a header line."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only, when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that hands written bytes back in chunks.
+
+    The Parquet writer records absolute offsets in the footer, so the
+    position keeps counting while the drained chunks are released.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+def parquet_available() -> bool:
+    """Check whether the optional pyarrow dependency is installed."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+async def stream_parquet(batches: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    """
+    Encode row batches as a Parquet file, one row group per batch.
+
+    Requires the optional pyarrow dependency.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("city", pa.string()),
+        ("station_id", pa.string()),
+        ("station", pa.string()),
+        ("timestamp", pa.string()),
+        ("aqi", pa.int32()),
+        ("category", pa.string()),
+        ("dominant", pa.string()),
+        *[(name, pa.float64()) for name in EXPORT_COLUMNS[7:]],
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    try:
+        async for rows in batches:
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            )
+            # Column encoding and compression is CPU bound; keep it off the loop
+            await asyncio.to_thread(writer.write_table, table)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+
+def stream_export(
+    cache_manager: CacheManager,
+    stations: Sequence[Tuple[str, str]],
+    start: datetime,
+    end: datetime,
+    export_format: str,
+    batch_size: int = 500
+) -> AsyncIterator[bytes]:
+    """
+    Build the byte stream for an export request.
+
+    Args:
+        cache_manager: CacheManager to read history from
+        stations: (city, station_id) pairs to export
+        start: Start of the range
+        end: End of the range
+        export_format: One of EXPORT_FORMATS
+        batch_size: Maximum rows per batch
+
+    Returns:
+        Async iterator of encoded chunks
+    """
+    batches = iter_export_rows(cache_manager, stations, start, end, batch_size)
+
+    if export_format == "csv":
+        return stream_csv(batches)
+    if export_format == "parquet":
+        return stream_parquet(batches)
+    return stream_ndjson(batches)
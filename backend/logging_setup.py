@@ -0,0 +1,162 @@
+"""
+Logging Configuration
+Queue-based non-blocking handler, optional JSON records and per-message
+rate limiting
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+# uvicorn configures these with their own stderr handlers and
+# propagate=False, which would keep them off the queue
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a listener in the same process.
+
+    The stock prepare() renders the full text (traceback included) in the
+    calling thread so records can cross process boundaries; here only the
+    message arguments are merged, and formatting is left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed through extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per message template per window.
+
+    Records are keyed by logger, level and the unformatted message, so
+    lazily formatted calls (logger.info("Fetched %s", station)) from a loop
+    over hundreds of stations share one budget. The first record after a
+    window with drops carries the number suppressed.
+    """
+
+    def __init__(self, limit: int, window: float):
+        """
+        Args:
+            limit: Records allowed per template per window
+            window: Window length in seconds
+        """
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counts: Dict[Tuple[str, int, str], Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._counts.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                if suppressed:
+                    record.suppressed = suppressed
+                    record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+                start, count, suppressed = now, 0, 0
+            if count < self.limit:
+                self._counts[key] = (start, count + 1, suppressed)
+                return True
+            self._counts[key] = (start, count, suppressed + 1)
+
+            # Forget stale templates now and then
+            if len(self._counts) > 10000:
+                self._counts = {
+                    k: v for k, v in self._counts.items() if now - v[0] < self.window
+                }
+            return False
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = False,
+    rate_limit: int = 0,
+    rate_window: float = 60.0
+):
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Callers only pay for the level check, the rate-limit filter and
+    enqueueing; formatting and the stderr write happen off the event loop.
+    uvicorn's own loggers (including per-request access lines) are
+    rerouted through the same queue and rate limit.
+
+    Args:
+        level: Root log level name (e.g. "INFO")
+        json_format: Emit JSON lines instead of text
+        rate_limit: Records per message template per window (0 disables)
+        rate_window: Rate limit window in seconds
+    """
+    global _listener
+    if _listener:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _LocalQueueHandler(records)
+    if rate_limit > 0:
+        handler.addFilter(RateLimitFilter(rate_limit, rate_window))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name in _UVICORN_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for existing in server_logger.handlers[:]:
+            server_logger.removeHandler(existing)
+        server_logger.propagate = True
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background thread."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
@@ -2,26 +2,68 @@
 Air Quality Monitoring Backend Service
 FastAPI + Redis + WAQI API Integration
 """
+import asyncio
+import json
 import logging
+import secrets
+import threading
 from contextlib import asynccontextmanager
-from typing import Optional
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Query
+import numpy as np
+
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 
+from admission import AdmissionController, AdmissionMiddleware, parse_route_limits
+from alerts import AlertEngine, SubscriptionLimitError
 from scheduler import AirQualityScheduler
 from cache_manager import CacheManager
-from models import CityInfo, StationData, CityListResponse, HistoryResponse
+from models import (
+    CityInfo, StationData, CityListResponse, HistoryResponse,
+    RankingEntry, RankingsResponse, CityReloadResponse, ForecastResponse,
+    NowcastResponse, AlertSubscription, AlertSubscriptionCreated, AlertSubscriptionRequest, AlertEvent,
+    DailyHistoryResponse, DailyRecord, StationDataWithStats,
+    CitySearchResponse, CitySearchResult
+)
 from config import settings
+from aqi import classify_stations
+from aqi_grid import (
+    MAX_ZOOM, StationPoints, TileCache, colorize, encode_png, render_grid, render_tile
+)
+from recommendations import RecommendationIndex
+from city_search import CityEntry, CitySearchIndex
+from projection import FieldSet, encode_json, parse_fields, project
+from logging_setup import configure_logging
+from profiling import LoopMonitor, ServerTimingMiddleware, TimedRoute, sample_thread, top_functions
+from export import EXPORT_FORMATS, parquet_available, stream_export, to_utc_naive
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+configure_logging(
+    settings.LOG_LEVEL,
+    json_format=settings.LOG_FORMAT == "json",
+    rate_limit=settings.LOG_RATE_LIMIT,
+    rate_window=settings.LOG_RATE_WINDOW_SECONDS,
 )
 logger = logging.getLogger(__name__)
 
 
+def _field_set(fields: Optional[str]) -> Optional[FieldSet]:
+    """Parse a fields= parameter (None selects everything)."""
+    if fields is None:
+        return None
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Rendered grids and tiles, keyed by the scheduler's refresh version
+grid_cache = TileCache(settings.GRID_CACHE_ENTRIES)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -34,6 +76,38 @@ async def lifespan(app: FastAPI):
     cache_manager = CacheManager()
     await cache_manager.connect()
     app.state.cache_manager = cache_manager
+    admission.bind(cache_manager.backend)
+    
+    # Alert subscriptions are evaluated against every new reading
+    alert_engine = AlertEngine(
+        cache_manager,
+        hysteresis=settings.ALERT_HYSTERESIS,
+        max_subscriptions=settings.ALERT_MAX_SUBSCRIPTIONS,
+        allow_private_webhooks=settings.ALERT_ALLOW_PRIVATE_WEBHOOKS,
+        sync_seconds=settings.ALERT_SYNC_SECONDS,
+    )
+    await alert_engine.load()
+    cache_manager.observers.append(alert_engine.observe)
+    alert_engine.start()
+    app.state.alert_engine = alert_engine
+    
+    # City autocomplete, seeded from stored mappings and kept in sync with
+    # discovery and reloads
+    city_index = CitySearchIndex(
+        CityEntry(city.city, city.station_id, city.station_name)
+        for city in await cache_manager.get_all_cities()
+    )
+    cache_manager.mapping_listeners.append(city_index.on_mapping)
+    app.state.city_index = city_index
+    
+    # Marketplace products indexed by AQI bucket and dominant pollutant
+    app.state.recommendations = RecommendationIndex.load(settings.MARKETPLACE_PATH)
+    
+    loop_monitor = None
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor = LoopMonitor(threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000)
+        loop_monitor.start()
+    app.state.loop_monitor = loop_monitor
     
     # Initialize and start scheduler
     scheduler = AirQualityScheduler(cache_manager)
@@ -48,6 +122,11 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down service...")
     scheduler.stop()
+    if scheduler.shards:
+        await scheduler.shards.leave()
+    await alert_engine.stop()
+    if loop_monitor:
+        await loop_monitor.stop()
     await cache_manager.disconnect()
     logger.info("Service stopped.")
 
@@ -60,6 +139,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-request timing breakdowns (must be set before routes are declared)
+if settings.SERVER_TIMING_ENABLED:
+    app.router.route_class = TimedRoute
+
+# Admission control: per-route concurrency caps, bounded wait queues and
+# per-client rate limits (CORS is added after it so rejections carry CORS headers)
+admission = AdmissionController(
+    default_limit=settings.ADMISSION_MAX_CONCURRENCY,
+    route_limits=parse_route_limits(settings.ADMISSION_ROUTE_LIMITS),
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    max_wait=settings.ADMISSION_MAX_WAIT_MS / 1000,
+    rate=settings.RATE_LIMIT_PER_SECOND,
+    burst=settings.RATE_LIMIT_BURST,
+    trust_forwarded_for=settings.TRUST_FORWARDED_FOR,
+)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -69,6 +166,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the total covers admission control and CORS as well
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
 
 @app.get("/", tags=["Health"])
 async def root():
@@ -101,23 +202,76 @@ async def get_cities():
         return CityListResponse(cities=cities, count=len(cities))
     
     except Exception as e:
-        logger.error(f"Error fetching cities: {e}")
+        logger.error("Error fetching cities: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/airquality", response_model=StationData, tags=["Air Quality"])
+@app.get("/api/cities/search", response_model=CitySearchResponse, tags=["Cities"])
+async def search_cities(
+    q: str = Query(..., min_length=1, max_length=100, description="City or station name, or a prefix of it"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results")
+):
+    """
+    Search monitored cities for autocomplete.
+    
+    Matches word prefixes of city and station names (case and accents
+    ignored), falling back to trigram similarity for typos.
+    
+    Args:
+        q: Search text
+        limit: Maximum number of results
+        
+    Returns:
+        Matching cities, best first
+    """
+    city_index: CitySearchIndex = app.state.city_index
+    results = [
+        CitySearchResult(
+            city=result.entry.city,
+            station_id=result.entry.station_id,
+            station_name=result.entry.station_name,
+            score=round(result.score, 3),
+            match=result.match
+        )
+        for result in city_index.search(q, limit)
+    ]
+    return CitySearchResponse(query=q, count=len(results), results=results)
+
+
+@app.get(
+    "/api/airquality",
+    response_model=StationData,
+    responses={200: {"model": StationDataWithStats}},
+    tags=["Air Quality"]
+)
 async def get_air_quality(
-    city: str = Query(..., description="City name (case-insensitive)")
+    city: str = Query(..., description="City name (case-insensitive)"),
+    include: Optional[str] = Query(None, description="Comma-separated extras: stats"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. city,aqi,dominant or pollutants.pm25"
+    )
 ):
     """
     Get latest air quality data for a specific city.
     
     Args:
         city: Name of the city
+        include: "stats" adds rolling 1h/24h/7d aggregates of the AQI and
+            each pollutant, maintained on ingest
+        fields: Only return these fields (sub-fields with a dot); preset
+            field sets are served pre-serialized
         
     Returns:
         Latest air quality data including AQI, pollutants, weather, and forecast
     """
+    extras = {part.strip() for part in include.split(",") if part.strip()} if include else set()
+    if extras - {"stats"}:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include value(s): {', '.join(sorted(extras - {'stats'}))}"
+        )
+    field_set = _field_set(fields)
+    
     try:
         cache_manager: CacheManager = app.state.cache_manager
         scheduler: AirQualityScheduler = app.state.scheduler
@@ -131,12 +285,21 @@ async def get_air_quality(
                 detail=f"City '{city}' not found or not configured"
             )
         
+        if field_set is None or any(path.split(".")[0] in ("pollutants", "forecast") for path in field_set):
+            # Someone wants the pollutant breakdown: keep the full feed fresh
+            scheduler.request_detail(station_id)
+        
+        if field_set and not extras:
+            payload = await cache_manager.get_latest_projected(station_id, field_set)
+            if payload is not None:
+                return Response(content=payload, media_type="application/json")
+        
         # Try to get cached data
         data = await cache_manager.get_latest_station_data(station_id)
         
         # If no cache, trigger immediate fetch (lazy load)
         if not data:
-            logger.info(f"Cache miss for {city}, fetching immediately...")
+            logger.info("Cache miss for %s, fetching immediately...", city)
             data = await scheduler.fetch_station_data(station_id, city)
             
             if not data:
@@ -145,12 +308,18 @@ async def get_air_quality(
                     detail=f"Unable to fetch data for {city}. Please try again later."
                 )
         
+        if field_set or extras:
+            body = project(data, field_set)
+            if "stats" in extras:
+                body["stats"] = await cache_manager.get_rolling_stats(station_id)
+            return Response(content=encode_json(body), media_type="application/json")
+        
         return data
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching air quality for {city}: {e}")
+        logger.error("Error fetching air quality for %s: %s", city, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -181,25 +350,40 @@ async def get_station_data(station_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching station data for {station_id}: {e}")
+        logger.error("Error fetching station data for %s: %s", station_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/history", response_model=HistoryResponse, tags=["Air Quality"])
 async def get_history(
     city: str = Query(..., description="City name"),
-    hours: int = Query(24, ge=1, le=48, description="Number of hours of history (1-48)")
+    hours: int = Query(
+        24, ge=1, le=settings.CACHE_TTL_HOURS,
+        description=f"Number of hours of history (1-{settings.CACHE_TTL_HOURS})"
+    ),
+    include_forecast: bool = Query(False, description="Include each entry's forecast (see /api/forecast)"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields of each entry, e.g. timestamp,aqi"
+    )
 ):
     """
     Get historical air quality data for a city.
     
     Args:
         city: Name of the city
-        hours: Number of hours of historical data to retrieve (default: 24, max: 48)
+        hours: Number of hours of historical data to retrieve (default: 24,
+            max: CACHE_TTL_HOURS)
+        include_forecast: Attach forecasts to history entries (default: false)
+        fields: Only return these fields of each entry (selecting forecast
+            implies include_forecast)
         
     Returns:
         Historical air quality data points
     """
+    field_set = _field_set(fields)
+    if field_set and any(path.split(".")[0] == "forecast" for path in field_set):
+        include_forecast = True
+    
     try:
         cache_manager: CacheManager = app.state.cache_manager
         
@@ -213,23 +397,702 @@ async def get_history(
             )
         
         # Get historical data
-        history = await cache_manager.get_station_history(station_id, hours)
+        history = await cache_manager.get_station_history(station_id, hours, include_forecast)
+        categories = classify_stations(history).category_names()
+        
+        if field_set:
+            # Bypasses response model validation along with the unused fields
+            body = {
+                "city": city,
+                "station_id": station_id,
+                "hours": hours,
+                "data_points": len(history),
+                "history": [project(entry, field_set) for entry in history],
+                "categories": categories,
+            }
+            return Response(content=encode_json(body), media_type="application/json")
         
         return HistoryResponse(
             city=city,
             station_id=station_id,
             hours=hours,
             data_points=len(history),
-            history=history
+            history=history,
+            categories=categories
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching history for %s: %s", city, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/history/daily", response_model=DailyHistoryResponse, tags=["Air Quality"])
+async def get_daily_history(
+    city: str = Query(..., description="City name"),
+    start: Optional[date] = Query(None, description="First day (default: 365 days before end)"),
+    end: Optional[date] = Query(None, description="Last day (default: today)")
+):
+    """
+    Get long-range daily history for a city.
+    
+    Daily records are imported with ``python cli.py backfill``; values are
+    on the AQI sub-index scale.
+    
+    Args:
+        city: Name of the city
+        start: First day (inclusive)
+        end: Last day (inclusive)
+        
+    Returns:
+        Daily min/max/median per pollutant, oldest first
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        
+        station_id = await cache_manager.get_station_for_city(city)
+        
+        if not station_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"City '{city}' not found or not configured"
+            )
+        
+        records = await cache_manager.get_daily_history(
+            station_id,
+            datetime.combine(start, datetime.min.time()),
+            datetime.combine(end, datetime.min.time())
+        )
+        days = [
+            DailyRecord(
+                date=day,
+                aqi=max(
+                    (int(values["median"]) for values in pollutants.values() if values.get("median") is not None),
+                    default=None
+                ),
+                pollutants=pollutants
+            )
+            for day, pollutants in records
+        ]
+        
+        return DailyHistoryResponse(
+            city=city,
+            station_id=station_id,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            count=len(days),
+            days=days
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching daily history for %s: %s", city, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/forecast", response_model=ForecastResponse, tags=["Air Quality"])
+async def get_forecast(
+    city: str = Query(..., description="City name"),
+    issued: Optional[date] = Query(None, description="Issue date, YYYY-MM-DD (default: latest)")
+):
+    """
+    Get the daily pollutant forecast for a city.
+    
+    Forecasts are stored once per station and issue date rather than in
+    every history entry.
+    
+    Args:
+        city: Name of the city
+        issued: Day the forecast was issued (default: the latest forecast)
+        
+    Returns:
+        Forecast days by pollutant
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        
+        station_id = await cache_manager.get_station_for_city(city)
+        
+        if not station_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"City '{city}' not found or not configured"
+            )
+        
+        if issued is None:
+            latest = await cache_manager.get_latest_station_data(station_id)
+            forecast = latest.forecast if latest else None
+            issue_date = latest.forecast_issued if latest else None
+        else:
+            issue_date = issued.isoformat()
+            forecast = await cache_manager.get_forecast(station_id, issue_date)
+        
+        if not forecast:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No forecast available for {city}"
+            )
+        
+        return ForecastResponse(
+            city=city,
+            station_id=station_id,
+            issued=issue_date,
+            forecast=forecast
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching forecast for %s: %s", city, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/nowcast", response_model=NowcastResponse, tags=["Air Quality"])
+async def get_nowcast(city: str = Query(..., description="City name")):
+    """
+    Get the EPA NowCast and a short-term AQI projection for a city.
+    
+    NowCasts are recomputed from the cached hourly history after every
+    refresh cycle.
+    
+    Args:
+        city: Name of the city
+        
+    Returns:
+        NowCast AQI, per-pollutant NowCast values and projected AQI
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        scheduler: AirQualityScheduler = app.state.scheduler
+        
+        station_id = await cache_manager.get_station_for_city(city)
+        
+        if not station_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"City '{city}' not found or not configured"
+            )
+        
+        result = await scheduler.nowcast.get(station_id)
+        
+        if not result:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No NowCast available for {city} yet (needs 2 of the last 3 hours)"
+            )
+        
+        return NowcastResponse(city=city, station_id=station_id, **result)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching NowCast for %s: %s", city, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/recommendations", tags=["Marketplace"])
+async def get_recommendations(city: str = Query(..., description="City name")):
+    """
+    Get marketplace products ranked for a city's current air quality.
+    
+    Products are ranked from the index built over marketplace.json at
+    startup, keyed by AQI bucket and dominant pollutant; only the city
+    header is serialized per request.
+    
+    Args:
+        city: Name of the city
+        
+    Returns:
+        City, AQI, category, dominant pollutant and ranked products with
+        a recommendation level (high, medium, low) and badge
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        scheduler: AirQualityScheduler = app.state.scheduler
+        index: RecommendationIndex = app.state.recommendations
+        
+        station_id = await cache_manager.get_station_for_city(city)
+        
+        if not station_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"City '{city}' not found or not configured"
+            )
+        
+        data = await cache_manager.get_latest_station_data(station_id)
+        if not data:
+            data = await scheduler.fetch_station_data(station_id, city)
+            
+            if not data:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Unable to fetch data for {city}. Please try again later."
+                )
+        
+        result = classify_stations([data])
+        aqi = float(result.aqi[0])
+        category = result.category_names()[0]
+        dominant = result.dominant_names()[0]
+        
+        header = json.dumps({
+            "city": city,
+            "station_id": station_id,
+            "aqi": None if np.isnan(aqi) else int(aqi),
+            "category": category,
+            "dominant": dominant,
+        }, ensure_ascii=False)
+        body = (
+            header[:-1].encode()
+            + b',"recommendations":'
+            + index.lookup(aqi, dominant)
+            + b"}"
+        )
+        return Response(content=body, media_type="application/json")
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching recommendations for %s: %s", city, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/export", tags=["Air Quality"])
+async def export_history(
+    cities: Optional[str] = Query(None, description="Comma-separated city names (default: all cities)"),
+    start: Optional[datetime] = Query(None, description="Start of the range, ISO 8601 (default: 24 hours ago)"),
+    end: Optional[datetime] = Query(None, description="End of the range, ISO 8601 (default: now)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$", description="Output format: ndjson, csv or parquet")
+):
+    """
+    Stream historical air quality data for many cities.
+    
+    Rows are read from the cache and encoded in batches, so memory use
+    stays bounded regardless of the export size.
+    
+    Args:
+        cities: Comma-separated city names
+        start: Start of the time range
+        end: End of the time range
+        format: Output format
+        
+    Returns:
+        Streamed NDJSON, CSV or Parquet file
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        
+        end = to_utc_naive(end) if end else datetime.utcnow()
+        start = to_utc_naive(start) if start else end - timedelta(hours=24)
+        if start > end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        
+        if format == "parquet" and not parquet_available():
+            raise HTTPException(
+                status_code=501,
+                detail="Parquet export requires the optional 'pyarrow' package"
+            )
+        
+        # Resolve stations up front so unknown cities fail before streaming
+        if cities:
+            stations = []
+            for city in (name.strip() for name in cities.split(",")):
+                if not city:
+                    continue
+                station_id = await cache_manager.get_station_for_city(city)
+                if not station_id:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"City '{city}' not found or not configured"
+                    )
+                stations.append((city, station_id))
+        else:
+            stations = [
+                (info.city, info.station_id)
+                for info in await cache_manager.get_all_cities()
+                if info.station_id
+            ]
+        
+        media_type, extension = EXPORT_FORMATS[format]
+        return StreamingResponse(
+            stream_export(cache_manager, stations, start, end, format),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="airquality-export.{extension}"'
+            }
         )
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching history for {city}: {e}")
+        logger.error("Error starting export: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/rankings", response_model=RankingsResponse, tags=["Air Quality"])
+async def get_rankings(
+    order: str = Query("worst", pattern="^(worst|best)$", description="Sort order: worst or best air first"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of cities to return")
+):
+    """
+    Rank monitored cities by their latest AQI.
+    
+    Args:
+        order: "worst" (highest AQI first) or "best" (lowest AQI first)
+        limit: Maximum number of cities to return
+        
+    Returns:
+        Ranked cities with AQI category and dominant pollutant
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        
+        cities = [city for city in await cache_manager.get_all_cities() if city.station_id]
+        latest = await cache_manager.get_latest_many([city.station_id for city in cities])
+        
+        cities = [city for city, data in zip(cities, latest) if data]
+        readings = [data for data in latest if data]
+        
+        result = classify_stations(readings)
+        categories = result.category_names()
+        dominants = result.dominant_names()
+        
+        # NaN AQIs (no usable reading) always sort last
+        values = result.aqi
+        keys = -values if order == "worst" else values
+        ranked = [i for i in keys.argsort(kind="stable") if not np.isnan(values[i])][:limit]
+        
+        rankings = [
+            RankingEntry(
+                rank=position + 1,
+                city=cities[i].city,
+                station_id=cities[i].station_id,
+                aqi=int(values[i]),
+                category=categories[i],
+                dominant=dominants[i]
+            )
+            for position, i in enumerate(ranked)
+        ]
+        
+        return RankingsResponse(order=order, count=len(rankings), rankings=rankings)
+    
+    except Exception as e:
+        logger.error("Error computing rankings: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def station_points() -> StationPoints:
+    """Coordinates and latest AQI of every configured station."""
+    scheduler: AirQualityScheduler = app.state.scheduler
+    key = ("points", scheduler.refresh_version)
+    
+    points = grid_cache.get(key)
+    if points is None:
+        cache_manager: CacheManager = app.state.cache_manager
+        # Stations are located at their city's configured coordinates
+        cities = [
+            city for city in scheduler.cities
+            if city.station_id and (city.lat or city.lon)
+        ]
+        latest = await cache_manager.get_latest_many([city.station_id for city in cities])
+        located = [(city, data) for city, data in zip(cities, latest) if data]
+        
+        points = StationPoints.from_lists(
+            [city.lat for city, _ in located],
+            [city.lon for city, _ in located],
+            classify_stations([data for _, data in located]).aqi
+        )
+        grid_cache.put(key, points)
+    return points
+
+
+@app.get("/api/grid", tags=["Maps"])
+async def get_aqi_grid(
+    bbox: str = Query(..., description="Bounding box: west,south,east,north in degrees"),
+    width: int = Query(64, ge=1, le=512, description="Grid columns"),
+    height: int = Query(64, ge=1, le=512, description="Grid rows"),
+    format: str = Query("json", pattern="^(json|png)$", description="Output format: json or png")
+):
+    """
+    Get an interpolated AQI surface for a bounding box.
+    
+    AQI is interpolated between stations with inverse distance weighting;
+    cells with no station within range are empty (null / transparent).
+    
+    Args:
+        bbox: west,south,east,north
+        width: Number of columns
+        height: Number of rows
+        format: "json" (row-major values, north row first) or "png"
+        
+    Returns:
+        Gridded AQI values or a PNG image in EPA category colors
+    """
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90):
+        raise HTTPException(status_code=400, detail="bbox is out of range or inverted")
+    
+    try:
+        scheduler: AirQualityScheduler = app.state.scheduler
+        key = ("grid", scheduler.refresh_version, west, south, east, north, width, height, format)
+        
+        body = grid_cache.get(key)
+        if body is None:
+            points = await station_points()
+            values = await asyncio.to_thread(
+                render_grid, points, west, south, east, north, width, height,
+                settings.GRID_RADIUS_KM
+            )
+            
+            if format == "png":
+                body = encode_png(colorize(values))
+            else:
+                body = json.dumps({
+                    "bbox": [west, south, east, north],
+                    "width": width,
+                    "height": height,
+                    "version": scheduler.refresh_version,
+                    "values": [None if np.isnan(v) else int(round(v)) for v in values.ravel().tolist()],
+                }, separators=(",", ":")).encode()
+            grid_cache.put(key, body)
+        
+        return Response(
+            content=body,
+            media_type="image/png" if format == "png" else "application/json"
+        )
+    
+    except Exception as e:
+        logger.error("Error computing AQI grid: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/tiles/{z}/{x}/{y}.png", tags=["Maps"])
+async def get_aqi_tile(z: int, x: int, y: int):
+    """
+    Get a 256x256 Web Mercator map tile of the interpolated AQI surface.
+    
+    Args:
+        z: Zoom level
+        x: Tile column
+        y: Tile row
+        
+    Returns:
+        PNG tile in EPA category colors, transparent where there is no data
+    """
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    
+    try:
+        scheduler: AirQualityScheduler = app.state.scheduler
+        key = ("tile", scheduler.refresh_version, z, x, y)
+        
+        tile = grid_cache.get(key)
+        if tile is None:
+            points = await station_points()
+            tile = await asyncio.to_thread(
+                render_tile, points, z, x, y, radius_km=settings.GRID_RADIUS_KM
+            )
+            grid_cache.put(key, tile)
+        
+        return Response(
+            content=tile,
+            media_type="image/png",
+            headers={"Cache-Control": "public, max-age=300"}
+        )
+    
+    except Exception as e:
+        logger.error("Error rendering tile %s/%s/%s: %s", z, x, y, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/alerts/subscriptions", response_model=AlertSubscriptionCreated, status_code=201, tags=["Alerts"])
+async def create_alert_subscription(request: AlertSubscriptionRequest):
+    """
+    Subscribe to threshold crossings for a city.
+    
+    An event is emitted when the metric rises to or above the threshold,
+    and again when it falls back below threshold - ALERT_HYSTERESIS.
+    Events are POSTed as JSON to webhook_url if given, which must be a
+    public http(s) URL.
+    
+    Returns:
+        The created subscription and its owner token, needed to delete it
+    """
+    try:
+        cache_manager: CacheManager = app.state.cache_manager
+        alert_engine: AlertEngine = app.state.alert_engine
+        
+        station_id = await cache_manager.get_station_for_city(request.city)
+        
+        if not station_id:
+            raise HTTPException(
+                status_code=404,
+                detail=f"City '{request.city}' not found or not configured"
+            )
+        
+        return await alert_engine.subscribe(
+            request.city, station_id, request.metric, request.threshold, request.webhook_url
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SubscriptionLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error("Error creating alert subscription: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/alerts/subscriptions", response_model=List[AlertSubscription], tags=["Alerts"])
+async def list_alert_subscriptions(
+    city: Optional[str] = Query(None, description="Only subscriptions for this city"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """List alert subscriptions (admin only: they include webhook URLs)."""
+    require_admin(x_admin_token)
+    alert_engine: AlertEngine = app.state.alert_engine
+    return [
+        subscription for subscription in alert_engine.subscriptions.values()
+        if city is None or subscription.city.lower() == city.lower()
+    ]
+
+
+@app.delete("/api/alerts/subscriptions/{subscription_id}", status_code=204, tags=["Alerts"])
+async def delete_alert_subscription(
+    subscription_id: str,
+    x_subscription_token: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Remove an alert subscription.
+    
+    Requires the subscription's owner token (X-Subscription-Token), or the
+    admin token.
+    """
+    alert_engine: AlertEngine = app.state.alert_engine
+    
+    if not alert_engine.owns(subscription_id, x_subscription_token):
+        require_admin(x_admin_token)
+    
+    if not await alert_engine.unsubscribe(subscription_id):
+        raise HTTPException(status_code=404, detail=f"Subscription '{subscription_id}' not found")
+
+
+@app.get("/api/alerts/events", response_model=List[AlertEvent], tags=["Alerts"])
+async def get_alert_events(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of events to return")
+):
+    """Most recent alert events, newest first."""
+    alert_engine: AlertEngine = app.state.alert_engine
+    return list(reversed(alert_engine.recent))[:limit]
+
+
+def require_admin(token: Optional[str]):
+    """Reject admin calls without the configured ADMIN_TOKEN."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_TOKEN not set)")
+    # Constant-time comparison so response timing doesn't reveal the token
+    if not token or not secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/api/admin/reload-cities", response_model=CityReloadResponse, tags=["Admin"])
+async def reload_cities(x_admin_token: Optional[str] = Header(None)):
+    """
+    Re-read the cities configuration without a restart.
+    
+    Only added and moved cities are discovered and fetched; removed cities
+    are evicted from the cache.
+    
+    Returns:
+        Names of added, removed and moved cities
+    """
+    require_admin(x_admin_token)
+    
+    try:
+        scheduler: AirQualityScheduler = app.state.scheduler
+        summary = await scheduler.reload_cities()
+        
+        return CityReloadResponse(
+            added=summary["added"],
+            removed=summary["removed"],
+            moved=summary["moved"],
+            unchanged=len(summary["unchanged"])
+        )
+    
+    except Exception as e:
+        logger.error("Error reloading cities: %s", e)
+        raise HTTPException(status_code=400, detail=f"Could not reload cities: {e}")
+
+
+# One sampling profile at a time per worker
+profile_lock = asyncio.Lock()
+
+
+@app.post("/api/admin/profile", tags=["Admin"])
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=60, description="Sampling duration"),
+    interval_ms: float = Query(5.0, ge=1, le=100, description="Milliseconds between samples"),
+    format: str = Query("json", pattern="^(json|folded)$", description="json (top functions) or folded stacks"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Capture a sampling profile of this worker's event loop thread.
+    
+    Stacks are sampled from a separate thread while the worker keeps
+    serving, so the profile shows what the loop spends its time on under
+    the current traffic. `folded` output feeds flamegraph.pl / speedscope.
+    
+    Returns:
+        Top functions by sample count (json) or folded stacks (text)
+    """
+    require_admin(x_admin_token)
+    
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with profile_lock:
+        samples = await asyncio.to_thread(
+            sample_thread, threading.get_ident(), seconds, interval_ms / 1000
+        )
+    
+    if format == "folded":
+        body = "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+        return Response(content=body, media_type="text/plain")
+    
+    return {
+        "seconds": seconds,
+        "samples": sum(samples.values()),
+        "functions": top_functions(samples),
+    }
+
+
+@app.get("/api/admin/loop-lag", tags=["Admin"])
+async def get_loop_lag(x_admin_token: Optional[str] = Header(None)):
+    """
+    Event-loop lag percentiles and the stacks of recent slow callbacks.
+    
+    Requires LOOP_MONITOR_ENABLED.
+    """
+    require_admin(x_admin_token)
+    
+    loop_monitor: Optional[LoopMonitor] = app.state.loop_monitor
+    if loop_monitor is None:
+        raise HTTPException(status_code=404, detail="Loop monitor is disabled (LOOP_MONITOR_ENABLED)")
+    return loop_monitor.stats()
+
+
 @app.get("/api/stats", tags=["Monitoring"])
 async def get_stats():
     """
@@ -248,32 +1111,57 @@ async def get_stats():
             "total_stations": len(set(city.station_id for city in cities if city.station_id)),
             "last_update": scheduler.last_update_time.isoformat() if scheduler.last_update_time else None,
             "next_update": scheduler.next_update_time.isoformat() if scheduler.next_update_time else None,
-            "cache_type": "redis" if settings.REDIS_URL else "in-memory"
+            "cache_type": cache_manager.backend.name,
+            "admission": admission.stats()
         }
+        if scheduler.shards:
+            stats["sharding"] = {**scheduler.shards.stats(), "owned_stations": len(scheduler._owned)}
+        if scheduler.compactor.last_run:
+            stats["compaction"] = scheduler.compactor.last_run
         
         return stats
     
     except Exception as e:
-        logger.error(f"Error fetching stats: {e}")
+        logger.error("Error fetching stats: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/debug/raw/{station_id}", tags=["Debug"])
-async def get_raw_station_data(station_id: str):
+async def get_raw_station_data(
+    station_id: str,
+    live: bool = Query(False, description="Fetch from WAQI instead of the raw archive")
+):
     """
     Get raw WAQI API response for debugging purposes.
     
+    Serves the most recently archived response so debugging doesn't spend
+    API quota; pass live=true to fetch a fresh one.
+    
     Args:
         station_id: WAQI station identifier
+        live: Bypass the archive
         
     Returns:
         Raw API response from WAQI
     """
     try:
-        from waqi_client import get_waqi_client
+        scheduler: AirQualityScheduler = app.state.scheduler
         
-        client = get_waqi_client()
-        raw_data = await client.get_station_data(station_id)
+        if scheduler.raw_archive and not live:
+            archived = await scheduler.raw_archive.latest(station_id)
+            if not archived:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No archived data for station {station_id}. Pass live=true to fetch from WAQI."
+                )
+            raw_data = archived.payload
+            source = {"source": "archive", "fetched_at": archived.fetched_at, "sha256": archived.digest}
+        else:
+            from waqi_client import get_waqi_client
+            
+            client = get_waqi_client()
+            raw_data = await client.get_station_data(station_id)
+            source = {"source": "live", "fetched_at": datetime.utcnow()}
         
         if not raw_data:
             raise HTTPException(
@@ -283,6 +1171,7 @@ async def get_raw_station_data(station_id: str):
         
         return {
             "station_id": station_id,
+            **source,
             "raw_response": raw_data,
             "forecast_keys": list(raw_data.get("forecast", {}).keys()) if "forecast" in raw_data else []
         }
@@ -290,7 +1179,7 @@ async def get_raw_station_data(station_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching raw station data: {e}")
+        logger.error("Error fetching raw station data: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -53,6 +53,28 @@ class StationData(BaseModel):
         default_factory=dict,
         description="Forecast data by pollutant type"
     )
+    forecast_issued: Optional[str] = Field(
+        None,
+        description="Issue date (YYYY-MM-DD) of the forecast in the per station-day forecast store"
+    )
+
+
+class WindowStats(BaseModel):
+    """Rolling aggregates of one metric over one window."""
+    count: int
+    mean: float
+    min: float
+    max: float
+    variance: Optional[float] = Field(None, description="Sample variance (None for a single reading)")
+    slope_per_hour: Optional[float] = Field(None, description="Least-squares trend in units per hour")
+
+
+class StationDataWithStats(StationData):
+    """Station data with rolling statistics (include=stats)."""
+    stats: Dict[str, Dict[str, WindowStats]] = Field(
+        default_factory=dict,
+        description="Metric (aqi or pollutant) -> window (1h, 24h, 7d) -> aggregates"
+    )
 
 
 class CityInfo(BaseModel):
@@ -68,10 +90,153 @@ class CityListResponse(BaseModel):
     count: int
 
 
+class CitySearchResult(BaseModel):
+    """A city matching a search query."""
+    city: str
+    station_id: Optional[str] = None
+    station_name: Optional[str] = None
+    score: float = Field(..., description="Relevance, higher first")
+    match: str = Field(..., description="exact, prefix or fuzzy")
+
+
+class CitySearchResponse(BaseModel):
+    """Response for city search endpoint."""
+    query: str
+    count: int
+    results: List[CitySearchResult]
+
+
 class HistoryResponse(BaseModel):
     """Response for history endpoint."""
     city: str
     station_id: str
     hours: int
     data_points: int
-    history: List[StationData]
\ No newline at end of file
+    history: List[StationData]
+    categories: List[str] = Field(
+        default_factory=list,
+        description="US EPA AQI category of each history entry"
+    )
+
+
+class RankingEntry(BaseModel):
+    """A city's position in the AQI ranking."""
+    rank: int
+    city: str
+    station_id: str
+    aqi: int
+    category: str
+    dominant: str
+
+
+class RankingsResponse(BaseModel):
+    """Response for rankings endpoint."""
+    order: str
+    count: int
+    rankings: List[RankingEntry]
+
+
+class CityReloadResponse(BaseModel):
+    """Response for the cities configuration reload endpoint."""
+    added: List[str]
+    removed: List[str]
+    moved: List[str]
+    unchanged: int
+
+
+class ForecastResponse(BaseModel):
+    """Response for forecast endpoint."""
+    city: str
+    station_id: str
+    issued: Optional[str] = Field(None, description="Issue date (YYYY-MM-DD) of the forecast")
+    forecast: Dict[str, List[ForecastDay]]
+
+
+class NowcastPollutant(BaseModel):
+    """NowCast of a single pollutant."""
+    concentration: float = Field(..., description="NowCast concentration (ug/m3 for PM, ppb for O3)")
+    aqi: int = Field(..., description="AQI sub-index of the NowCast concentration")
+
+
+class NowcastProjection(BaseModel):
+    """Projected AQI a few hours ahead."""
+    hours_ahead: int
+    aqi: int
+    category: str
+
+
+class NowcastResponse(BaseModel):
+    """Response for nowcast endpoint."""
+    city: str
+    station_id: str
+    computed_at: str
+    aqi: int
+    category: str
+    pollutants: Dict[str, NowcastPollutant]
+    projection: List[NowcastProjection]
+
+
+class AlertSubscriptionRequest(BaseModel):
+    """Request body for creating an alert subscription."""
+    city: str
+    metric: str = Field("aqi", description="\"aqi\" or a pollutant (pm25, pm10, no2, o3, so2, co)")
+    threshold: float = Field(..., ge=0, description="Alert when the metric rises to or above this value")
+    webhook_url: Optional[str] = Field(None, description="URL alert events are POSTed to")
+
+
+class AlertSubscription(BaseModel):
+    """A registered alert subscription."""
+    id: str
+    city: str
+    station_id: str
+    metric: str
+    threshold: float
+    webhook_url: Optional[str] = None
+
+
+class AlertSubscriptionRecord(AlertSubscription):
+    """A subscription as stored, with the hash of its owner token."""
+    token_hash: str = ""
+
+
+class AlertSubscriptionCreated(AlertSubscription):
+    """A new subscription and the token that deletes it (shown only once)."""
+    token: str = Field(..., description="Pass as X-Subscription-Token to delete the subscription")
+
+
+class AlertEvent(BaseModel):
+    """A threshold crossing."""
+    subscription_id: str
+    city: str
+    station_id: str
+    metric: str
+    threshold: float
+    value: float
+    state: str = Field(..., description="\"triggered\" or \"cleared\"")
+    observed_at: str = Field(..., description="Timestamp of the reading")
+    emitted_at: str
+
+
+class DailyPollutant(BaseModel):
+    """Daily aggregate of one pollutant (AQI sub-index scale)."""
+    min: Optional[float] = None
+    max: Optional[float] = None
+    median: Optional[float] = None
+    count: int = Field(1, description="Readings aggregated")
+
+
+class DailyRecord(BaseModel):
+    """Daily history of one station."""
+    date: str = Field(..., description="Date in YYYY-MM-DD format")
+    aqi: Optional[int] = Field(None, description="Highest median sub-index of the day")
+    pollutants: Dict[str, DailyPollutant]
+
+
+class DailyHistoryResponse(BaseModel):
+    """Response for the daily history endpoint."""
+    city: str
+    station_id: str
+    start: str
+    end: str
+    count: int
+    days: List[DailyRecord]
\ No newline at end of file
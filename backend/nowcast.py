@@ -0,0 +1,258 @@
+"""
+EPA NowCast Engine
+Computes NowCast-weighted PM2.5/PM10/O3 values and a short-term projection
+for every station in one vectorized pass over the cached hourly history
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from aqi import category_name, concentration, sub_index
+from cache_manager import CacheManager
+from models import StationData
+
+logger = logging.getLogger(__name__)
+
+
+# Pollutant -> (hours in the window, minimum weight factor). PM uses the
+# 12-hour NowCast with a 0.5 floor; ozone the 8-hour variant without one.
+NOWCAST_POLLUTANTS: Dict[str, Tuple[int, float]] = {
+    "pm25": (12, 0.5),
+    "pm10": (12, 0.5),
+    "o3": (8, 0.0),
+}
+WINDOW_HOURS = max(hours for hours, _ in NOWCAST_POLLUTANTS.values())
+
+# Hours ahead covered by the projection
+PROJECTION_HOURS: Tuple[int, ...] = (1, 2, 3)
+
+# Results outlive one refresh cycle so a slow refresh never leaves gaps
+RESULT_TTL_SECONDS = 2 * 3600
+
+
+class NowcastResult(NamedTuple):
+    """NowCast evaluation, one row per station."""
+    concentration: np.ndarray   # (stations, pollutants) NowCast concentrations
+    index: np.ndarray           # (stations, pollutants) NowCast sub-indices
+    aqi: np.ndarray             # (stations,) max sub-index, NaN if none valid
+    projection: np.ndarray      # (stations, len(PROJECTION_HOURS)) projected AQI
+
+
+def _utc(timestamp: str) -> Optional[datetime]:
+    try:
+        value = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def hourly_matrix(
+    histories: Sequence[Sequence[StationData]], now: datetime, hours: int = WINDOW_HOURS
+) -> np.ndarray:
+    """
+    Bucket history into hourly concentrations.
+
+    WAQI reports per-pollutant values as AQI sub-indices; they are mapped
+    back to concentrations so the NowCast weighting is applied on the scale
+    EPA defines it on.
+
+    Args:
+        histories: Snapshots per station (any order)
+        now: Reference time (timezone-aware UTC)
+        hours: Window length
+
+    Returns:
+        Array (stations, hours, pollutants), hour 0 = the hour ending at
+        now, NaN where no observation exists
+    """
+    pollutants = list(NOWCAST_POLLUTANTS)
+    indices = np.full((len(histories), hours, len(pollutants)), np.nan)
+
+    for row, history in enumerate(histories):
+        # Oldest first, so the latest snapshot of each hour wins
+        for snapshot in sorted(history, key=lambda s: s.timestamp):
+            observed = _utc(snapshot.timestamp)
+            if observed is None:
+                continue
+            slot = int((now - observed).total_seconds() // 3600)
+            if 0 <= slot < hours:
+                indices[row, slot] = [
+                    np.nan if getattr(snapshot.pollutants, p) is None else getattr(snapshot.pollutants, p)
+                    for p in pollutants
+                ]
+
+    for column, pollutant in enumerate(pollutants):
+        indices[:, :, column] = concentration(pollutant, indices[:, :, column])
+    return indices
+
+
+def nowcast(
+    concentrations: np.ndarray, hours: int, min_weight: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    EPA NowCast of hourly concentrations.
+
+    Args:
+        concentrations: (stations, >= hours) array, column 0 most recent
+        hours: Window length
+        min_weight: Floor of the weight factor
+
+    Returns:
+        (NowCast per station, NaN where fewer than 2 of the 3 most recent
+        hours are valid; per-hour weights used, (stations, hours))
+    """
+    window = concentrations[:, :hours]
+    valid = ~np.isnan(window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c_min = np.where(valid, window, np.inf).min(axis=1)
+        c_max = np.where(valid, window, -np.inf).max(axis=1)
+        ratio = np.where(c_max > 0, c_min / c_max, 1.0)
+    weight = np.maximum(ratio, min_weight)
+
+    # weight ** age, zeroed for missing hours
+    weights = np.where(valid, weight[:, np.newaxis] ** np.arange(hours), 0.0)
+    total = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (weights * np.nan_to_num(window)).sum(axis=1) / total
+
+    result[valid[:, :3].sum(axis=1) < 2] = np.nan
+    return result, weights
+
+
+def project(concentrations: np.ndarray, weights: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """
+    Project concentrations a few hours ahead along the NowCast-weighted trend.
+
+    Args:
+        concentrations: (stations, hours) hourly values, column 0 most recent
+        weights: NowCast weights of each hour
+        current: NowCast value the projection starts from
+
+    Returns:
+        (stations, len(PROJECTION_HOURS)) projected concentrations (>= 0)
+    """
+    hours = weights.shape[1]
+    age = np.arange(hours, dtype=np.float64)
+    values = np.nan_to_num(concentrations[:, :hours])
+
+    # Weighted least-squares slope of concentration over time (-age)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = weights.sum(axis=1)
+        mean_t = (weights * -age).sum(axis=1) / total
+        mean_c = (weights * values).sum(axis=1) / total
+        dt = -age - mean_t[:, np.newaxis]
+        slope = (weights * dt * (values - mean_c[:, np.newaxis])).sum(axis=1) / (weights * dt * dt).sum(axis=1)
+    slope = np.nan_to_num(slope)
+
+    ahead = np.array(PROJECTION_HOURS, dtype=np.float64)
+    return np.clip(current[:, np.newaxis] + slope[:, np.newaxis] * ahead, 0.0, None)
+
+
+def evaluate(hourly: np.ndarray) -> NowcastResult:
+    """
+    NowCast and projection for every station and pollutant.
+
+    Args:
+        hourly: Output of hourly_matrix
+
+    Returns:
+        NowcastResult
+    """
+    stations = hourly.shape[0]
+    pollutants = list(NOWCAST_POLLUTANTS)
+    conc = np.full((stations, len(pollutants)), np.nan)
+    index = np.full((stations, len(pollutants)), np.nan)
+    projected = np.full((stations, len(pollutants), len(PROJECTION_HOURS)), np.nan)
+
+    for column, (pollutant, (hours, min_weight)) in enumerate(NOWCAST_POLLUTANTS.items()):
+        current, weights = nowcast(hourly[:, :, column], hours, min_weight)
+        conc[:, column] = current
+        index[:, column] = sub_index(pollutant, current)
+        projected[:, column] = sub_index(pollutant, project(hourly[:, :, column], weights, current))
+        projected[np.isnan(current), column] = np.nan
+
+    with np.errstate(invalid="ignore"):
+        all_missing = np.isnan(index).all(axis=1)
+        aqi = np.where(all_missing, np.nan, np.where(np.isnan(index), -np.inf, index).max(axis=1))
+        projection = np.where(
+            np.isnan(projected).all(axis=1),
+            np.nan,
+            np.where(np.isnan(projected), -np.inf, projected).max(axis=1)
+        )
+    return NowcastResult(concentration=conc, index=index, aqi=aqi, projection=projection)
+
+
+class NowcastEngine:
+    """Computes NowCasts after each refresh and caches them per station."""
+
+    KEY_PREFIX = "airquality:nowcast:"
+
+    def __init__(self, cache_manager: CacheManager):
+        self.cache_manager = cache_manager
+
+    async def refresh(self, station_ids: List[str]) -> int:
+        """
+        Recompute and cache NowCasts for the given stations.
+
+        Args:
+            station_ids: WAQI station identifiers
+
+        Returns:
+            Number of stations with a valid NowCast
+        """
+        now = datetime.now(timezone.utc)
+        histories = await self.cache_manager.get_station_histories(station_ids, hours=WINDOW_HOURS + 1)
+        result = evaluate(hourly_matrix(histories, now))
+
+        batch = self.cache_manager.backend.batch()
+        valid = 0
+        for row, station_id in enumerate(station_ids):
+            if np.isnan(result.aqi[row]):
+                continue
+            valid += 1
+            payload = {
+                "computed_at": now.isoformat(),
+                "aqi": int(result.aqi[row]),
+                "category": category_name(result.aqi[row]),
+                "pollutants": {
+                    pollutant: {
+                        "concentration": round(float(result.concentration[row, column]), 1),
+                        "aqi": int(result.index[row, column]),
+                    }
+                    for column, pollutant in enumerate(NOWCAST_POLLUTANTS)
+                    if not np.isnan(result.index[row, column])
+                },
+                "projection": [
+                    {
+                        "hours_ahead": hours,
+                        "aqi": int(result.projection[row, i]),
+                        "category": category_name(result.projection[row, i]),
+                    }
+                    for i, hours in enumerate(PROJECTION_HOURS)
+                    if not np.isnan(result.projection[row, i])
+                ],
+            }
+            batch.set(f"{self.KEY_PREFIX}{station_id}", json.dumps(payload).encode(), RESULT_TTL_SECONDS)
+        await batch.execute()
+
+        logger.info("NowCast updated for %s of %s stations", valid, len(station_ids))
+        return valid
+
+    async def get(self, station_id: str) -> Optional[dict]:
+        """
+        Get the cached NowCast of a station.
+
+        Args:
+            station_id: WAQI station identifier
+
+        Returns:
+            NowCast dict or None if not computed
+        """
+        payload = await self.cache_manager.backend.get(f"{self.KEY_PREFIX}{station_id}")
+        return json.loads(payload) if payload else None
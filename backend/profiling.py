@@ -0,0 +1,272 @@
+"""
+Profiling Hooks
+Server-Timing breakdowns per request, an on-demand sampling profiler and
+an event-loop lag monitor. Everything is opt-in; when a hook is disabled
+its call sites cost a single context variable lookup.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+
+# Durations (ms) by phase for the current request; None when not collected
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timings", default=None)
+
+_DISABLED = nullcontext()
+
+# Frames from these files are dropped from the bottom of sampled stacks
+_THREADING_FILES = ("threading.py", "selectors.py")
+
+
+@contextmanager
+def _measure(timings: Dict[str, float], name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def timed(name: str):
+    """
+    Context manager adding the block's duration to the request's
+    Server-Timing entry `name` (a no-op outside a timed request).
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _DISABLED
+    return _measure(timings, name)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware collecting timings and sending a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = (time.perf_counter() - start) * 1000
+                value = ", ".join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"server-timing", value.encode())
+                ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route recording the endpoint's own time and the response serialization
+    (validation and encoding after the endpoint returned) separately.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            async def timed_call(*args, **kwargs):
+                with timed("endpoint"):
+                    return await call(*args, **kwargs)
+            self.dependant.call = timed_call
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            start = time.perf_counter()
+            response = await handler(request)
+            timings = _timings.get()
+            if timings is not None and "endpoint" in timings:
+                handled = (time.perf_counter() - start) * 1000
+                timings["serialize"] = max(handled - timings["endpoint"], 0.0)
+            return response
+
+        return timed_handler
+
+
+def _frame_stack(frame) -> List[str]:
+    """Frames from outermost to innermost as "function (file:first line)"."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sample_thread(thread_id: int, seconds: float, interval: float) -> Counter:
+    """
+    Sample a thread's stack at a fixed interval.
+
+    Runs in the calling (non-target) thread; the sampled thread is never
+    paused beyond the GIL switch needed to read its frames.
+
+    Args:
+        thread_id: Target thread (threading.get_ident() of the loop thread)
+        seconds: Sampling duration
+        interval: Seconds between samples
+
+    Returns:
+        Counter of folded stacks ("outer;...;inner") to sample counts
+    """
+    samples: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stack = [
+                entry for entry in _frame_stack(frame)
+                if not entry.split("(")[-1].startswith(_THREADING_FILES)
+            ]
+            samples[";".join(stack)] += 1
+        time.sleep(interval)
+    return samples
+
+
+def top_functions(samples: Counter, limit: int = 30) -> List[Dict[str, object]]:
+    """
+    Functions ranked by samples in which they were running themselves,
+    then by samples in which they were anywhere on the stack.
+
+    Returns:
+        [{"function", "self", "total"}] with sample counts
+    """
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        if frames and frames[-1]:
+            own[frames[-1]] += count
+        for entry in set(frames):
+            total[entry] += count
+    ranked = sorted(total, key=lambda function: (own[function], total[function]), reverse=True)
+    return [
+        {"function": function, "self": own[function], "total": total[function]}
+        for function in ranked[:limit]
+    ]
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and captures what blocked the loop.
+
+    A task sleeps `interval` and records how late it wakes up. A watchdog
+    thread checks the task's heartbeat; when the loop has not run for
+    `threshold` seconds it samples the loop thread's stack, which names
+    the slow callback while it is still running. Blocks longer than
+    interval + threshold are always caught.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, history: int = 50):
+        """
+        Args:
+            interval: Seconds between lag probes
+            threshold: Lag (seconds) reported as a slow callback
+            history: Slow callbacks kept
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=1200)
+        self.max_lag = 0.0
+        self.slow_callbacks: Deque[dict] = deque(maxlen=history)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start probing the running loop."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        """Stop the probe task and the watchdog."""
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._heartbeat = now
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            # One report per stall, taken while the loop is still blocked
+            # (blocked_ms is how long it had been blocked at that point)
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            self.slow_callbacks.append({
+                "detected_at": datetime.utcnow().isoformat(),
+                "blocked_ms": round(stalled * 1000, 1),
+                "stack": _frame_stack(frame)[-15:] if frame is not None else [],
+            })
+            logger.warning("Event loop blocked for %.0f ms", stalled * 1000)
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+
+        def percentile(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(int(p * len(lags)), len(lags) - 1)] * 1000, 2)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(lags),
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "slow_callbacks": list(self.slow_callbacks),
+        }
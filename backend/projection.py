@@ -0,0 +1,91 @@
+"""
+Sparse Fieldsets
+Parses `fields=` selections of StationData sub-trees and projects readings
+onto them, so list and map views don't pay for weather and forecasts
+"""
+import json
+import re
+from typing import Dict, Optional, Tuple, Union
+
+from models import Pollutants, StationData, Weather
+
+# Canonical selection: sorted, de-duplicated paths ("aqi", "pollutants.pm25")
+FieldSet = Tuple[str, ...]
+
+# Sub-fields selectable below each top-level field; None for leaves, "*"
+# for dictionaries keyed by pollutant
+_CHILDREN: Dict[str, Union[None, str, Tuple[str, ...]]] = {
+    name: None for name in StationData.model_fields
+}
+_CHILDREN.update({
+    "pollutants": tuple(Pollutants.model_fields),
+    "weather": tuple(Weather.model_fields),
+    "forecast": "*",
+})
+
+_KEY = re.compile(r"^[a-z0-9_]+$")
+
+
+def parse_fields(spec: str) -> FieldSet:
+    """
+    Parse a comma-separated field list.
+
+    Args:
+        spec: e.g. "city,aqi,dominant" or "aqi,pollutants.pm25,forecast.o3"
+
+    Returns:
+        Canonical FieldSet; a sub-field is dropped when its parent is selected
+
+    Raises:
+        ValueError: On unknown fields or an empty selection
+    """
+    paths = set()
+    for part in spec.split(","):
+        path = part.strip()
+        if not path:
+            continue
+        top, _, sub = path.partition(".")
+        if top not in _CHILDREN:
+            raise ValueError(f"Unknown field '{top}'")
+        children = _CHILDREN[top]
+        if sub:
+            if children is None or "." in sub or (
+                not _KEY.match(sub) if children == "*" else sub not in children
+            ):
+                raise ValueError(f"Unknown field '{path}'")
+        paths.add(path)
+
+    if not paths:
+        raise ValueError("No fields selected")
+    return tuple(sorted(
+        path for path in paths
+        if "." not in path or path.partition(".")[0] not in paths
+    ))
+
+
+def fields_key(fields: FieldSet) -> str:
+    return ",".join(fields)
+
+
+def _include(fields: FieldSet) -> Dict[str, Union[bool, set]]:
+    """FieldSet as a pydantic include specification."""
+    include: Dict[str, Union[bool, set]] = {}
+    for path in fields:
+        top, _, sub = path.partition(".")
+        if sub:
+            include.setdefault(top, set()).add(sub)
+        else:
+            include[top] = True
+    return include
+
+
+def project(data: StationData, fields: Optional[FieldSet]) -> dict:
+    """JSON-ready dict of the selected fields (all fields if None)."""
+    if fields is None:
+        return data.model_dump(mode="json")
+    return data.model_dump(mode="json", include=_include(fields))
+
+
+def encode_json(body: object) -> bytes:
+    """Serialize like FastAPI's JSONResponse."""
+    return json.dumps(body, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
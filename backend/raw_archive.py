@@ -0,0 +1,246 @@
+"""
+Raw WAQI Payload Archive
+Stores every raw feed response compressed and content-addressed, and
+replays archived payloads through the parse/cache pipeline
+"""
+import hashlib
+import json
+import logging
+import math
+import time
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from cache_manager import CacheManager
+from config import settings
+from waqi_client import get_waqi_client
+
+logger = logging.getLogger(__name__)
+
+
+# Identical payloads (a station that has not updated since the last fetch)
+# share one blob; the per-station index records every fetch.
+BLOB_PREFIX = "airquality:raw:blob:"
+INDEX_PREFIX = "airquality:raw:index:"
+
+ZLIB_LEVEL = 6
+
+
+class ArchivedPayload(NamedTuple):
+    """One archived fetch of a station feed."""
+    station_id: str
+    fetched_at: datetime   # naive UTC
+    digest: str            # sha256 of the canonical JSON
+    payload: dict
+
+
+def encode_payload(raw: dict) -> Tuple[str, bytes]:
+    """
+    Canonicalize and compress a raw payload.
+
+    Args:
+        raw: Raw "data" object of a WAQI feed response
+
+    Returns:
+        (sha256 hex digest of the canonical JSON, compressed blob)
+    """
+    canonical = json.dumps(raw, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(canonical).hexdigest(), zlib.compress(canonical, ZLIB_LEVEL)
+
+
+def decode_payload(blob: bytes) -> dict:
+    """Inverse of encode_payload."""
+    return json.loads(zlib.decompress(blob))
+
+
+def _index_member(digest: str, fetched_at: datetime) -> str:
+    # Unique per fetch even when the content repeats
+    return f"{digest}:{int(fetched_at.timestamp() * 1000)}"
+
+
+class RawArchive:
+    """Archive of raw WAQI responses on the cache backend."""
+
+    def __init__(self, cache_manager: CacheManager, ttl_hours: Optional[int] = None):
+        """
+        Args:
+            cache_manager: Connected CacheManager whose backend stores the archive
+            ttl_hours: Retention (defaults to RAW_ARCHIVE_TTL_HOURS)
+        """
+        self.cache_manager = cache_manager
+        self.ttl = (ttl_hours or settings.RAW_ARCHIVE_TTL_HOURS) * 3600
+
+    async def store_many(self, entries: List[Tuple[str, dict, datetime]]) -> int:
+        """
+        Archive raw payloads in one batched write.
+
+        Args:
+            entries: (station_id, raw payload, fetched at naive UTC) triples
+
+        Returns:
+            Number of payloads archived
+        """
+        if not entries:
+            return 0
+
+        try:
+            batch = self.cache_manager.backend.batch()
+            for station_id, raw, fetched_at in entries:
+                digest, blob = encode_payload(raw)
+                index_key = f"{INDEX_PREFIX}{station_id}"
+
+                # Rewriting an existing blob just extends its expiry
+                batch.set(f"{BLOB_PREFIX}{digest}", blob, self.ttl)
+                batch.zadd(index_key, {_index_member(digest, fetched_at): fetched_at.timestamp()})
+                batch.zremrangebyscore(index_key, 0, fetched_at.timestamp() - self.ttl)
+            await batch.execute()
+            return len(entries)
+
+        except Exception as e:
+            logger.error("Error archiving %s raw payloads: %s", len(entries), e)
+            return 0
+
+    async def latest(self, station_id: str) -> Optional[ArchivedPayload]:
+        """
+        Get the most recently archived payload of a station.
+
+        Args:
+            station_id: WAQI station identifier
+
+        Returns:
+            ArchivedPayload or None if nothing is archived
+        """
+        backend = self.cache_manager.backend
+        entries = await backend.zrangebyscore(
+            f"{INDEX_PREFIX}{station_id}", 0, math.inf, withscores=True
+        )
+        # Walk back in case the newest blob has already expired
+        for member, score in reversed(entries):
+            digest = member.split(":", 1)[0]
+            blob = await backend.get(f"{BLOB_PREFIX}{digest}")
+            if blob:
+                return ArchivedPayload(
+                    station_id, datetime.fromtimestamp(score), digest, decode_payload(blob)
+                )
+        return None
+
+    async def station_ids(self) -> List[str]:
+        """Stations with archived payloads."""
+        return sorted([
+            key[len(INDEX_PREFIX):]
+            async for key in self.cache_manager.backend.scan_keys(INDEX_PREFIX)
+        ])
+
+    async def iter_payloads(
+        self,
+        station_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[List[ArchivedPayload]]:
+        """
+        Stream archived payloads of a station in chronological batches.
+
+        Args:
+            station_id: WAQI station identifier
+            start: Start of the range (naive UTC), unbounded if None
+            end: End of the range (naive UTC), unbounded if None
+            batch_size: Maximum number of payloads per batch
+
+        Yields:
+            Lists of ArchivedPayload, oldest first
+        """
+        backend = self.cache_manager.backend
+        index_key = f"{INDEX_PREFIX}{station_id}"
+        lower = start.timestamp() if start else 0
+        upper = end.timestamp() if end else math.inf
+
+        while True:
+            page = await backend.zrangebyscore(
+                index_key, lower, upper, count=batch_size, withscores=True
+            )
+            if not page:
+                break
+
+            digests = [member.split(":", 1)[0] for member, _ in page]
+            blobs = await backend.mget([f"{BLOB_PREFIX}{digest}" for digest in digests])
+            # Repeated content is decompressed once per page
+            decoded: Dict[str, dict] = {}
+            batch = []
+            for (_, score), digest, blob in zip(page, digests, blobs):
+                if not blob:
+                    continue
+                if digest not in decoded:
+                    decoded[digest] = decode_payload(blob)
+                batch.append(ArchivedPayload(
+                    station_id, datetime.fromtimestamp(score), digest, decoded[digest]
+                ))
+            if batch:
+                yield batch
+
+            if len(page) < batch_size:
+                break
+            lower = math.nextafter(page[-1][1], math.inf)
+
+
+async def replay(
+    archive: RawArchive,
+    station_cities: Dict[str, str],
+    station_ids: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    dry_run: bool = False,
+    batch_size: int = 500
+) -> Dict[str, float]:
+    """
+    Feed archived payloads back through parse_station_data and the cache.
+
+    Snapshots are cached at their original fetch time, the time live
+    ingestion recorded them at, so re-deriving history after parser
+    changes replaces the entries instead of adding new ones. The latest
+    pointer is only replaced by readings at least as recent as the
+    station's newest entry. With dry_run only the parser runs, which makes
+    a deterministic ingest benchmark.
+
+    Args:
+        archive: RawArchive to read from
+        station_cities: Configured city name per station id; stations not
+            listed fall back to the name in the payload
+        station_ids: Stations to replay (all archived stations if None)
+        start: Start of the range (naive UTC), unbounded if None
+        end: End of the range (naive UTC), unbounded if None
+        dry_run: Parse without writing to the cache
+        batch_size: Payloads per read and per batched cache write
+
+    Returns:
+        Counts of replayed/failed/cached payloads and the elapsed seconds
+    """
+    client = get_waqi_client()
+    cache_manager = archive.cache_manager
+    stats = {"replayed": 0, "failed": 0, "cached": 0, "seconds": 0.0}
+    started = time.perf_counter()
+
+    for station_id in station_ids or await archive.station_ids():
+        async for batch in archive.iter_payloads(station_id, start, end, batch_size):
+            snapshots = []
+            for entry in batch:
+                city = station_cities.get(station_id) or entry.payload.get("city", {}).get("name", "Unknown")
+                data = client.parse_station_data(entry.payload, city)
+                if data is None:
+                    stats["failed"] += 1
+                    continue
+                snapshots.append((station_id, data, entry.fetched_at))
+
+            stats["replayed"] += len(snapshots)
+            if not dry_run:
+                stats["cached"] += await cache_manager.cache_snapshots(
+                    snapshots, batch_size, keep_newer_latest=True
+                )
+
+    stats["seconds"] = time.perf_counter() - started
+    logger.info(
+        "Replay complete: %s payloads parsed, %s failed, %s cached in %.2fs",
+        stats["replayed"], stats["failed"], stats["cached"], stats["seconds"]
+    )
+    return stats
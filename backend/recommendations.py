@@ -0,0 +1,157 @@
+"""
+Product Recommendations
+Indexes marketplace.json by AQI bucket and dominant pollutant so a city's
+recommendations are a lookup of a pre-serialized response
+"""
+import json
+import logging
+import math
+import re
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aqi import POLLUTANTS
+
+logger = logging.getLogger(__name__)
+
+
+LEVELS: Tuple[str, ...] = ("high", "medium", "low")
+BADGES: Dict[str, str] = {
+    "high": "Highly Recommended",
+    "medium": "Recommended",
+    "low": "Optional",
+}
+
+# A product is "Recommended" from this fraction of its minimum AQI upwards
+MEDIUM_FRACTION = 0.8
+
+# Dominant pollutants particle filters (HEPA, N95) do little against
+GASEOUS = frozenset({"o3", "no2", "so2", "co"})
+
+_ABOVE = re.compile(r"AQI\s*(?:is\s*)?[^0-9]{0,20}?>\s*(\d+)", re.IGNORECASE)
+_RANGE = re.compile(r"AQI\s*(\d+)\s*[–-]\s*(\d+)", re.IGNORECASE)
+# Particle filters, as opposed to monitors that merely measure PM2.5
+_PARTICLE_FILTER = re.compile(r"hepa|n95|kn95|ffp2|respirator|purifier", re.IGNORECASE)
+
+
+class ProductRule(NamedTuple):
+    """AQI range a product is meant for, parsed from its use_case text."""
+    min_aqi: Optional[float]
+    max_aqi: Optional[float]
+    particulate: bool
+
+    def level(self, aqi: float, dominant: str) -> str:
+        if self.min_aqi is None:
+            level = "medium"
+        elif aqi > self.min_aqi and (self.max_aqi is None or aqi <= self.max_aqi):
+            level = "high"
+        elif aqi > self.min_aqi * MEDIUM_FRACTION:
+            level = "medium"
+        else:
+            level = "low"
+
+        # Particle filters are a weaker answer to gas-driven AQI
+        if self.particulate and dominant in GASEOUS and level != "low":
+            level = LEVELS[LEVELS.index(level) + 1]
+        return level
+
+
+def parse_rule(product: dict) -> ProductRule:
+    """
+    Parse the AQI range out of a product's use_case.
+
+    Understands "AQI > 100", "AQI is “Unhealthy” (AQI >150)" and
+    "AQI 100–200"; anything else is a general-purpose product.
+    """
+    text = product.get("use_case", "")
+    particulate = bool(_PARTICLE_FILTER.search(product.get("title", "") + " " + product.get("description", "")))
+
+    match = _RANGE.search(text)
+    if match:
+        return ProductRule(float(match.group(1)), float(match.group(2)), particulate)
+    match = _ABOVE.search(text)
+    if match:
+        return ProductRule(float(match.group(1)), None, particulate)
+    return ProductRule(None, None, particulate)
+
+
+class RecommendationIndex:
+    """
+    Recommendations precomputed for every AQI bucket and dominant pollutant.
+
+    Bucket edges are the AQI values where any product's level can change,
+    so every AQI within a bucket yields the same ranking.
+    """
+
+    def __init__(self, products: List[dict]):
+        self.products = products
+        self.rules = [parse_rule(product) for product in products]
+
+        edges = set()
+        for rule in self.rules:
+            if rule.min_aqi is not None:
+                edges.update((rule.min_aqi, rule.min_aqi * MEDIUM_FRACTION))
+            if rule.max_aqi is not None:
+                edges.add(rule.max_aqi)
+        self.edges: List[float] = sorted(edges)
+
+        # A representative AQI inside each bucket: bucket b covers
+        # (edges[b-1], edges[b]], so take the midpoint, which stays inside
+        # however close two edges are
+        points = [self.edges[0] - 1 if self.edges else 0.0]
+        points += [(low + high) / 2 for low, high in zip(self.edges, self.edges[1:])]
+        if self.edges:
+            points.append(self.edges[-1] + 1)
+
+        self._responses: Dict[Tuple[int, str], bytes] = {
+            (bucket, dominant): self._serialize(aqi, dominant)
+            for bucket, aqi in enumerate(points)
+            for dominant in POLLUTANTS + ("",)
+        }
+        # Without an AQI products keep their catalog order and get no level
+        self._unranked = json.dumps([
+            {**product, "level": None, "badge": None} for product in products
+        ], ensure_ascii=False, separators=(",", ":")).encode()
+
+    @classmethod
+    def load(cls, path: str) -> "RecommendationIndex":
+        """Build the index from a marketplace JSON file."""
+        with open(Path(path), "r") as f:
+            products = json.load(f)
+        index = cls(products)
+        logger.info(
+            "Indexed %s products into %s AQI buckets", len(products), len(index.edges) + 1
+        )
+        return index
+
+    def bucket(self, aqi: float) -> int:
+        """Number of edges strictly below aqi (levels only test aqi > edge)."""
+        return bisect_left(self.edges, aqi)
+
+    def _serialize(self, aqi: float, dominant: str) -> bytes:
+        levels = [rule.level(aqi, dominant) for rule in self.rules]
+        ranked = sorted(range(len(self.products)), key=lambda i: LEVELS.index(levels[i]))
+        return json.dumps([
+            {**self.products[i], "level": levels[i], "badge": BADGES[levels[i]]}
+            for i in ranked
+        ], ensure_ascii=False, separators=(",", ":")).encode()
+
+    def lookup(self, aqi: float, dominant: str) -> bytes:
+        """
+        Ranked recommendations for a reading.
+
+        Args:
+            aqi: Current AQI (NaN if unknown)
+            dominant: Dominant pollutant (unknown values count as none)
+
+        Returns:
+            Pre-serialized JSON array of products with level and badge;
+            unranked, with null level and badge, when the AQI is unknown
+        """
+        if math.isnan(aqi):
+            return self._unranked
+        if dominant not in POLLUTANTS:
+            dominant = ""
+        return self._responses[(self.bucket(aqi), dominant)]
+
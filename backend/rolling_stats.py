@@ -0,0 +1,201 @@
+"""
+Rolling Statistics
+Per-station running aggregates (count, mean, min/max, variance and trend)
+over 1h/24h/7d windows of the AQI and each pollutant, updated in O(1) per
+reading so summaries never read the raw history
+"""
+import struct
+from typing import Dict, Optional, Tuple
+
+from aqi import POLLUTANTS
+
+# Window name -> (window length, bucket length) in seconds. Each window is
+# a ring of buckets, so old readings leave it a bucket at a time and a
+# window covers its length to bucket resolution.
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "1h": (3600, 900),
+    "24h": (86400, 3600),
+    "7d": (7 * 86400, 6 * 3600),
+}
+METRICS: Tuple[str, ...] = ("aqi",) + POLLUTANTS
+
+# Stored state outlives the longest window by a day
+STATE_TTL_SECONDS = max(window for window, _ in WINDOWS.values()) + 86400
+
+_WINDOW_NAMES = tuple(WINDOWS)
+# version, last recording time, length of the last observation timestamp
+# that follows
+_VERSION = 1
+_HEADER = struct.Struct("<BdB")
+# metric, window, bucket number, count, then the Moments floats
+_RECORD = struct.Struct("<BBiH7f")
+
+
+def state_version(payload: bytes) -> bytes:
+    """
+    Prefix identifying a stored state: its header, whose recording time
+    changes with every reading the state accepts.
+    """
+    return payload[:_HEADER.size]
+
+
+class Moments:
+    """
+    Running moments of (t, y) pairs, t in hours from the bucket start.
+
+    Welford's updates keep mean and M2 of y, and the same for t plus the
+    co-moment of t and y, so the least-squares slope is C_ty / M2_t.
+    Two sets of moments merge exactly (Chan et al.).
+    """
+
+    __slots__ = ("n", "mean", "m2", "mean_t", "m2_t", "c_ty", "low", "high")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = self.m2 = 0.0
+        self.mean_t = self.m2_t = self.c_ty = 0.0
+        self.low = float("inf")
+        self.high = float("-inf")
+
+    def add(self, t: float, y: float):
+        self.n += 1
+        dt = t - self.mean_t
+        dy = y - self.mean
+        self.mean_t += dt / self.n
+        self.mean += dy / self.n
+        self.m2 += dy * (y - self.mean)
+        self.m2_t += dt * (t - self.mean_t)
+        self.c_ty += dt * (y - self.mean)
+        self.low = min(self.low, y)
+        self.high = max(self.high, y)
+
+    def merge(self, other: "Moments", shift: float = 0.0):
+        """Add another set of moments whose t is offset by shift hours."""
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        dt = other.mean_t + shift - self.mean_t
+        dy = other.mean - self.mean
+        weight = self.n * other.n / n
+        self.m2 += other.m2 + dy * dy * weight
+        self.m2_t += other.m2_t + dt * dt * weight
+        self.c_ty += other.c_ty + dt * dy * weight
+        self.mean += dy * other.n / n
+        self.mean_t += dt * other.n / n
+        self.n = n
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.n,
+            "mean": round(self.mean, 2),
+            "min": round(self.low, 2),
+            "max": round(self.high, 2),
+            "variance": round(self.m2 / (self.n - 1), 2) if self.n > 1 else None,
+            "slope_per_hour": round(self.c_ty / self.m2_t, 3) if self.m2_t > 1e-9 else None,
+        }
+
+
+class RollingStats:
+    """
+    Bucketed rolling windows of one station.
+
+    A reading updates one bucket per window and metric; a summary merges
+    the at most 28 live buckets of a window. The state serializes to a few
+    kilobytes however many readings it has seen.
+    """
+
+    def __init__(self):
+        # (metric, window) -> bucket number -> moments
+        self.buckets: Dict[Tuple[str, str], Dict[int, Moments]] = {}
+        self.last_recorded = 0.0
+        self.last_observed = ""
+
+    def add(self, recorded_at: float, values: Dict[str, Optional[float]], observed: str = "") -> bool:
+        """
+        Add one reading.
+
+        Args:
+            recorded_at: Epoch seconds the reading is recorded at
+            values: Metric -> value (None for missing)
+            observed: Observation timestamp
+
+        Returns:
+            False if the reading was ignored: recorded no later than the
+            previous one (e.g. a replay) or a repeat of its observation
+        """
+        if recorded_at <= self.last_recorded or (observed and observed == self.last_observed):
+            return False
+        self.last_recorded = recorded_at
+        self.last_observed = observed
+
+        for name, (window, size) in WINDOWS.items():
+            number = int(recorded_at // size)
+            t = (recorded_at - number * size) / 3600
+            oldest = number - window // size
+            for metric in METRICS:
+                value = values.get(metric)
+                if value is None:
+                    continue
+                buckets = self.buckets.setdefault((metric, name), {})
+                moments = buckets.get(number)
+                if moments is None:
+                    # A new bucket is the moment to drop expired ones
+                    for stale in [key for key in buckets if key <= oldest]:
+                        del buckets[stale]
+                    moments = buckets[number] = Moments()
+                moments.add(t, value)
+        return True
+
+    def summary(self, now: float) -> Dict[str, Dict[str, dict]]:
+        """
+        Aggregates of every window with data at `now`.
+
+        Returns:
+            Metric -> window -> {count, mean, min, max, variance,
+            slope_per_hour}
+        """
+        result: Dict[str, Dict[str, dict]] = {}
+        for (metric, name), buckets in self.buckets.items():
+            window, size = WINDOWS[name]
+            current = int(now // size)
+            oldest = current - window // size
+            total = Moments()
+            for number, moments in buckets.items():
+                if oldest < number <= current:
+                    total.merge(moments, shift=(number - oldest) * size / 3600)
+            if total.n:
+                result.setdefault(metric, {})[name] = total.summary()
+        return result
+
+    def encode(self) -> bytes:
+        observed = self.last_observed.encode()[:255]
+        parts = [_HEADER.pack(_VERSION, self.last_recorded, len(observed)), observed]
+        for (metric, name), buckets in self.buckets.items():
+            metric_index = METRICS.index(metric)
+            window_index = _WINDOW_NAMES.index(name)
+            for number, m in buckets.items():
+                parts.append(_RECORD.pack(
+                    metric_index, window_index, number, min(m.n, 0xFFFF),
+                    m.mean, m.m2, m.mean_t, m.m2_t, m.c_ty, m.low, m.high
+                ))
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, payload: bytes) -> "RollingStats":
+        stats = cls()
+        version, stats.last_recorded, length = _HEADER.unpack_from(payload)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported rolling stats version {version}")
+        offset = _HEADER.size
+        stats.last_observed = payload[offset:offset + length].decode()
+        for fields in _RECORD.iter_unpack(payload[offset + length:]):
+            metric_index, window_index, number, n, *values = fields
+            m = Moments()
+            m.n = n
+            m.mean, m.m2, m.mean_t, m.m2_t, m.c_ty, m.low, m.high = values
+            key = (METRICS[metric_index], _WINDOW_NAMES[window_index])
+            stats.buckets.setdefault(key, {})[number] = m
+        return stats
+
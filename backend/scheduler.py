@@ -2,10 +2,12 @@
 Background Scheduler for Air Quality Data Updates
 Handles periodic fetching and caching of air quality data
 """
+import asyncio
 import logging
 import json
+import os
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from pathlib import Path
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -13,14 +15,26 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from waqi_client import get_waqi_client
 from cache_manager import CacheManager
+from compaction import HistoryCompactor
+from config import settings
 from models import CityConfig, StationData
+from nowcast import NowcastEngine
+from raw_archive import RawArchive
+from sharding import ShardCoordinator
 
 logger = logging.getLogger(__name__)
 
 
+# Held by the worker compacting history this interval
+COMPACTION_LEASE_KEY = "compaction:lease"
+
+
 class AirQualityScheduler:
     """Scheduler for periodic air quality data updates."""
     
+    # Parsed stations written to the cache per batched flush
+    FLUSH_BATCH_SIZE = 100
+    
     def __init__(self, cache_manager: CacheManager):
         """
         Initialize the scheduler.
@@ -29,10 +43,32 @@ class AirQualityScheduler:
             cache_manager: CacheManager instance for storing data
         """
         self.cache_manager = cache_manager
+        self.raw_archive: Optional[RawArchive] = (
+            RawArchive(cache_manager) if settings.RAW_ARCHIVE_ENABLED else None
+        )
+        self.nowcast = NowcastEngine(cache_manager)
+        self.compactor = HistoryCompactor(cache_manager, batch_size=settings.COMPACTION_BATCH_SIZE)
         self.scheduler = AsyncIOScheduler()
         self.cities: List[CityConfig] = []
         self.last_update_time: Optional[datetime] = None
         self.next_update_time: Optional[datetime] = None
+        # Bumped whenever cached readings change, for derived caches
+        self.refresh_version = 0
+        self._cities_mtime: Optional[float] = None
+        self._reload_lock = asyncio.Lock()
+        # Bulk ingestion state: last headline (AQI, time) seen per station,
+        # when its full feed was last fetched, and stations whose full feed
+        # was asked for since the last sweep
+        self._headlines: Dict[str, Tuple[Optional[int], str]] = {}
+        self._detail_fetched: Dict[str, datetime] = {}
+        self._detail_requested: Set[str] = set()
+        # Set when ingestion is sharded across workers; _owned holds the
+        # stations this worker owned at the last refresh or rebalance
+        self.shards: Optional[ShardCoordinator] = None
+        self._owned: Set[str] = set()
+        # Refreshes of stations taken over in a rebalance, run outside the
+        # heartbeat job
+        self._takeovers: Set[asyncio.Task] = set()
     
     async def initialize(self):
         """
@@ -42,7 +78,17 @@ class AirQualityScheduler:
         
         # Load cities from config
         self.cities = self._load_cities_config()
-        logger.info(f"Loaded {len(self.cities)} cities from configuration")
+        logger.info("Loaded %s cities from configuration", len(self.cities))
+        
+        if settings.SHARDING_ENABLED:
+            self.shards = ShardCoordinator(
+                self.cache_manager.backend,
+                worker_id=settings.SHARD_WORKER_ID,
+                ttl=settings.SHARD_HEARTBEAT_TTL_SECONDS,
+                lease_seconds=settings.SHARD_LEASE_SECONDS,
+            )
+            await self.shards.heartbeat()
+            logger.info("Ingestion sharded as worker %s", self.shards.worker_id)
         
         # Discover stations for each city
         await self._discover_stations()
@@ -54,36 +100,61 @@ class AirQualityScheduler:
     
     def _load_cities_config(self) -> List[CityConfig]:
         """
-        Load cities configuration from cities.json.
+        Load cities configuration from CITIES_CONFIG_PATH.
         
         Returns:
             List of CityConfig objects
         """
-        config_path = Path("cities.json")
-        
-        if not config_path.exists():
-            logger.error("cities.json not found!")
-            return []
-        
         try:
-            with open(config_path, 'r') as f:
-                data = json.load(f)
-            
-            cities = [CityConfig(**city) for city in data]
-            return cities
+            return self._read_cities_config()
         
+        except FileNotFoundError:
+            logger.error("%s not found!", settings.CITIES_CONFIG_PATH)
+            return []
         except Exception as e:
-            logger.error(f"Error loading cities configuration: {e}")
+            logger.error("Error loading cities configuration: %s", e)
             return []
     
-    async def _discover_stations(self):
+    def _read_cities_config(self) -> List[CityConfig]:
+        """
+        Read and validate the cities configuration, raising on any error.
+        
+        Returns:
+            List of CityConfig objects
+        """
+        config_path = Path(settings.CITIES_CONFIG_PATH)
+        mtime = config_path.stat().st_mtime
+        
+        with open(config_path, 'r') as f:
+            data = json.load(f)
+        
+        cities = [CityConfig(**city) for city in data]
+        self._cities_mtime = mtime
+        return cities
+    
+    async def _discover_stations(self, cities: Optional[List[CityConfig]] = None):
         """
-        Discover nearest stations for all configured cities.
+        Discover nearest stations for the given cities.
+        
+        When sharded, workers share the discovered mappings: a city mapped
+        at its current coordinates by any worker is adopted without an API
+        call, and each remaining city is looked up by the one worker that
+        wins its discovery lease. The others adopt that mapping on their
+        next heartbeat.
+        
+        Args:
+            cities: Cities to discover (all configured cities if None)
         """
         logger.info("Discovering stations for cities...")
         client = get_waqi_client()
+        cities = self.cities if cities is None else cities
         
-        for city in self.cities:
+        if self.shards is not None:
+            cities = await self._adopt_mappings(cities)
+            claimed = await self.shards.claim_discovery([self._discovery_key(city) for city in cities])
+            cities = [city for city in cities if self._discovery_key(city) in claimed]
+        
+        for city in cities:
             try:
                 # Get nearest station
                 station_data = await client.get_nearest_station(city.lat, city.lon)
@@ -97,15 +168,38 @@ class AirQualityScheduler:
                     
                     # Store city-to-station mapping in cache
                     await self.cache_manager.set_city_station_mapping(
-                        city.city, station_id, station_name
+                        city.city, station_id, station_name, city.lat, city.lon
                     )
                     
-                    logger.info(f"Found station for {city.city}: {station_name} (ID: {station_id})")
+                    logger.info("Found station for %s: %s (ID: %s)", city.city, station_name, station_id)
                 else:
-                    logger.warning(f"No station found for {city.city}")
+                    logger.warning("No station found for %s", city.city)
             
             except Exception as e:
-                logger.error(f"Error discovering station for {city.city}: {e}")
+                logger.error("Error discovering station for %s: %s", city.city, e)
+    
+    @staticmethod
+    def _discovery_key(city: CityConfig) -> str:
+        return f"{city.city.lower()}:{city.lat},{city.lon}"
+    
+    async def _adopt_mappings(self, cities: List[CityConfig]) -> List[CityConfig]:
+        """
+        Take the stations of cities from the mappings stored by any worker.
+        
+        Returns:
+            The cities without a mapping discovered at their coordinates
+        """
+        mappings = await self.cache_manager.get_city_station_mappings([city.city for city in cities])
+        missing = []
+        for city, mapping in zip(cities, mappings):
+            if mapping and (mapping.get("lat"), mapping.get("lon")) == (city.lat, city.lon):
+                city.station_id = mapping.get("station_id")
+                city.station_name = mapping.get("station_name")
+                # Keep this worker's listeners (e.g. city search) in sync
+                self.cache_manager.notify_mapping(city.city, city.station_id, city.station_name)
+            else:
+                missing.append(city)
+        return missing
     
     async def fetch_all_stations(self):
         """
@@ -114,13 +208,250 @@ class AirQualityScheduler:
         logger.info("Fetching data for all stations...")
         self.last_update_time = datetime.utcnow()
         
+        if self.shards is not None:
+            # Retry cities whose lookup failed, or whose discovering worker
+            # died, once per lease period across all workers
+            unmapped = [city for city in self.cities if not city.station_id]
+            if unmapped:
+                await self._discover_stations(unmapped)
+        
+        owned = self._owned_cities()
+        self._owned = {city.station_id for city in owned}
+        await self._refresh(await self._claim(owned))
+        await self.update_nowcast()
+        
+        # Set next update time
+        self.next_update_time = datetime.utcnow() + timedelta(hours=1)
+    
+    async def _refresh(self, cities: List[CityConfig]):
+        """Fetch the given cities' stations in the configured ingestion mode."""
+        if settings.BULK_INGESTION_ENABLED:
+            await self._fetch_bulk(cities)
+        else:
+            await self._fetch_cities(cities)
+    
+    def _owned_cities(self) -> List[CityConfig]:
+        """Cities whose station this worker refreshes (all when not sharded)."""
+        if self.shards is None:
+            return self.cities
+        return [city for city in self.cities if city.station_id and self.shards.owns(city.station_id)]
+    
+    async def _claim(self, cities: List[CityConfig]) -> List[CityConfig]:
+        """
+        Lease the cities' stations for one refresh when sharded.
+        
+        Returns:
+            The cities whose station no other worker fetched within the
+            lease period
+        """
+        if self.shards is None:
+            return cities
+        station_ids = list(dict.fromkeys(city.station_id for city in cities if city.station_id))
+        claimed = await self.shards.claim(station_ids)
+        return [city for city in cities if city.station_id in claimed]
+    
+    async def shard_heartbeat(self):
+        """
+        Renew this worker's shard membership and, when workers joined or
+        left or another worker discovered stations this worker owns, start
+        refreshing the stations this worker took over.
+        
+        The refresh runs as a separate task: the heartbeat job must return
+        quickly, or skipped heartbeats would get this worker dropped from
+        the membership while it works through the takeover.
+        """
+        try:
+            changed = await self.shards.heartbeat()
+            # Pick up stations other workers discovered since
+            unmapped = [city for city in self.cities if not city.station_id]
+            if unmapped:
+                changed = len(await self._adopt_mappings(unmapped)) < len(unmapped) or changed
+            if not changed:
+                return
+        except Exception as e:
+            logger.error("Shard heartbeat failed: %s", e)
+            return
+        
+        owned = self._owned_cities()
+        gained = [city for city in owned if city.station_id not in self._owned]
+        self._owned = {city.station_id for city in owned}
+        if not gained or self.last_update_time is None:
+            return
+        
+        task = asyncio.create_task(self._take_over(gained))
+        self._takeovers.add(task)
+        task.add_done_callback(self._takeovers.discard)
+    
+    async def _take_over(self, gained: List[CityConfig]):
+        """Refresh stations gained in a rebalance."""
+        try:
+            # Stations their previous owner refreshed within the lease are skipped
+            claimed = await self._claim(gained)
+            logger.info(
+                "Rebalanced: %s stations gained, %s to refresh now", len(gained), len(claimed)
+            )
+            if claimed:
+                await self._refresh(claimed)
+        except Exception as e:
+            logger.error("Error refreshing stations taken over: %s", e)
+    
+    async def update_nowcast(self):
+        """Recompute NowCasts from the freshly cached history."""
+        try:
+            station_ids = sorted({city.station_id for city in self._owned_cities() if city.station_id})
+            await self.nowcast.refresh(station_ids)
+        except Exception as e:
+            logger.error("Error updating NowCast: %s", e)
+    
+    async def compact_history(self):
+        """
+        Reconcile history indexes with the stored snapshots.
+        
+        Workers sharing a backend take turns through a lease held for half
+        the interval, so each interval's pass runs about once.
+        """
+        try:
+            lease = max(settings.COMPACTION_INTERVAL_MINUTES * 30, 1)
+            (claimed,) = await self.cache_manager.backend.set_nx_many(
+                [COMPACTION_LEASE_KEY], str(os.getpid()).encode(), lease
+            )
+            if claimed:
+                await self.compactor.run()
+        except Exception as e:
+            logger.error("Error compacting history: %s", e)
+    
+    @staticmethod
+    def _plan_bounds(
+        cities: List[CityConfig], tile_degrees: float, padding: float = 0.25
+    ) -> List[Tuple[float, float, float, float]]:
+        """
+        Tile the cities' coordinates into bounding boxes for bulk queries.
+        
+        Cities are grouped by a tile_degrees grid and each group yields the
+        bounding box of its cities, padded because stations sit a little
+        away from the city coordinates. Empty grid cells cost nothing.
+        
+        Returns:
+            (south, west, north, east) per box
+        """
+        groups: Dict[Tuple[int, int], List[CityConfig]] = {}
+        for city in cities:
+            if city.station_id:
+                cell = (int(city.lat // tile_degrees), int(city.lon // tile_degrees))
+                groups.setdefault(cell, []).append(city)
+        
+        bounds = []
+        for group in groups.values():
+            lats = [city.lat for city in group]
+            lons = [city.lon for city in group]
+            bounds.append((
+                max(min(lats) - padding, -90.0), max(min(lons) - padding, -180.0),
+                min(max(lats) + padding, 90.0), min(max(lons) + padding, 180.0),
+            ))
+        return bounds
+    
+    async def _fetch_bulk(self, cities: List[CityConfig]):
+        """
+        Refresh headline AQI of all stations with a few bounding-box calls.
+        
+        Full feeds are fetched only for stations whose AQI changed, that
+        were missing from the bounds results, whose full feed was requested
+        or is older than BULK_DETAIL_MAX_AGE_HOURS, and for stations without
+        a headline AQI ("-"), which is never carried. Stations whose AQI is
+        unchanged but reported at a newer time get the cached reading
+        carried forward to that time, keeping the hourly history dense.
+        
+        Args:
+            cities: Cities whose stations to refresh
+        """
+        client = get_waqi_client()
+        bounds = self._plan_bounds(cities, settings.BULK_TILE_DEGREES)
+        headlines: Dict[str, Tuple[Optional[int], str]] = {}
+        for result in await asyncio.gather(*(client.get_map_bounds(*box) for box in bounds)):
+            if result:
+                headlines.update(result)
+        
+        now = datetime.utcnow()
+        max_age = timedelta(hours=settings.BULK_DETAIL_MAX_AGE_HOURS)
+        detail: List[CityConfig] = []
+        carried: List[CityConfig] = []
+        
+        for city in cities:
+            station_id = city.station_id
+            if not station_id:
+                continue
+            headline = headlines.get(station_id)
+            previous = self._headlines.get(station_id)
+            fetched = self._detail_fetched.get(station_id)
+            
+            if (
+                headline is None or previous is None or fetched is None
+                # A missing AQI can't be stored as a reading
+                or headline[0] is None
+                or headline[0] != previous[0]
+                or now - fetched > max_age
+                or station_id in self._detail_requested
+            ):
+                detail.append(city)
+            elif headline[1] != previous[1]:
+                carried.append(city)
+        
+        # Headlines of the detail stations are recorded once their feed is
+        # cached, so a failed fetch is retried in the next sweep instead of
+        # counting as unchanged
+        queued = {city.station_id for city in detail}
+        self._headlines.update(
+            (station_id, headline) for station_id, headline in headlines.items()
+            if station_id not in queued
+        )
+        
+        logger.info(
+            "Bulk sweep: %s bounds calls, %s feeds to fetch, %s carried forward, %s unchanged",
+            len(bounds), len(detail), len(carried), len(cities) - len(detail) - len(carried)
+        )
+        
+        if carried:
+            latest = await self.cache_manager.get_latest_many([city.station_id for city in carried])
+            pending = []
+            for city, data in zip(carried, latest):
+                if data:
+                    aqi, observed = headlines[city.station_id]
+                    pending.append((city.station_id, data.model_copy(update={"timestamp": observed, "aqi": aqi})))
+            if pending:
+                await self.cache_manager.cache_many(pending)
+        
+        # Always bumps refresh_version, also when nothing needed a feed
+        await self._fetch_cities(detail, headlines)
+    
+    def request_detail(self, station_id: str):
+        """Fetch the station's full feed in the next bulk sweep."""
+        # Other workers' stations still get a full feed every
+        # BULK_DETAIL_MAX_AGE_HOURS
+        if self.shards is None or station_id in self._owned:
+            self._detail_requested.add(station_id)
+    
+    async def _fetch_cities(
+        self,
+        cities: List[CityConfig],
+        headlines: Optional[Dict[str, Tuple[Optional[int], str]]] = None
+    ):
+        """
+        Fetch and cache data for the given cities' stations.
+        
+        Args:
+            cities: Cities whose stations to refresh
+            headlines: Bulk headline per station, recorded for each station
+                whose feed was cached (bulk ingestion)
+        """
         client = get_waqi_client()
         success_count = 0
         error_count = 0
+        pending: List[Tuple[str, StationData, datetime]] = []
+        raw_pending: List[Tuple[str, dict, datetime]] = []
         
-        for city in self.cities:
+        for city in cities:
             if not city.station_id:
-                logger.warning(f"Skipping {city.city} - no station ID")
+                logger.warning("Skipping %s - no station ID", city.city)
                 continue
             
             try:
@@ -128,6 +459,14 @@ class AirQualityScheduler:
                 raw_data = await client.get_station_data(city.station_id)
                 
                 if raw_data:
+                    # The snapshot is recorded at the fetch time too, so a
+                    # replay of the payload rewrites the same history entry
+                    fetched_at = datetime.utcnow()
+                    raw_pending.append((city.station_id, raw_data, fetched_at))
+                    if len(raw_pending) >= self.FLUSH_BATCH_SIZE:
+                        await self._archive_raw(raw_pending)
+                        raw_pending = []
+                    
                     # Parse data - use configured city name, not API response
                     station_data = client.parse_station_data(raw_data, city.city)
                     
@@ -135,29 +474,147 @@ class AirQualityScheduler:
                         # Override city name to ensure consistency
                         station_data.city = city.city
                         
-                        # Cache the data
-                        await self.cache_manager.cache_station_data(
-                            city.station_id, station_data
-                        )
-                        success_count += 1
-                        logger.info(f"Updated data for {city.city} (AQI: {station_data.aqi})")
+                        # Queue for the next batched cache write
+                        pending.append((city.station_id, station_data, fetched_at))
+                        logger.debug("Updated data for %s (AQI: %s)", city.city, station_data.aqi)
+                        
+                        if len(pending) >= self.FLUSH_BATCH_SIZE:
+                            success_count += await self._flush(pending, headlines or {})
+                            pending = []
                     else:
-                        logger.error(f"Failed to parse data for {city.city}")
+                        logger.error("Failed to parse data for %s", city.city)
                         error_count += 1
                 else:
-                    logger.error(f"Failed to fetch data for {city.city}")
+                    logger.error("Failed to fetch data for %s", city.city)
                     error_count += 1
             
             except Exception as e:
-                logger.error(f"Error updating {city.city}: {e}")
+                logger.error("Error updating %s: %s", city.city, e)
                 error_count += 1
         
-        logger.info(
-            f"Update complete: {success_count} successful, {error_count} errors"
+        if pending:
+            success_count += await self._flush(pending, headlines or {})
+        await self._archive_raw(raw_pending)
+        
+        self.refresh_version += 1
+        
+        logger.info("Update complete: %s successful, %s errors", success_count, error_count)
+    
+    async def _flush(
+        self,
+        pending: List[Tuple[str, StationData, datetime]],
+        headlines: Dict[str, Tuple[Optional[int], str]]
+    ) -> int:
+        """
+        Cache parsed feeds in one batch and, once stored, record them as
+        the stations' latest full feed for bulk ingestion.
+        
+        Returns:
+            Number of snapshots cached
+        """
+        cached = await self.cache_manager.cache_snapshots(
+            pending, self.FLUSH_BATCH_SIZE, notify=True
         )
+        # A flush is a single write batch: all or nothing
+        if cached == len(pending):
+            for station_id, _, fetched_at in pending:
+                self._detail_fetched[station_id] = fetched_at
+                self._detail_requested.discard(station_id)
+                if station_id in headlines:
+                    self._headlines[station_id] = headlines[station_id]
+        return cached
+    
+    async def _archive_raw(self, entries: List[Tuple[str, dict, datetime]]):
+        """Store raw payloads in the archive, if enabled."""
+        if self.raw_archive and entries:
+            await self.raw_archive.store_many(entries)
+    
+    async def reload_cities(self) -> Dict[str, List[str]]:
+        """
+        Re-read the cities configuration and apply only what changed.
         
-        # Set next update time
-        self.next_update_time = datetime.utcnow() + timedelta(hours=1)
+        Added cities and cities whose coordinates changed are discovered and
+        fetched; removed cities lose their mapping, and stations no longer
+        used by any city are evicted from the cache. Unchanged cities keep
+        their discovered station without any API calls.
+        
+        Returns:
+            Names of added, removed and moved cities, and unchanged ones
+        
+        Raises:
+            Exception: If the configuration cannot be read; nothing is changed
+        """
+        async with self._reload_lock:
+            new_cities = self._read_cities_config()
+            previous = {city.city.lower(): city for city in self.cities}
+            
+            added: List[CityConfig] = []
+            moved: List[CityConfig] = []
+            unchanged: List[CityConfig] = []
+            stale_stations = set()
+            
+            for city in new_cities:
+                old = previous.pop(city.city.lower(), None)
+                if old is None:
+                    added.append(city)
+                elif (old.lat, old.lon) != (city.lat, city.lon):
+                    moved.append(city)
+                    stale_stations.add(old.station_id)
+                else:
+                    city.station_id = old.station_id
+                    city.station_name = old.station_name
+                    unchanged.append(city)
+            removed = list(previous.values())
+            stale_stations.update(city.station_id for city in removed)
+            
+            changed = added + moved
+            await self._discover_stations(changed)
+            
+            for city in removed:
+                await self.cache_manager.delete_city_station_mapping(city.city)
+            
+            in_use = {city.station_id for city in new_cities}
+            for station_id in stale_stations - in_use - {None}:
+                await self.cache_manager.evict_station(station_id)
+            
+            self.cities = new_cities
+            # Every worker reloads the file; each fetches only the changed
+            # stations it owns and can claim
+            owned = self._owned_cities()
+            self._owned = {city.station_id for city in owned}
+            if self.shards is not None:
+                changed = [
+                    city for city in changed
+                    if city.station_id and self.shards.owns(city.station_id)
+                ]
+            await self._refresh(await self._claim(changed))
+            
+            summary = {
+                "added": [city.city for city in added],
+                "removed": [city.city for city in removed],
+                "moved": [city.city for city in moved],
+                "unchanged": [city.city for city in unchanged],
+            }
+            logger.info(
+                "Reloaded cities: %s added, %s removed, %s moved, %s unchanged",
+                len(added), len(removed), len(moved), len(unchanged)
+            )
+            return summary
+    
+    async def check_cities_config(self):
+        """Reload the cities configuration if the file changed on disk."""
+        try:
+            mtime = Path(settings.CITIES_CONFIG_PATH).stat().st_mtime
+        except OSError:
+            return
+        
+        if mtime != self._cities_mtime:
+            try:
+                await self.reload_cities()
+            except Exception as e:
+                # Keep serving the current cities until the file is fixed
+                self._cities_mtime = mtime
+                logger.error("Error reloading cities configuration: %s", e)
     
     async def fetch_station_data(
         self, station_id: str, city: str
@@ -177,20 +634,22 @@ class AirQualityScheduler:
             raw_data = await client.get_station_data(station_id)
             
             if raw_data:
+                await self._archive_raw([(station_id, raw_data, datetime.utcnow())])
                 station_data = client.parse_station_data(raw_data, city)
                 
                 if station_data:
+                    self._detail_fetched[station_id] = datetime.utcnow()
                     # Cache the data
                     await self.cache_manager.cache_station_data(
                         station_id, station_data
                     )
-                    logger.info(f"Fetched and cached data for {city} (station {station_id})")
+                    logger.debug("Fetched and cached data for %s (station %s)", city, station_id)
                     return station_data
             
             return None
         
         except Exception as e:
-            logger.error(f"Error fetching station {station_id}: {e}")
+            logger.error("Error fetching station %s: %s", station_id, e)
             return None
     
     def start(self):
@@ -207,11 +666,40 @@ class AirQualityScheduler:
             replace_existing=True
         )
         
+        if self.shards is not None:
+            self.scheduler.add_job(
+                self.shard_heartbeat,
+                trigger=IntervalTrigger(seconds=settings.SHARD_HEARTBEAT_SECONDS),
+                id='shard_heartbeat',
+                name='Renew shard membership',
+                replace_existing=True
+            )
+        
+        if settings.COMPACTION_INTERVAL_MINUTES > 0:
+            self.scheduler.add_job(
+                self.compact_history,
+                trigger=IntervalTrigger(minutes=settings.COMPACTION_INTERVAL_MINUTES),
+                id='compact_history',
+                name='Compact history indexes',
+                replace_existing=True
+            )
+        
+        if settings.CITIES_WATCH_INTERVAL_SECONDS > 0:
+            self.scheduler.add_job(
+                self.check_cities_config,
+                trigger=IntervalTrigger(seconds=settings.CITIES_WATCH_INTERVAL_SECONDS),
+                id='check_cities_config',
+                name='Watch cities configuration',
+                replace_existing=True
+            )
+        
         self.scheduler.start()
         logger.info("Scheduler started - updates will run every hour")
     
     def stop(self):
         """Stop the background scheduler."""
+        for task in list(self._takeovers):
+            task.cancel()
         if self.scheduler.running:
             self.scheduler.shutdown()
             logger.info("Scheduler stopped")
\ No newline at end of file
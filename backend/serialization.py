@@ -0,0 +1,330 @@
+"""
+Compact Serialization for Cached Station Data
+Versioned msgpack encoding with schema-positional fields and optional
+zstd compression (with a trained dictionary)
+"""
+import logging
+import struct
+import json
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from models import ForecastDay, StationData
+
+logger = logging.getLogger(__name__)
+
+
+# Binary payloads start with MAGIC, then the schema version and the
+# compression mode; dictionary compression appends a 4-byte dictionary id.
+# Legacy JSON payloads start with "{" and are still decoded.
+# Version 2 appends forecast_issued (history snapshots reference a forecast
+# stored once per station-day instead of embedding it).
+MAGIC = b"AQ"
+SCHEMA_VERSION = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+COMPRESSION_ZSTD_DICT = 2
+
+ZSTD_LEVEL = 3
+
+# Field order of each positional record, per schema version.
+# Changing any of these requires a new SCHEMA_VERSION.
+POLLUTANT_FIELDS = ("pm25", "pm10", "no2", "o3", "so2", "co")
+WEATHER_FIELDS = ("temperature", "humidity", "wind", "pressure")
+FORECAST_FIELDS = ("day", "avg", "max", "min")
+
+
+def _compact_number(value):
+    """Store whole floats as ints; msgpack packs small ints in 1-3 bytes."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _pack_day(day: str):
+    """Dates become day ordinals; anything unparseable is kept as text."""
+    try:
+        return date.fromisoformat(day).toordinal()
+    except ValueError:
+        return day
+
+
+def _unpack_day(day) -> str:
+    return date.fromordinal(day).isoformat() if isinstance(day, int) else day
+
+
+def _forecast_record(forecast: Dict[str, List[ForecastDay]]) -> dict:
+    return {
+        pollutant: [
+            [_pack_day(d.day), _compact_number(d.avg), _compact_number(d.max), _compact_number(d.min)]
+            for d in days
+        ]
+        for pollutant, days in forecast.items()
+    }
+
+
+def _forecast_from_record(forecast: dict) -> dict:
+    return {
+        pollutant: [
+            dict(zip(FORECAST_FIELDS, (_unpack_day(day[0]), *day[1:])))
+            for day in days
+        ]
+        for pollutant, days in forecast.items()
+    }
+
+
+def to_record(data: StationData) -> list:
+    """
+    Convert StationData into its schema-positional record.
+
+    Args:
+        data: StationData to convert
+
+    Returns:
+        Nested lists ordered as the current schema version
+    """
+    pollutants, weather = data.pollutants, data.weather
+    return [
+        data.city,
+        data.station,
+        data.timestamp,
+        data.aqi,
+        data.dominant,
+        [_compact_number(getattr(pollutants, f)) for f in POLLUTANT_FIELDS],
+        [_compact_number(getattr(weather, f)) for f in WEATHER_FIELDS],
+        _forecast_record(data.forecast),
+        data.forecast_issued,
+    ]
+
+
+def from_record(record: list, version: int) -> StationData:
+    """
+    Rebuild StationData from a schema-positional record.
+
+    Args:
+        record: Record produced by to_record
+        version: Schema version the record was written with
+
+    Returns:
+        StationData
+    """
+    if version == 1:
+        record = [*record, None]
+    elif version != 2:
+        raise ValueError(f"Unsupported snapshot schema version {version}")
+
+    city, station, timestamp, aqi, dominant, pollutants, weather, forecast, issued = record
+    return StationData.model_validate({
+        "city": city,
+        "station": station,
+        "timestamp": timestamp,
+        "aqi": aqi,
+        "dominant": dominant,
+        "pollutants": dict(zip(POLLUTANT_FIELDS, pollutants)),
+        "weather": dict(zip(WEATHER_FIELDS, weather)),
+        "forecast": _forecast_from_record(forecast),
+        "forecast_issued": issued,
+    })
+
+
+class SnapshotCodec:
+    """
+    Encoder/decoder for cached StationData values.
+
+    Encoding follows the configured format; decoding detects the format
+    from the payload header, so JSON and every binary schema version can
+    be read side by side while keys are migrated.
+    """
+
+    def __init__(
+        self,
+        encoding: str = "msgpack",
+        compression: str = "none",
+        dictionary: Optional[bytes] = None
+    ):
+        """
+        Args:
+            encoding: "msgpack" or "json"
+            compression: "none" or "zstd" (msgpack only)
+            dictionary: Optional trained zstd dictionary
+        """
+        if encoding not in ("msgpack", "json"):
+            raise ValueError(f"Unknown cache encoding '{encoding}'")
+        if compression not in ("none", "zstd"):
+            raise ValueError(f"Unknown cache compression '{compression}'")
+
+        self.encoding = encoding
+        self.compression = compression
+        self._compressor = None
+        self._dict_id = 0
+        self._dictionaries: Dict[int, object] = {}
+        self._decompressors: Dict[int, object] = {}
+
+        if encoding == "msgpack":
+            import msgpack
+            self._packb = msgpack.packb
+            self._unpackb = msgpack.unpackb
+
+        if compression == "zstd":
+            import zstandard
+
+            if dictionary:
+                zdict = zstandard.ZstdCompressionDict(dictionary)
+                self._dict_id = zdict.dict_id()
+                self._dictionaries[self._dict_id] = zdict
+                self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zdict)
+            else:
+                self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+
+    @classmethod
+    def from_settings(cls, settings) -> "SnapshotCodec":
+        """Build the codec configured by CACHE_ENCODING/CACHE_COMPRESSION."""
+        dictionary = None
+        if settings.CACHE_ZSTD_DICT_PATH:
+            with open(settings.CACHE_ZSTD_DICT_PATH, "rb") as f:
+                dictionary = f.read()
+        return cls(settings.CACHE_ENCODING, settings.CACHE_COMPRESSION, dictionary)
+
+    @property
+    def header(self) -> bytes:
+        """Header written in front of every binary payload."""
+        if self._dict_id:
+            return MAGIC + bytes([SCHEMA_VERSION, COMPRESSION_ZSTD_DICT]) + struct.pack(">I", self._dict_id)
+        if self._compressor:
+            return MAGIC + bytes([SCHEMA_VERSION, COMPRESSION_ZSTD])
+        return MAGIC + bytes([SCHEMA_VERSION, COMPRESSION_NONE])
+
+    def is_current(self, raw: bytes) -> bool:
+        """Check whether a payload is already in the configured format."""
+        if self.encoding == "json":
+            return raw[:1] == b"{"
+        return raw.startswith(self.header)
+
+    def encode(self, data: StationData) -> bytes:
+        """
+        Serialize StationData for the cache.
+
+        Args:
+            data: StationData to encode
+
+        Returns:
+            Encoded payload
+        """
+        if self.encoding == "json":
+            return data.model_dump_json().encode()
+
+        payload = self._packb(to_record(data), use_bin_type=True)
+        if self._compressor:
+            payload = self._compressor.compress(payload)
+        return self.header + payload
+
+    def decode(self, raw: bytes) -> StationData:
+        """
+        Deserialize a cached payload in any supported format.
+
+        Args:
+            raw: Payload read from the cache
+
+        Returns:
+            StationData
+        """
+        if not raw.startswith(MAGIC):
+            return StationData.model_validate_json(raw)
+
+        version, record = self._unwrap(raw)
+        return from_record(record, version)
+
+    def encode_forecast(self, forecast: Dict[str, List[ForecastDay]]) -> bytes:
+        """
+        Serialize a forecast for the per station-day forecast store.
+
+        Args:
+            forecast: Forecast days by pollutant
+
+        Returns:
+            Encoded payload
+        """
+        if self.encoding == "json":
+            return json.dumps({
+                pollutant: [d.model_dump() for d in days]
+                for pollutant, days in forecast.items()
+            }).encode()
+
+        payload = self._packb(_forecast_record(forecast), use_bin_type=True)
+        if self._compressor:
+            payload = self._compressor.compress(payload)
+        return self.header + payload
+
+    def decode_forecast(self, raw: bytes) -> Dict[str, List[ForecastDay]]:
+        """
+        Deserialize a payload written by encode_forecast.
+
+        Args:
+            raw: Payload read from the cache
+
+        Returns:
+            Forecast days by pollutant
+        """
+        if raw.startswith(MAGIC):
+            _, forecast = self._unwrap(raw)
+            forecast = _forecast_from_record(forecast)
+        else:
+            forecast = json.loads(raw)
+
+        return {
+            pollutant: [ForecastDay.model_validate(day) for day in days]
+            for pollutant, days in forecast.items()
+        }
+
+    def _unwrap(self, raw: bytes) -> Tuple[int, object]:
+        """Split a binary payload into its schema version and unpacked record."""
+        version, compression = raw[2], raw[3]
+        payload = memoryview(raw)[4:]
+
+        if compression == COMPRESSION_ZSTD_DICT:
+            (dict_id,) = struct.unpack_from(">I", payload)
+            payload = self._decompressor(dict_id).decompress(payload[4:])
+        elif compression == COMPRESSION_ZSTD:
+            payload = self._decompressor(0).decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise ValueError(f"Unknown snapshot compression {compression}")
+
+        return version, self._unpack(payload)
+
+    def _unpack(self, payload) -> list:
+        unpackb = getattr(self, "_unpackb", None)
+        if unpackb is None:
+            # JSON-configured codecs may still meet binary payloads
+            import msgpack
+            unpackb = self._unpackb = msgpack.unpackb
+        return unpackb(payload, raw=False, strict_map_key=False)
+
+    def _decompressor(self, dict_id: int):
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            import zstandard
+
+            if dict_id and dict_id not in self._dictionaries:
+                raise ValueError(f"zstd dictionary {dict_id} is not loaded")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionaries.get(dict_id))
+            self._decompressors[dict_id] = decompressor
+        return decompressor
+
+
+def train_dictionary(samples: List[StationData], size: int = 16 * 1024) -> bytes:
+    """
+    Train a zstd dictionary on uncompressed msgpack records.
+
+    Args:
+        samples: Representative snapshots (a few hundred or more)
+        size: Target dictionary size in bytes
+
+    Returns:
+        Dictionary bytes, suitable for CACHE_ZSTD_DICT_PATH
+    """
+    import msgpack
+    import zstandard
+
+    payloads = [msgpack.packb(to_record(s), use_bin_type=True) for s in samples]
+    return zstandard.train_dictionary(size, payloads).as_bytes()
@@ -0,0 +1,184 @@
+"""
+Ingestion Sharding
+Splits station refreshes across scheduler workers by consistent hashing on
+station ID, with membership and per-station leases kept in the cache
+backend shared by all workers
+"""
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from cache_backends import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+
+# Sorted set of worker IDs scored by their last heartbeat (epoch seconds)
+MEMBERS_KEY = "shard:workers"
+LEASE_PREFIX = "shard:lease:"
+# Held by the worker looking up a city's station, per city and coordinates
+DISCOVERY_PREFIX = "shard:discover:"
+
+
+def _hash(value: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Adding or removing a member only moves the keys of the ring segments
+    it gains or loses (about 1/N of them); every other key keeps its owner.
+    """
+
+    def __init__(self, members: Iterable[str] = (), replicas: int = 256):
+        """
+        Args:
+            members: Member names
+            replicas: Virtual nodes per member (more evens out the split)
+        """
+        self.replicas = replicas
+        self.members = sorted(set(members))
+        points = sorted(
+            (_hash(f"{member}#{replica}"), member)
+            for member in self.members
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Member owning a key, or None for an empty ring."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardCoordinator:
+    """
+    Membership and station ownership of one scheduler worker.
+
+    Workers announce themselves with a heartbeat in a shared sorted set;
+    members that miss heartbeats for `ttl` seconds drop out and their
+    stations move to the survivors on the next heartbeat. Ownership only
+    decides who should refresh a station; a lease claimed before each
+    fetch guarantees that, while two workers briefly disagree about the
+    membership, only one of them fetches it.
+
+    The backend must be shared between workers (Redis, or LMDB on one
+    host); with the in-memory backend every worker only sees itself and
+    owns all stations.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        worker_id: str = "",
+        ttl: float = 30.0,
+        lease_seconds: int = 1800,
+        replicas: int = 256
+    ):
+        """
+        Args:
+            backend: Cache backend shared by the workers
+            worker_id: Unique name of this worker (host-pid if empty)
+            ttl: Seconds without a heartbeat after which a worker is dead
+            lease_seconds: How long a claimed station is off limits to others
+            replicas: Virtual nodes per worker on the hash ring
+        """
+        self.backend = backend
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.replicas = replicas
+        self.ring = HashRing([self.worker_id], replicas)
+        self.rebalances = 0
+        self.claims_lost = 0
+
+    @property
+    def members(self) -> List[str]:
+        return self.ring.members
+
+    async def heartbeat(self) -> bool:
+        """
+        Renew this worker's membership and reload the member list.
+
+        Returns:
+            True if the membership changed since the last heartbeat
+        """
+        now = time.time()
+        await self.backend.zadd(MEMBERS_KEY, {self.worker_id: now})
+        await self.backend.zremrangebyscore(MEMBERS_KEY, float("-inf"), now - self.ttl)
+        members = set(await self.backend.zrangebyscore(MEMBERS_KEY, now - self.ttl, float("inf")))
+        members.add(self.worker_id)
+
+        if sorted(members) == self.ring.members:
+            return False
+        logger.info(
+            "Shard membership changed: %s -> %s workers (%s)",
+            len(self.ring.members), len(members), ", ".join(sorted(members))
+        )
+        self.ring = HashRing(members, self.replicas)
+        self.rebalances += 1
+        return True
+
+    async def leave(self):
+        """Drop out of the membership so others take over immediately."""
+        try:
+            await self.backend.zadd(MEMBERS_KEY, {self.worker_id: 0})
+            await self.backend.zremrangebyscore(MEMBERS_KEY, 0, 0)
+        except Exception as e:
+            logger.warning("Error leaving shard membership: %s", e)
+
+    def owns(self, station_id: str) -> bool:
+        return self.ring.owner(station_id) == self.worker_id
+
+    async def claim(self, station_ids: List[str]) -> Set[str]:
+        """
+        Lease stations for one refresh.
+
+        Returns:
+            The stations this worker may fetch; the rest were claimed by
+            another worker within the last lease period
+        """
+        claimed = await self._lease(LEASE_PREFIX, station_ids)
+        self.claims_lost += len(station_ids) - len(claimed)
+        return claimed
+
+    async def claim_discovery(self, names: List[str]) -> Set[str]:
+        """
+        Lease cities for a station lookup.
+
+        Args:
+            names: Keys identifying each city and its coordinates
+
+        Returns:
+            The names this worker should look up; another worker looked up
+            the rest within the last lease period and stores their mapping
+        """
+        return await self._lease(DISCOVERY_PREFIX, names)
+
+    async def _lease(self, prefix: str, names: List[str]) -> Set[str]:
+        if not names:
+            return set()
+        stored = await self.backend.set_nx_many(
+            [f"{prefix}{name}" for name in names],
+            self.worker_id.encode(),
+            self.lease_seconds
+        )
+        return {name for name, ok in zip(names, stored) if ok}
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "worker_id": self.worker_id,
+            "members": self.members,
+            "rebalances": self.rebalances,
+            "claims_lost": self.claims_lost,
+        }
@@ -3,7 +3,7 @@ WAQI (World Air Quality Index) API Client
 Handles all interactions with the WAQI API
 """
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import httpx
 
 from models import StationData, Pollutants, Weather, ForecastDay
@@ -17,14 +17,16 @@ class WAQIClient:
     
     BASE_URL = "https://api.waqi.info"
     
-    def __init__(self, token: str):
+    def __init__(self, token: str, base_url: Optional[str] = None):
         """
         Initialize WAQI client.
         
         Args:
             token: WAQI API token
+            base_url: API root (defaults to the public WAQI API)
         """
         self.token = token
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
         self.client = httpx.AsyncClient(timeout=30.0)
     
     async def close(self):
@@ -42,27 +44,27 @@ class WAQIClient:
         Returns:
             Station data dict or None if not found
         """
-        url = f"{self.BASE_URL}/feed/geo:{lat};{lon}/"
+        url = f"{self.base_url}/feed/geo:{lat};{lon}/"
         params = {"token": self.token}
         
         try:
-            logger.info(f"Fetching nearest station for coordinates ({lat}, {lon})")
+            logger.info("Fetching nearest station for coordinates (%s, %s)", lat, lon)
             response = await self.client.get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
             
             if data.get("status") != "ok":
-                logger.error(f"WAQI API error: {data.get('data', 'Unknown error')}")
+                logger.error("WAQI API error: %s", data.get('data', 'Unknown error'))
                 return None
             
             return data.get("data")
         
         except httpx.HTTPError as e:
-            logger.error(f"HTTP error fetching nearest station: {e}")
+            logger.error("HTTP error fetching nearest station: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error fetching nearest station: {e}")
+            logger.error("Unexpected error fetching nearest station: %s", e)
             return None
     
     async def get_station_data(self, station_id: str) -> Optional[Dict[str, Any]]:
@@ -75,27 +77,78 @@ class WAQIClient:
         Returns:
             Station data dict or None if not found
         """
-        url = f"{self.BASE_URL}/feed/@{station_id}/"
+        url = f"{self.base_url}/feed/@{station_id}/"
         params = {"token": self.token}
         
         try:
-            logger.info(f"Fetching data for station {station_id}")
+            logger.debug("Fetching data for station %s", station_id)
             response = await self.client.get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
             
             if data.get("status") != "ok":
-                logger.error(f"WAQI API error for station {station_id}: {data.get('data', 'Unknown error')}")
+                logger.error("WAQI API error for station %s: %s", station_id, data.get('data', 'Unknown error'))
                 return None
             
             return data.get("data")
         
         except httpx.HTTPError as e:
-            logger.error(f"HTTP error fetching station {station_id}: {e}")
+            logger.error("HTTP error fetching station %s: %s", station_id, e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error fetching station {station_id}: {e}")
+            logger.error("Unexpected error fetching station %s: %s", station_id, e)
+            return None
+    
+    async def get_map_bounds(
+        self, south: float, west: float, north: float, east: float
+    ) -> Optional[Dict[str, Tuple[Optional[int], str]]]:
+        """
+        Get headline AQI of every station inside a bounding box.
+        
+        One call covers all stations in the box, but returns only the
+        overall AQI and observation time, not the pollutant breakdown.
+        
+        Args:
+            south: Southern latitude
+            west: Western longitude
+            north: Northern latitude
+            east: Eastern longitude
+            
+        Returns:
+            Dict of station ID to (AQI or None if unavailable, ISO time),
+            or None if the request failed
+        """
+        url = f"{self.base_url}/map/bounds/"
+        params = {"token": self.token, "latlng": f"{south},{west},{north},{east}"}
+        
+        try:
+            logger.info("Fetching stations in bounds (%s, %s, %s, %s)", south, west, north, east)
+            response = await self.client.get(url, params=params)
+            response.raise_for_status()
+            
+            data = response.json()
+            
+            if data.get("status") != "ok":
+                logger.error("WAQI API error for bounds: %s", data.get('data', 'Unknown error'))
+                return None
+            
+            stations = {}
+            for item in data.get("data", []):
+                # AQI is a string, "-" when the station has no current value
+                aqi = item.get("aqi")
+                try:
+                    aqi = int(aqi)
+                except (TypeError, ValueError):
+                    aqi = None
+                stations[str(item.get("uid"))] = (aqi, item.get("station", {}).get("time", ""))
+            return stations
+        
+        except httpx.HTTPError as e:
+            logger.error("HTTP error fetching bounds: %s", e)
+            return None
+        except Exception as e:
+            logger.error("Unexpected error fetching bounds: %s", e)
             return None
     
     def parse_station_data(self, raw_data: Dict[str, Any], city: str) -> Optional[StationData]:
@@ -116,7 +169,7 @@ class WAQIClient:
             dominant = raw_data.get("dominentpol", "")
             timestamp = raw_data.get("time", {}).get("iso", "")
             
-            logger.debug(f"Parsing data for {city}: AQI={aqi}, dominant={dominant}")
+            logger.debug("Parsing data for %s: AQI=%s, dominant=%s", city, aqi, dominant)
             
             # Extract pollutants from iaqi
             iaqi = raw_data.get("iaqi", {})
@@ -139,12 +192,12 @@ class WAQIClient:
             
             # Extract forecast data
             forecast_raw = raw_data.get("forecast", {})
-            logger.debug(f"Raw forecast data keys: {list(forecast_raw.keys()) if forecast_raw else 'None'}")
+            logger.debug("Raw forecast data keys: %s", list(forecast_raw.keys()) if forecast_raw else 'None')
             
             forecast = self._parse_forecast(forecast_raw)
             
             if not forecast:
-                logger.warning(f"No forecast data available for {city}")
+                logger.warning("No forecast data available for %s", city)
             
             return StationData(
                 city=city,
@@ -158,7 +211,7 @@ class WAQIClient:
             )
         
         except Exception as e:
-            logger.error(f"Error parsing station data for {city}: {e}", exc_info=True)
+            logger.error("Error parsing station data for %s: %s", city, e, exc_info=True)
             return None
     
     def _extract_value(self, data: Optional[Dict]) -> Optional[float]:
@@ -203,13 +256,13 @@ class WAQIClient:
         for pollutant in ["pm25", "pm10", "o3", "uvi"]:
             try:
                 if pollutant not in daily_forecasts:
-                    logger.debug(f"No forecast data for {pollutant}")
+                    logger.debug("No forecast data for %s", pollutant)
                     continue
                 
                 daily_data = daily_forecasts[pollutant]
                 
                 if not isinstance(daily_data, list):
-                    logger.debug(f"Invalid forecast data format for {pollutant}")
+                    logger.debug("Invalid forecast data format for %s", pollutant)
                     continue
                 
                 forecast_list = []
@@ -242,19 +295,19 @@ class WAQIClient:
                         forecast_list.append(forecast_day)
                         
                     except Exception as e:
-                        logger.warning(f"Error parsing forecast item for {pollutant}: {e}")
+                        logger.warning("Error parsing forecast item for %s: %s", pollutant, e)
                         continue
                 
                 if forecast_list:
                     result[pollutant] = forecast_list
-                    logger.debug(f"Parsed {len(forecast_list)} forecast days for {pollutant}")
+                    logger.debug("Parsed %s forecast days for %s", len(forecast_list), pollutant)
                     
             except Exception as e:
-                logger.warning(f"Error parsing forecast for {pollutant}: {e}")
+                logger.warning("Error parsing forecast for %s: %s", pollutant, e)
                 continue
         
         if result:
-            logger.info(f"Successfully parsed forecast data for: {list(result.keys())}")
+            logger.debug("Successfully parsed forecast data for: %s", list(result.keys()))
         else:
             logger.warning("No forecast data could be parsed from response")
         
@@ -274,7 +327,7 @@ def get_waqi_client() -> WAQIClient:
     """
     global _client
     if _client is None:
-        _client = WAQIClient(settings.WAQI_TOKEN)
+        _client = WAQIClient(settings.WAQI_TOKEN, settings.WAQI_BASE_URL)
     return _client
 
 